@@ -1,10 +1,13 @@
 # assessment_agent/agent.py
 from google.adk.agents import LlmAgent
 
+from utils.context_cache import context_cache, split_marked_context
+from utils.model_router import model_router
+
 # Simplified assessment agent that focuses on guidance and analysis
 assessment_agent = LlmAgent(
     name="assessment_agent",
-    model="gemini-2.0-flash-lite",
+    model=model_router.llm("assessment_agent"),
     description="Conversational agent for candidate assessment guidance and analysis.",
     instruction="""You are a candidate assessment specialist that helps company users evaluate job applicants.
 
@@ -36,6 +39,11 @@ IMPORTANT:
 
 You help hiring managers make informed decisions through expert guidance and analysis.""",
     tools=[],  # No complex tools - just conversation and analysis
+    # Follow-up questions repeat the same assessment context (see build_assessment_context)
+    before_model_callback=[
+        model_router.before_model_callback(),
+        context_cache.before_model_callback(split_marked_context("Assessment Context:", "\n\n**User Question:** ")),
+    ],
 )
 
 # Required for ADK discovery
@@ -0,0 +1,186 @@
+"""
+In-process stand-in for Gemini, used by the load tests.
+
+``install()`` registers ``FakeLlm`` for every ``gemini-*`` model name, so
+the unchanged agents run through the real ADK runner, sessions and
+callbacks while the model call only sleeps. Latency is shaped like a real
+model: a fixed time to first token, then a steady token rate.
+
+    FAKE_LLM_FIRST_TOKEN_MS=400     time to first token
+    FAKE_LLM_TOKENS_PER_SECOND=150  output rate after the first token
+    FAKE_LLM_OUTPUT_TOKENS=120      length of a normal reply
+    FAKE_LLM_PREFILL_MS_PER_1K=0    extra first-token time per 1k uncached prompt tokens
+
+It also swaps the context cache backend for ``FakeCacheBackend``, which
+keeps cached prefixes in memory. A request that names a cached content
+reports the prefix as ``cached_content_token_count`` and skips its
+prefill time, so load tests show how often prefixes are reused.
+"""
+
+import asyncio
+import itertools
+import os
+import time
+from typing import AsyncGenerator, Dict, Optional, Tuple
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+
+FIRST_TOKEN_MS = float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", 400))
+TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", 150))
+OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", 120))
+PREFILL_MS_PER_1K = float(os.getenv("FAKE_LLM_PREFILL_MS_PER_1K", 0))
+
+# Rough Gemini tokenisation for English text
+CHARS_PER_TOKEN = 4
+
+# Sent by the load test when a posting conversation should produce an opportunity
+PUBLISH_MARKER = "please publish"
+
+OPPORTUNITY_READY_REPLY = """Great, I have everything I need.
+
+```
+OPPORTUNITY_READY
+Title: Load Test Coordinator
+Description: Coordinates cross-team delivery for a growing organisation and keeps projects moving when priorities shift.
+Requirements: Three years of coordination experience, clear written communication, comfort with ambiguity.
+Location: Remote (US time zones)
+Employment Type: full-time
+Salary Range: Not specified
+Survey Questions:
+1. Tell us about a time you had to re-plan a project at short notice.
+2. How do you keep stakeholders aligned when they disagree?
+3. Describe a process you improved and how you measured the result.
+```"""
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _last_user_text(llm_request: LlmRequest) -> str:
+    for content in reversed(llm_request.contents or []):
+        if content.role == "user" and content.parts:
+            return " ".join(part.text for part in content.parts if part.text)
+    return ""
+
+
+def _prompt_tokens(llm_request: LlmRequest) -> int:
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    total = count_tokens(instruction) if isinstance(instruction, str) else 0
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            if part.text:
+                total += count_tokens(part.text)
+    return total
+
+
+class FakeCacheBackend:
+    """In-memory cached contents with the same interface as GenaiCacheBackend"""
+
+    def __init__(self):
+        self.caches: Dict[str, Tuple[str, int, float]] = {}
+        self.created = 0
+        self._ids = itertools.count(1)
+
+    async def create(self, model: str, display_name: str, system_instruction: Optional[str],
+                     tools: Optional[list], contents: list, ttl: int) -> Tuple[str, float]:
+        tokens = count_tokens(system_instruction or "") + sum(
+            count_tokens(part.text) for content in contents for part in content.parts or [] if part.text
+        )
+        name = f"cachedContents/fake-{next(self._ids)}"
+        self.caches[name] = (display_name, tokens, time.time() + ttl)
+        self.created += 1
+        return name, self.caches[name][2]
+
+    async def find(self, display_name: str) -> Optional[Tuple[str, float]]:
+        for name, (cached_display_name, _, expires_at) in self.caches.items():
+            if cached_display_name == display_name and expires_at > time.time():
+                return name, expires_at
+        return None
+
+    async def refresh(self, name: str, ttl: int) -> float:
+        display_name, tokens, _ = self.caches[name]
+        self.caches[name] = (display_name, tokens, time.time() + ttl)
+        return self.caches[name][2]
+
+    async def delete(self, name: str):
+        self.caches.pop(name, None)
+
+    def cached_tokens(self, name: Optional[str]) -> int:
+        """Prefix tokens behind a cached content name; 0 if it is unknown or expired"""
+        cache = self.caches.get(name) if name else None
+        if cache is None or cache[2] <= time.time():
+            return 0
+        return cache[1]
+
+
+cache_backend = FakeCacheBackend()
+
+
+def _reply_for(user_text: str) -> str:
+    if PUBLISH_MARKER in user_text.lower():
+        return OPPORTUNITY_READY_REPLY
+    words = ["This", "is", "a", "simulated", "agent", "reply", "from", "the", "load", "test", "model."]
+    target_chars = OUTPUT_TOKENS * CHARS_PER_TOKEN
+    text = []
+    while sum(len(word) + 1 for word in text) < target_chars:
+        text.append(words[len(text) % len(words)])
+    return " ".join(text)
+
+
+class FakeLlm(BaseLlm):
+    """Deterministic replies with configurable first-token latency and token rate"""
+
+    model: str = "gemini-2.0-flash-lite"
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"gemini-.*"]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        reply = _reply_for(_last_user_text(llm_request))
+        prompt_tokens = _prompt_tokens(llm_request)
+        cached_tokens = cache_backend.cached_tokens(llm_request.config.cached_content if llm_request.config else None)
+        output_tokens = count_tokens(reply)
+
+        # Only the uncached part of the prompt costs prefill time
+        await asyncio.sleep((FIRST_TOKEN_MS + PREFILL_MS_PER_1K * prompt_tokens / 1000) / 1000)
+
+        if stream:
+            chunk_chars = 20 * CHARS_PER_TOKEN
+            for start in range(0, len(reply), chunk_chars):
+                chunk = reply[start:start + chunk_chars]
+                await asyncio.sleep(count_tokens(chunk) / TOKENS_PER_SECOND)
+                yield LlmResponse(
+                    content=types.Content(role="model", parts=[types.Part(text=chunk)]),
+                    partial=True,
+                )
+        else:
+            await asyncio.sleep(output_tokens / TOKENS_PER_SECOND)
+
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=reply)]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens + cached_tokens,
+                cached_content_token_count=cached_tokens or None,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + cached_tokens + output_tokens,
+            ),
+        )
+
+
+def install():
+    """Route every gemini-* model name to FakeLlm and context caches to memory (call before the agents run)"""
+    from utils.context_cache import context_cache
+
+    LLMRegistry.register(FakeLlm)
+    context_cache.backend = cache_backend
+    cache_clear = getattr(LLMRegistry.resolve, "cache_clear", None)
+    if cache_clear:
+        cache_clear()
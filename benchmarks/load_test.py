@@ -0,0 +1,538 @@
+"""
+End-to-end load test against the Firebase emulators and the fake model.
+
+Starts the Firestore and Auth emulators (unless FIRESTORE_EMULATOR_HOST
+and FIREBASE_AUTH_EMULATOR_HOST already point at running ones). Then it
+starts the app via ``benchmarks.serve`` and seeds users and opportunities
+through the public endpoints. Each scenario runs for a fixed duration at
+a fixed concurrency. For each scenario the test reports throughput and
+p50/p95/p99 latency.
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --scenarios browse,detail --concurrency 20 --duration 30
+    python -m benchmarks.load_test --baseline benchmarks/results/load-<previous>.json
+
+Results are written to benchmarks/results/ as JSON. Pass a previous file
+as ``--baseline`` to print the change against it.
+
+Every response reports its Firestore operations (X-Firestore-Ops). The
+most operations one request of a scenario issued is checked against
+benchmarks/baselines/firestore_ops.json, and the run fails when a
+scenario needs more than before (an N+1 read, a lost cache). Record the
+baseline with ``--save-firestore-baseline``.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_llm import FIRST_TOKEN_MS, OUTPUT_TOKENS, PUBLISH_MARKER, TOKENS_PER_SECOND
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+FIRESTORE_BASELINE = os.path.join(ROOT_DIR, "benchmarks", "baselines", "firestore_ops.json")
+
+PROJECT_ID = "demo-laiers"
+FIRESTORE_EMULATOR = "127.0.0.1:8085"
+AUTH_EMULATOR = "127.0.0.1:9099"
+# main.py calls its own ADK endpoints on localhost:8000 in development
+APP_PORT = 8000
+APP_URL = f"http://localhost:{APP_PORT}"
+PASSWORD = "load-test-password"
+COMPANY_IDS = ["company_1", "company_2", "company_3"]
+
+# Handlers report most failures as 200 HTML fragments
+ERROR_MARKERS = ('class="error-message"', "Registration Failed", 'class="application-result error"')
+# "<operations>; docs=<documents>; ..." (utils/firestore_ops.py)
+FIRESTORE_OPS_HEADER = re.compile(r"(\d+); docs=(\d+)")
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    concurrency: int
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+    firestore_ops: List[int] = field(default_factory=list)
+    firestore_docs: List[int] = field(default_factory=list)
+
+    def record_firestore(self, response: httpx.Response):
+        match = FIRESTORE_OPS_HEADER.match(response.headers.get("X-Firestore-Ops", ""))
+        if match:
+            self.firestore_ops.append(int(match.group(1)))
+            self.firestore_docs.append(int(match.group(2)))
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        requests = len(latencies)
+        ops = self.firestore_ops
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "concurrency": self.concurrency,
+            "throughput_rps": round(requests / self.elapsed, 2) if self.elapsed else 0.0,
+            "mean_ms": round(sum(latencies) / requests * 1000, 1) if requests else None,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": round(latencies[-1] * 1000, 1) if requests else None,
+            "firestore_ops_mean": round(sum(ops) / len(ops), 2) if ops else None,
+            "firestore_ops_max": max(ops) if ops else None,
+            "firestore_docs_max": max(self.firestore_docs) if ops else None,
+        }
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile in milliseconds"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[rank] * 1000, 1)
+
+
+def wait_for_port(address: str, timeout: float = 60.0):
+    host, port = address.rsplit(":", 1)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, int(port)), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Timed out waiting for {address}")
+
+
+class Emulators:
+    """Firestore + Auth emulators via the Firebase CLI, unless already running"""
+
+    def __init__(self):
+        self.process = None
+
+    def __enter__(self):
+        if os.getenv("FIRESTORE_EMULATOR_HOST") and os.getenv("FIREBASE_AUTH_EMULATOR_HOST"):
+            print(f"Using running emulators: {os.environ['FIRESTORE_EMULATOR_HOST']}, "
+                  f"{os.environ['FIREBASE_AUTH_EMULATOR_HOST']}")
+            return self
+
+        print("Starting Firebase emulators (firestore, auth)...")
+        self.process = subprocess.Popen(
+            ["firebase", "emulators:start", "--only", "firestore,auth", "--project", PROJECT_ID,
+             "--config", os.path.join(ROOT_DIR, "benchmarks", "firebase.json")],
+            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, cwd=ROOT_DIR,
+        )
+        wait_for_port(FIRESTORE_EMULATOR)
+        wait_for_port(AUTH_EMULATOR)
+        os.environ["FIRESTORE_EMULATOR_HOST"] = FIRESTORE_EMULATOR
+        os.environ["FIREBASE_AUTH_EMULATOR_HOST"] = AUTH_EMULATOR
+        return self
+
+    def __exit__(self, *exc):
+        if self.process:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+        return False
+
+
+class AppServer:
+    """The app in a subprocess, wired to the emulators and the fake model"""
+
+    def __init__(self, workers: int = 1, extra_env: Optional[Dict[str, str]] = None):
+        self.workers = workers
+        self.extra_env = extra_env or {}
+        self.process = None
+        self.session_dir = None
+
+    def __enter__(self):
+        env = {
+            **os.environ,
+            "ENVIRONMENT": "development",
+            "PORT": str(APP_PORT),
+            "GOOGLE_CLOUD_PROJECT": PROJECT_ID,
+            "LOG_FORMAT": "text",
+            "WEB_CONCURRENCY": str(self.workers),
+            # Every simulated client shares one address; measure capacity, not the limiter
+            "RATE_LIMIT_ENABLED": "false",
+            # chat_dashboard repeats one message; cached replies would hide the agent's latency
+            "RESPONSE_CACHE_ENABLED": "false",
+            # Operations per request are checked against benchmarks/baselines/firestore_ops.json
+            "FIRESTORE_OPS_HEADER": "true",
+            **self.extra_env,
+        }
+        if self.workers > 1 and "SESSION_DB_URL" not in env:
+            # Workers must share agent sessions; a fresh SQLite file per run
+            self.session_dir = tempfile.TemporaryDirectory()
+            env["SESSION_DB_URL"] = f"sqlite:///{self.session_dir.name}/sessions.db?timeout=30"
+        self.process = subprocess.Popen([sys.executable, "-m", "benchmarks.serve"], env=env, cwd=ROOT_DIR)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("App server exited during startup")
+            try:
+                if httpx.get(f"{APP_URL}/health", timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError("Timed out waiting for the app server")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+        if self.session_dir:
+            self.session_dir.cleanup()
+        return False
+
+
+@dataclass
+class LoadContext:
+    """Seeded users and opportunities shared by the scenarios"""
+
+    talent: List[dict] = field(default_factory=list)
+    companies: Dict[str, dict] = field(default_factory=dict)
+    opportunities: List[dict] = field(default_factory=list)
+    apply_pairs: Optional[itertools.cycle] = None
+
+
+def _auth_url(method: str) -> str:
+    host = os.environ["FIREBASE_AUTH_EMULATOR_HOST"]
+    return f"http://{host}/identitytoolkit.googleapis.com/v1/accounts:{method}?key=fake-api-key"
+
+
+async def sign_up(client: httpx.AsyncClient, email: str) -> str:
+    response = await client.post(_auth_url("signUp"), json={
+        "email": email, "password": PASSWORD, "returnSecureToken": True})
+    response.raise_for_status()
+    return response.json()["idToken"]
+
+
+async def sign_in(client: httpx.AsyncClient, email: str) -> str:
+    response = await client.post(_auth_url("signInWithPassword"), json={
+        "email": email, "password": PASSWORD, "returnSecureToken": True})
+    response.raise_for_status()
+    return response.json()["idToken"]
+
+
+def _cookie(user: dict) -> dict:
+    return {"Cookie": f"session_token={user['session']}"}
+
+
+def _new_email(kind: str) -> str:
+    return f"load-{kind}-{uuid.uuid4().hex[:12]}@example.com"
+
+
+async def _register_talent(client: httpx.AsyncClient) -> dict:
+    email = _new_email("talent")
+    id_token = await sign_up(client, email)
+    response = await client.post(f"{APP_URL}/api/register", json={
+        "idToken": id_token, "email": email, "userType": "talent"})
+    response.raise_for_status()
+    return {"email": email, "session": response.cookies["session_token"]}
+
+
+async def _register_company(client: httpx.AsyncClient, company_id: str) -> dict:
+    email = _new_email("company")
+    response = await client.post(f"{APP_URL}/api/register", data={
+        "user_type": "company", "email": email, "password": PASSWORD, "confirm_password": PASSWORD,
+        "name": "Load Test Recruiter", "company_id": company_id})
+    response.raise_for_status()
+    id_token = await sign_in(client, email)
+    response = await client.post(f"{APP_URL}/api/login", json={"idToken": id_token})
+    response.raise_for_status()
+    return {"email": email, "session": response.cookies["session_token"], "company_id": company_id}
+
+
+async def _follow_job(client: httpx.AsyncClient, response: httpx.Response, headers: dict) -> httpx.Response:
+    """Poll a background job placeholder (chat_pending.html) until the reply replaces it"""
+    while match := re.search(r'hx-get="(/api/jobs/[^"]+)"', response.text):
+        await asyncio.sleep(0.5)
+        response = await client.get(f"{APP_URL}{match.group(1)}", headers=headers)
+    return response
+
+
+async def seed(client: httpx.AsyncClient, talent_users: int, opportunities_per_company: int) -> LoadContext:
+    ctx = LoadContext()
+    ctx.talent = await asyncio.gather(*[_register_talent(client) for _ in range(talent_users)])
+    for company_id in COMPANY_IDS:
+        ctx.companies[company_id] = await _register_company(client, company_id)
+
+    # Opportunities go through the real posting agent path (the fake model emits OPPORTUNITY_READY)
+    for company_id, company_user in ctx.companies.items():
+        for _ in range(opportunities_per_company):
+            response = await client.post(f"{APP_URL}/api/opportunities/create", headers=_cookie(company_user), data={
+                "message": f"Everything above is final, {PUBLISH_MARKER}.", "company_id": company_id})
+            response = await _follow_job(client, response, _cookie(company_user))
+            match = re.search(r"Opportunity ID:\*\* `([^`]+)`", response.text)
+            if not match:
+                raise RuntimeError(f"Seeding opportunity for {company_id} failed: {response.text[:300]}")
+            ctx.opportunities.append({"id": match.group(1), "company_id": company_id, "questions": 3})
+
+    pairs = [(user, opp) for user in ctx.talent for opp in ctx.opportunities]
+    random.shuffle(pairs)
+    ctx.apply_pairs = itertools.cycle(pairs)
+    print(f"Seeded {len(ctx.talent)} talent users, {len(ctx.companies)} company users, "
+          f"{len(ctx.opportunities)} opportunities")
+    return ctx
+
+
+# Each scenario does any untimed setup and returns the request to time
+
+async def scenario_register(ctx: LoadContext, client: httpx.AsyncClient) -> httpx.Request:
+    email = _new_email("talent")
+    id_token = await sign_up(client, email)
+    return client.build_request("POST", f"{APP_URL}/api/register", json={
+        "idToken": id_token, "email": email, "userType": "talent"})
+
+
+async def scenario_login(ctx: LoadContext, client: httpx.AsyncClient) -> httpx.Request:
+    id_token = await sign_in(client, random.choice(ctx.talent)["email"])
+    return client.build_request("POST", f"{APP_URL}/api/login", json={"idToken": id_token})
+
+
+async def scenario_browse(ctx: LoadContext, client: httpx.AsyncClient) -> httpx.Request:
+    return client.build_request("GET", f"{APP_URL}/opportunities", headers=_cookie(random.choice(ctx.talent)))
+
+
+async def scenario_detail(ctx: LoadContext, client: httpx.AsyncClient) -> httpx.Request:
+    opportunity = random.choice(ctx.opportunities)
+    return client.build_request("GET", f"{APP_URL}/opportunities/{opportunity['id']}",
+                                headers=_cookie(random.choice(ctx.talent)))
+
+
+async def scenario_apply(ctx: LoadContext, client: httpx.AsyncClient) -> httpx.Request:
+    # Cycles through every (user, opportunity) pair; once exhausted this measures the "already applied" path
+    user, opportunity = next(ctx.apply_pairs)
+    answers = {f"question_{i}": "A short but genuine answer for the load test." for i in range(opportunity["questions"])}
+    return client.build_request("POST", f"{APP_URL}/api/opportunities/{opportunity['id']}/apply",
+                                headers=_cookie(user), data=answers)
+
+
+async def scenario_chat_dashboard(ctx: LoadContext, client: httpx.AsyncClient) -> httpx.Request:
+    return client.build_request("POST", f"{APP_URL}/api/chat", headers=_cookie(random.choice(ctx.talent)),
+                                data={"message": "What kinds of roles would suit my collaboration skills?"})
+
+
+async def scenario_chat_posting(ctx: LoadContext, client: httpx.AsyncClient) -> httpx.Request:
+    company_id = random.choice(COMPANY_IDS)
+    return client.build_request("POST", f"{APP_URL}/api/opportunities/create",
+                                headers=_cookie(ctx.companies[company_id]),
+                                data={"message": "We need a project coordinator for our new team.",
+                                      "company_id": company_id})
+
+
+async def scenario_chat_assessment(ctx: LoadContext, client: httpx.AsyncClient) -> httpx.Request:
+    opportunity = random.choice(ctx.opportunities)
+    return client.build_request("POST", f"{APP_URL}/api/opportunities/{opportunity['id']}/assess",
+                                headers=_cookie(ctx.companies[opportunity["company_id"]]),
+                                data={"message": "Who are the strongest candidates so far?"})
+
+
+SCENARIOS = {
+    "register": scenario_register,
+    "login": scenario_login,
+    "browse": scenario_browse,
+    "detail": scenario_detail,
+    "apply": scenario_apply,
+    "chat_dashboard": scenario_chat_dashboard,
+    "chat_posting": scenario_chat_posting,
+    "chat_assessment": scenario_chat_assessment,
+}
+
+
+def _is_error(response: httpx.Response) -> bool:
+    if response.status_code >= 400:
+        return True
+    return any(marker in response.text for marker in ERROR_MARKERS)
+
+
+async def run_scenario(ctx: LoadContext, client: httpx.AsyncClient, name: str,
+                       concurrency: int, duration: float, warmup: float) -> ScenarioResult:
+    build = SCENARIOS[name]
+    result = ScenarioResult(name=name, concurrency=concurrency)
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            request = await build(ctx, client)
+            request_started = time.perf_counter()
+            try:
+                response = await client.send(request)
+                await response.aread()
+                failed = _is_error(response)
+            except httpx.HTTPError:
+                response, failed = None, True
+            if request_started < measure_from:
+                continue
+            result.latencies.append(time.perf_counter() - request_started)
+            result.errors += failed
+            if response is not None:
+                result.record_firestore(response)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    result.elapsed = time.perf_counter() - measure_from
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results: Dict[str, dict], baseline: Optional[Dict[str, dict]] = None):
+    header = f"{'scenario':<18}{'req':>7}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'fs ops':>8}"
+    print("\n" + header + ("   p95 vs baseline" if baseline else ""))
+    print("-" * len(header))
+    for name, summary in results.items():
+        line = (f"{name:<18}{summary['requests']:>7}{summary['errors']:>6}{summary['throughput_rps']:>9}"
+                f"{summary['p50_ms'] or '-':>9}{summary['p95_ms'] or '-':>9}{summary['p99_ms'] or '-':>9}"
+                f"{summary['firestore_ops_max'] if summary['firestore_ops_max'] is not None else '-':>8}")
+        previous = (baseline or {}).get(name)
+        if previous and previous.get("p95_ms") and summary["p95_ms"]:
+            change = (summary["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+            line += f"   {change:+.1f}%"
+        print(line)
+    print("(latencies in ms; fs ops = most Firestore operations in one request)")
+
+
+def check_firestore_ops(results: Dict[str, dict], baseline: dict) -> List[str]:
+    """Scenarios whose busiest request issued more Firestore operations than in the baseline"""
+    regressions = []
+    for name, summary in results.items():
+        allowed = baseline["scenarios"].get(name, {}).get("firestore_ops_max")
+        if allowed is not None and summary["firestore_ops_max"] is not None and summary["firestore_ops_max"] > allowed:
+            regressions.append(f"{name}: {summary['firestore_ops_max']} Firestore operations per request "
+                               f"(baseline {allowed})")
+    return regressions
+
+
+def save_firestore_baseline(results: Dict[str, dict], config: dict, path: str = FIRESTORE_BASELINE):
+    with open(path, "w") as f:
+        json.dump({
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            # Operations per request only depend on data volume through N+1 patterns, which is the point
+            "seed": {"talent_users": config["talent_users"], "opportunities_per_company": config["opportunities_per_company"]},
+            "scenarios": {name: {"firestore_ops_max": summary["firestore_ops_max"],
+                                 "firestore_docs_max": summary["firestore_docs_max"]}
+                          for name, summary in results.items() if summary["firestore_ops_max"] is not None},
+        }, f, indent=2)
+        f.write("\n")
+
+
+async def run(args) -> dict:
+    scenarios = [name.strip() for name in args.scenarios.split(",")]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {unknown}. Available: {', '.join(SCENARIOS)}")
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+        ctx = await seed(client, args.talent_users, args.opportunities)
+        results = {}
+        for name in scenarios:
+            print(f"Running {name} ({args.concurrency} workers, {args.duration}s)...")
+            result = await run_scenario(ctx, client, name, args.concurrency, args.duration, args.warmup)
+            results[name] = result.summary()
+    return results
+
+
+def add_load_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenario names")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--talent-users", type=int, default=20)
+    parser.add_argument("--opportunities", type=int, default=5, help="Opportunities seeded per company")
+
+
+def load_config(args) -> dict:
+    return {
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "talent_users": args.talent_users,
+        "opportunities_per_company": args.opportunities,
+        "fake_llm": {
+            "first_token_ms": FIRST_TOKEN_MS,
+            "tokens_per_second": TOKENS_PER_SECOND,
+            "output_tokens": OUTPUT_TOKENS,
+        },
+    }
+
+
+def write_results(output: Optional[str], prefix: str, payload: dict) -> str:
+    commit = _git_commit()
+    output = output or os.path.join(RESULTS_DIR, f"{prefix}-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"commit": commit, "timestamp": datetime.now().isoformat(), **payload}, f, indent=2)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the app against Firebase emulators and a fake model")
+    add_load_arguments(parser)
+    parser.add_argument("--workers", type=int, default=1, help="App worker processes (shared SQLite sessions when > 1)")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--output", help="Where to write results (default benchmarks/results/load-<commit>-<time>.json)")
+    parser.add_argument("--firestore-baseline", default=FIRESTORE_BASELINE,
+                        help="Firestore operations per request to check against")
+    parser.add_argument("--save-firestore-baseline", action="store_true",
+                        help="Record this run's Firestore operations per request as the baseline")
+    args = parser.parse_args()
+
+    with Emulators(), AppServer(workers=args.workers):
+        results = asyncio.run(run(args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["scenarios"]
+    print_report(results, baseline)
+
+    output = write_results(args.output, "load", {
+        "config": {**load_config(args), "workers": args.workers},
+        "scenarios": results,
+    })
+    print(f"\nResults written to {output}")
+
+    if args.save_firestore_baseline:
+        save_firestore_baseline(results, load_config(args), args.firestore_baseline)
+        print(f"Firestore baseline written to {args.firestore_baseline}")
+    elif os.path.exists(args.firestore_baseline):
+        with open(args.firestore_baseline) as f:
+            firestore_baseline = json.load(f)
+        if firestore_baseline.get("seed") != {"talent_users": args.talent_users,
+                                              "opportunities_per_company": args.opportunities}:
+            print(f"Note: the Firestore baseline was seeded with {firestore_baseline.get('seed')}")
+        regressions = check_firestore_ops(results, firestore_baseline)
+        if regressions:
+            print("\nFirestore operations regressed:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("Firestore operations per request within baseline")
+    else:
+        print(f"No Firestore baseline at {args.firestore_baseline}; record one with --save-firestore-baseline")
+
+
+if __name__ == "__main__":
+    main()
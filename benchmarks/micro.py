@@ -0,0 +1,257 @@
+"""
+Micro-benchmarks for hot pure-Python paths, with stored baselines.
+
+    python -m benchmarks.micro                  # run and compare with the baseline
+    python -m benchmarks.micro --check          # exit 1 on a regression (for CI)
+    python -m benchmarks.micro --save           # record the current numbers as the baseline
+    python -m benchmarks.micro -k render        # only benchmarks whose name contains "render"
+
+Each benchmark reports the best per-call time over several timeit
+repeats. Every run also times a fixed pure-Python calibration loop, and
+results are compared as multiples of that loop. This keeps baselines
+recorded on one machine meaningful on another (within reason). A
+benchmark regresses when its normalised time grows by more than
+``--threshold`` (default 25%) against benchmarks/baselines/micro.json.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from utils.agent_responses import build_assessment_context, extract_final_response, parse_opportunity_from_response
+from utils.firestore import documents_to_dicts
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT_DIR, "benchmarks", "baselines", "micro.json")
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    """Register a factory that does the setup and returns the function to time"""
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return register
+
+
+# Fixtures
+
+_rng = random.Random(42)
+
+OPPORTUNITY_RESPONSE = """Thanks! Here is the final posting:
+
+```
+OPPORTUNITY_READY
+Title: Senior Care Coordinator
+Description: Lead a team of care coordinators across three hospital sites.
+You will own patient hand-offs, escalation paths and weekly reporting.
+Requirements: 5+ years in healthcare operations
+Strong written communication
+Experience with shift scheduling tools
+Location: Portland, OR (hybrid)
+Employment Type: full-time
+Salary Range: $85,000 - $100,000
+Survey Questions:
+1. Describe a time you resolved a conflict between two clinical teams.
+2. How do you prioritise when several urgent requests arrive at once?
+3. Tell us about a process you improved and how you measured it.
+```"""
+
+
+def _opportunity(i: int) -> dict:
+    return {
+        "id": f"opp{i:05d}",
+        "title": f"Opportunity {i}",
+        "company_name": "Horizon Health Network",
+        "company_id": "company_1",
+        "description": "Coordinate cross-team delivery and keep projects moving. " * 6,
+        "requirements": "Three years of experience; clear communication.",
+        "location": "Remote" if i % 2 else "Portland, OR",
+        "employment_type": "full-time",
+        "salary_range": "$80,000 - $95,000" if i % 3 else None,
+        "survey_questions": [{"question": f"Question {q}?", "type": "text", "required": True} for q in range(3)],
+        "created_at": datetime(2025, 1, 1) + timedelta(hours=_rng.randint(0, 5000)),
+        "status": "active",
+    }
+
+
+def _adk_events(tool_rounds: int) -> list:
+    events = []
+    for i in range(tool_rounds):
+        events.append({"content": {"role": "model", "parts": [
+            {"functionCall": {"name": "get_user_guidance", "args": {"user_type": "talent", "task": f"t{i}"}}}]}})
+        events.append({"content": {"role": "user", "parts": [
+            {"functionResponse": {"name": "get_user_guidance", "response": {"result": "Guidance text " * 40}}}]}})
+    events.append({"content": {"role": "model", "parts": [{"text": "Here is what I found. " * 30}]}})
+    return events
+
+
+class _FakeSnapshot:
+    __slots__ = ("id", "_data")
+
+    def __init__(self, doc_id: str, data: dict):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self) -> dict:
+        # Firestore builds a fresh dict for every call
+        return dict(self._data)
+
+
+# Benchmarks
+
+@benchmark("parse_opportunity_from_response")
+def bench_parse_opportunity():
+    return lambda: parse_opportunity_from_response(OPPORTUNITY_RESPONSE)
+
+
+@benchmark("extract_final_response[1 event]")
+def bench_extract_single():
+    events = _adk_events(0)
+    return lambda: extract_final_response(events, "default")
+
+
+@benchmark("extract_final_response[5 tool rounds]")
+def bench_extract_tools():
+    events = _adk_events(5)
+    return lambda: extract_final_response(events, "default")
+
+
+@benchmark("build_assessment_context[50 applicants]")
+def bench_assessment_context():
+    opportunity = _opportunity(1)
+    applications = [{"applicant_name": f"Applicant {i}", "applicant_email": f"applicant{i}@example.com"}
+                    for i in range(50)]
+    return lambda: build_assessment_context(opportunity, "Horizon Health Network", applications,
+                                            "Who are the strongest candidates?")
+
+
+def _card_renderer(count: int):
+    env = Environment(loader=FileSystemLoader(os.path.join(ROOT_DIR, "templates")),
+                      autoescape=select_autoescape(["html"]))
+    template = env.from_string(
+        "{% for opportunity in opportunities %}{% include 'components/opportunity_card.html' %}{% endfor %}")
+    opportunities = [_opportunity(i) for i in range(count)]
+    return lambda: template.render(opportunities=opportunities)
+
+
+for _count in (10, 100, 1000):
+    benchmark(f"render opportunity_card x{_count}")(lambda count=_count: _card_renderer(count))
+
+
+@benchmark("documents_to_dicts[200 opportunities, sorted]")
+def bench_documents_to_dicts():
+    snapshots = [_FakeSnapshot(opp.pop("id"), opp) for opp in (_opportunity(i) for i in range(200))]
+    return lambda: documents_to_dicts(snapshots, sort_by="created_at")
+
+
+def _calibration():
+    total = 0
+    for i in range(10000):
+        total += i * i % 7
+    return total
+
+
+# Runner
+
+def measure(func: Callable[[], object], repeat: int) -> dict:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    times.sort()
+    return {"best_us": round(times[0] * 1e6, 3), "median_us": round(times[len(times) // 2] * 1e6, 3)}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(selected, repeat: int) -> dict:
+    calibration = measure(_calibration, repeat)
+    results = {}
+    for name in selected:
+        result = measure(BENCHMARKS[name](), repeat)
+        result["normalized"] = round(result["best_us"] / calibration["best_us"], 6)
+        results[name] = result
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+        "calibration_us": calibration["best_us"],
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Print a comparison table and return the names that regressed"""
+    regressions = []
+    print(f"\n{'benchmark':<48}{'best':>12}{'baseline':>12}{'change':>10}")
+    print("-" * 82)
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name) if baseline else None
+        line = f"{name:<48}{result['best_us']:>10.1f}us"
+        if previous:
+            change = result["normalized"] / previous["normalized"] - 1
+            flag = "  REGRESSION" if change > threshold else ""
+            line += f"{previous['best_us']:>10.1f}us{change * 100:>+9.1f}%{flag}"
+            if flag:
+                regressions.append(name)
+        print(line)
+    if baseline:
+        print(f"\n(change is relative to the calibration loop; baseline commit {baseline.get('commit')}, "
+              f"python {baseline.get('python')})")
+        if baseline.get("python") != current["python"]:
+            print("Warning: baseline was recorded with a different Python version")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks with stored baselines")
+    parser.add_argument("-k", dest="filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    selected = [name for name in BENCHMARKS if not args.filter or args.filter in name]
+    current = run(selected, args.repeat)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+
+    if args.save:
+        if baseline and args.filter:
+            # Keep entries for benchmarks that were not run
+            current["results"] = {**baseline.get("results", {}), **current["results"]}
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
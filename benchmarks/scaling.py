@@ -0,0 +1,61 @@
+"""
+Scaling benchmark: the same load at several worker counts.
+
+Runs the load-test scenarios once per worker count against the same
+emulators. With more than one worker, ADK sessions go to a shared
+SQLite store, as in the production profile. The report shows
+throughput and p95 per scenario for each worker count, next to the
+speed-up over the first count.
+
+    python -m benchmarks.scaling --workers 1,2,4 --scenarios browse,detail,chat_dashboard --concurrency 20
+"""
+
+import argparse
+import asyncio
+
+from benchmarks.load_test import AppServer, Emulators, add_load_arguments, load_config, run, write_results
+
+
+def print_scaling_report(results: dict):
+    worker_counts = list(results)
+    scenarios = list(results[worker_counts[0]])
+    header = f"{'scenario':<18}" + "".join(f"{f'{w}w rps':>12}{f'{w}w p95':>12}" for w in worker_counts)
+    print("\n" + header + f"{'speed-up':>10}")
+    print("-" * (len(header) + 10))
+    for name in scenarios:
+        line = f"{name:<18}"
+        for workers in worker_counts:
+            summary = results[workers][name]
+            line += f"{summary['throughput_rps']:>12}{summary['p95_ms'] or '-':>12}"
+        first = results[worker_counts[0]][name]["throughput_rps"]
+        last = results[worker_counts[-1]][name]["throughput_rps"]
+        line += f"{last / first:>9.2f}x" if first else f"{'-':>10}"
+        print(line)
+    print("(p95 in ms; speed-up is throughput at the highest worker count over the lowest)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare load-test results across worker counts")
+    add_load_arguments(parser)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--output", help="Where to write results (default benchmarks/results/scaling-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    results = {}
+    with Emulators():
+        for workers in worker_counts:
+            print(f"\n=== {workers} worker(s) ===")
+            with AppServer(workers=workers):
+                results[workers] = asyncio.run(run(args))
+
+    print_scaling_report(results)
+    output = write_results(args.output, "scaling", {
+        "config": {**load_config(args), "workers": worker_counts},
+        "results": {str(workers): scenarios for workers, scenarios in results.items()},
+    })
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Run the app for load testing: Firebase emulators plus the fake model.
+
+Started by ``benchmarks.load_test`` as a subprocess, with
+FIRESTORE_EMULATOR_HOST and FIREBASE_AUTH_EMULATOR_HOST already set.
+Each worker process builds the app with ``create_app()``: Firebase Admin
+is initialised with anonymous credentials, so main.py skips its own
+initialisation and no service account is needed. WEB_CONCURRENCY sets
+the worker count, as in run.py.
+"""
+
+import os
+
+import uvicorn
+
+
+def create_app():
+    import firebase_admin
+    import google.auth.credentials
+    from firebase_admin import credentials
+
+    from benchmarks import fake_llm
+
+    class EmulatorCredential(credentials.Base):
+        """Anonymous credentials; the emulators do not check them"""
+
+        def get_credential(self):
+            return google.auth.credentials.AnonymousCredentials()
+
+    fake_llm.install()
+    firebase_admin.initialize_app(EmulatorCredential(), {"projectId": os.environ["GOOGLE_CLOUD_PROJECT"]})
+
+    from main import app
+    return app
+
+
+def main():
+    if not os.getenv("FIRESTORE_EMULATOR_HOST") or not os.getenv("FIREBASE_AUTH_EMULATOR_HOST"):
+        raise SystemExit("FIRESTORE_EMULATOR_HOST and FIREBASE_AUTH_EMULATOR_HOST must point at the emulators")
+
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1 and not os.getenv("SESSION_DB_URL"):
+        raise SystemExit("SESSION_DB_URL is required with more than one worker")
+
+    uvicorn.run("benchmarks.serve:create_app", factory=True, host="127.0.0.1", port=int(os.getenv("PORT", 8000)),
+                workers=workers, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,9 @@ from google.adk.agents import LlmAgent
 from google.adk.tools import FunctionTool
 from typing import Optional
 
-MODEL = "gemini-2.0-flash-lite"
+from utils.context_cache import context_cache
+from utils.model_router import model_router
+from utils.response_cache import response_cache
 
 def get_user_guidance(user_type: str, task: Optional[str] = None) -> str:
     """Provide user guidance based on their type and current context"""
@@ -130,7 +132,7 @@ Your central hub for all hiring activities!
 # Simplified job matching agent focused on dashboard interactions
 job_matching_agent = LlmAgent(
     name="job_matching_agent",
-    model=MODEL,
+    model=model_router.llm("job_matching_agent"),
     description="Dashboard agent that provides guidance and navigation for talent and company users on the job matching platform.",
     instruction="""You are the main dashboard assistant for Laiers.ai, a professional job matching platform.
 
@@ -166,6 +168,10 @@ Instead, guide users to the right tools and provide general best practices and a
         FunctionTool(get_user_guidance),
         FunctionTool(navigate_to_feature)
     ],
+    # The response cache goes first: a hit answers the turn without routing or caching a model request
+    before_model_callback=[response_cache.before_model_callback(), model_router.before_model_callback(),
+                           context_cache.before_model_callback()],
+    after_model_callback=response_cache.after_model_callback(),
 )
 
 # This MUST be named 'root_agent' for ADK to discover it
@@ -0,0 +1,132 @@
+# job_matching_agent/intents.py
+"""
+Deterministic fast path for the dashboard agent's guidance intents.
+
+Many dashboard messages ("what can you do?", "how do I create an
+opportunity?") end with the agent calling get_user_guidance or
+navigate_to_feature. Both return fixed text. route_guidance() spots
+those intents with keyword rules and calls the tool directly, skipping
+the Gemini round trip.
+
+A message is routed only when at least FAST_PATH_MIN_CONFIDENCE of its
+content words (anything that isn't a stopword) belong to the intent's
+vocabulary, and it names both the action and the thing ("create" +
+"opportunity"). Creating needs an actual creation verb: "list", "open"
+or "new" next to jobs usually means viewing existing ones ("what jobs
+are open?"), so those go to the LLM. Anything more specific ("create an
+opportunity for a night-shift nurse") goes to the LLM. Routed exchanges
+are not added to the ADK session.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+from .agent import get_user_guidance, navigate_to_feature
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", 0.75))
+# Longer messages carry detail the fixed answers can't address
+FAST_PATH_MAX_WORDS = 12
+
+STOPWORDS = frozenset("""
+a an the i me my we our you your it this that to of for on in at with and or can could would should
+do does did is are am be how what where which who when please just want wanna like need some any
+there here so hey hi hello thanks thank ok okay up
+""".split())
+
+# Multi-word phrases collapse to one token before matching
+PHRASES = (
+    ("what can you do", "capabilities"),
+    ("what do you do", "capabilities"),
+    ("what can you help", "capabilities"),
+    ("how does this work", "capabilities"),
+    ("how does it work", "capabilities"),
+    ("get started", "start"),
+    ("job posting", "opportunity"),
+    ("job post", "opportunity"),
+)
+
+CAPABILITIES = frozenset({"capabilities", "help", "start", "options", "features", "assist", "guide", "guidance",
+                          "menu", "commands", "tips", "advice", "welcome", "hi", "hello", "hey"})
+# Verbs only: "list", "open" and "new" also describe existing postings
+CREATE = frozenset({"create", "post", "add", "publish", "make", "write"})
+OPPORTUNITY = frozenset({"opportunity", "opportunities", "job", "jobs", "role", "roles", "position", "positions",
+                         "posting", "postings", "opening", "openings", "vacancy", "listing"})
+BROWSE = frozenset({"browse", "find", "see", "show", "view", "search", "look", "explore", "available", "open",
+                    "current", "all", "apply", "get"})
+DASHBOARD = frozenset({"dashboard", "company", "page", "manage", "applications", "applicants", "go", "take",
+                       "navigate", "view", "see", "show", "find", "where", "active", "get", "list"})
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    user_types: Tuple[str, ...]
+    # Each group must be matched by at least one word
+    required: Tuple[frozenset, ...]
+    # Words that count towards confidence without being required
+    optional: frozenset
+    respond: Callable[[str, dict], str]
+
+    @property
+    def vocabulary(self) -> frozenset:
+        return self.optional.union(*self.required)
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    intent: str
+    confidence: float
+    response: str
+
+
+INTENTS = (
+    Intent("create_opportunity", ("company",), (CREATE, OPPORTUNITY), frozenset({"help", "guide", "new", "start"}),
+           lambda user_type, context: navigate_to_feature("create_opportunity", context)),
+    Intent("browse_opportunities", ("talent",), (BROWSE, OPPORTUNITY), frozenset({"help", "guide"}),
+           lambda user_type, context: navigate_to_feature("opportunities_list", context)),
+    Intent("company_dashboard", ("company",), (frozenset({"dashboard", "postings", "applications", "applicants"}),),
+           DASHBOARD | frozenset({"postings", "opportunities", "my"}),
+           lambda user_type, context: navigate_to_feature("company_dashboard", context)),
+    Intent("capabilities", ("talent", "company"), (CAPABILITIES,), frozenset({"assistant", "agent", "bot"}),
+           lambda user_type, context: get_user_guidance(user_type)),
+)
+
+
+def tokenize(message: str) -> list:
+    text = " ".join(re.findall(r"[a-z']+", message.lower().replace("-", " ")))
+    for phrase, token in PHRASES:
+        text = re.sub(rf"\b{phrase}\b", token, text)
+    return text.split()
+
+
+def classify(message: str, user_type: str) -> Optional[Tuple[Intent, float]]:
+    """Best matching intent and its confidence (share of content words it explains)"""
+    words = tokenize(message)
+    if not words or len(words) > FAST_PATH_MAX_WORDS:
+        return None
+    content = [w for w in words if w not in STOPWORDS] or words
+
+    best = None
+    for intent in INTENTS:
+        if user_type not in intent.user_types:
+            continue
+        if not all(any(w in group for w in content) for group in intent.required):
+            continue
+        confidence = sum(w in intent.vocabulary for w in content) / len(content)
+        if best is None or confidence > best[1]:
+            best = (intent, confidence)
+    return best
+
+
+def route_guidance(message: str, user_type: str, context: dict) -> Optional[IntentMatch]:
+    """Answer directly from the tools when the intent is clear; None means ask the LLM"""
+    if not FAST_PATH_ENABLED:
+        return None
+    match = classify(message, user_type)
+    if not match or match[1] < FAST_PATH_MIN_CONFIDENCE:
+        return None
+    intent, confidence = match
+    return IntentMatch(intent.name, confidence, intent.respond(user_type, context).strip())
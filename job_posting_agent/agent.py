@@ -1,9 +1,12 @@
 from google.adk.agents import LlmAgent
 
+from utils.context_cache import context_cache
+from utils.model_router import model_router
+
 # Simplified job posting agent that focuses on conversation and data collection
 job_posting_agent = LlmAgent(
     name="job_posting_agent",
-    model="gemini-2.0-flash-lite",
+    model=model_router.llm("job_posting_agent"),
     description="Conversational agent that guides users through job posting creation and returns structured data.",
     instruction="""You are a friendly job posting assistant that helps companies create great job opportunities.
 
@@ -48,6 +51,7 @@ User: "I want to post a Software Engineer role"
 You: "Great! Let's create an excellent Software Engineer posting. What's the main focus of this role - backend, frontend, or full-stack development?"
 """,
     tools=[],  # No complex tools - just conversation
+    before_model_callback=[model_router.before_model_callback(), context_cache.before_model_callback()],
 )
 
 # Required for ADK discovery
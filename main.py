@@ -1,21 +1,44 @@
 import os
 import json
 import logging
-import re
+import asyncio
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 import httpx
 from fastapi import FastAPI, Request, Form, HTTPException, Cookie, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, Response
 from fastapi.exceptions import RequestValidationError
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from google.adk.cli.fast_api import get_fast_api_app
 import firebase_admin
 from firebase_admin import credentials, auth
-from utils.firestore import FirestoreService
-from utils.middleware import MaintenanceModeMiddleware
+from utils.firestore import AlreadyApplied, FirestoreService, AVAILABLE_COMPANIES
+from utils.adk_sessions import FIRESTORE_SCHEME, FirestoreSessionService, use_firestore_sessions
+from utils.admission import AdmissionController, AdmissionRejected, parse_limits
+from utils.response_cache import response_cache
+from utils.context_cache import context_cache
+from utils.model_router import model_router
+from utils.singleflight import SingleFlight
+from utils.jobs import DONE, JOB_QUEUE_URL, Job, JobQueue, RetryLater, open_job_store
+from utils.warmup import SessionWarmer
+from utils.rate_limit import Decision, RateLimiter, RateLimitMiddleware
+from utils.usage import UsageTracker
+from utils.agent_responses import build_assessment_context, extract_final_response, extract_model, extract_usage, parse_opportunity_from_response
+from utils.middleware import MaintenanceModeMiddleware, CompressionMiddleware, DEFAULT_COMPRESSIBLE_TYPES, compression_stats, route_template
+from utils.assets import StaticAssets
+from utils.fragments import StaticFragments
+from utils.metrics import (
+    MetricsMiddleware, agent_fast_path, agent_request_duration, chat_requests_in_flight, firestore_call_duration,
+    monitor_event_loop_lag, registry as metrics_registry
+)
+from utils.firestore_ops import FIRESTORE_OPS_HEADER, FirestoreOpsMiddleware, install_operation_counters
+from utils.logs import LogContextMiddleware, configure_logging, parse_sample_rates
+from utils.profiler import MAX_PROFILE_SECONDS, ProfilerBusyError, collapsed, sample_stacks
+from utils.watchdog import LOOP_WATCHDOG_ENABLED, loop_watchdog
+from utils.timing import SERVER_TIMING_ENABLED, ServerTimingMiddleware, TimedJinja2Templates, instrument_methods, span
+from utils.etag import cache_headers, directory_fingerprint, etag_matches, latest_update, not_modified, version_of, weak_etag
 
 # Load environment variables
 load_dotenv()
@@ -27,6 +50,16 @@ GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
 GOOGLE_CLOUD_LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
 ADK_BUCKET_NAME = os.getenv("ADK_BUCKET_NAME")
 PORT = int(os.getenv("PORT", 8000))  # Cloud Run uses PORT env var
+# Shared ADK session store; required once there is more than one worker process (see run.py).
+# firestore:// keeps sessions durable with bounded history (utils/adk_sessions.py)
+SESSION_DB_URL = os.getenv("SESSION_DB_URL", "")
+PROFILE_ADMIN_EMAILS = [e.strip() for e in os.getenv("PROFILE_ADMIN_EMAILS", "").split(",") if e.strip()]
+# Per-agent overrides of AGENT_MAX_CONCURRENCY, e.g. "assessment_agent=2"
+AGENT_CONCURRENCY = parse_limits(os.getenv("AGENT_CONCURRENCY", ""))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 512))
+# Background jobs aren't bound by a browser's patience, so agent calls may take longer
+JOB_AGENT_TIMEOUT = float(os.getenv("JOB_AGENT_TIMEOUT", 120))
+COMPRESSION_CONTENT_TYPES = os.getenv("COMPRESSION_CONTENT_TYPES", ",".join(DEFAULT_COMPRESSIBLE_TYPES)).split(",")
 
 # Dynamic base URL for ADK endpoints - works in both local and Cloud Run
 def get_base_url():
@@ -39,10 +72,13 @@ def get_base_url():
 
 BASE_URL = get_base_url()
 
-# Configure logging
-logging.basicConfig(
+# Configure logging (records are queued and written by a background thread)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json" if ENVIRONMENT == "production" else "text")
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+configure_logging(
     level=logging.DEBUG if ENVIRONMENT == "development" else logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    json_format=LOG_FORMAT == "json",
+    sample_rates=LOG_SAMPLE_RATES
 )
 logger = logging.getLogger(__name__)
 
@@ -126,7 +162,10 @@ if not firebase_admin._apps:
         logger.error(f"Error initializing Firebase Admin SDK: {e}")
         raise
 
-# Initialize Firestore Service
+# Initialize Firestore Service (every method feeds /metrics, and Server-Timing when enabled)
+instrument_methods(FirestoreService, "firestore", histogram=firestore_call_duration)
+# Count raw Firestore reads/writes per request to catch N+1 access patterns
+install_operation_counters()
 try:
     firestore_service = FirestoreService()
     logger.info("Firestore service initialized successfully")
@@ -137,9 +176,81 @@ except Exception as e:
 # Create the main FastAPI app for your custom routes
 app = FastAPI(title="Job Matching App")
 
+# Verified session cookies -> (uid, expiry); invalid cookies are never cached
+SESSION_UID_CACHE_SECONDS = 300
+SESSION_UID_CACHE_SIZE = 4096
+session_uids: "OrderedDict[str, tuple]" = OrderedDict()
+
+async def session_uid(session_token: str) -> str | None:
+    """uid a session cookie was issued to (signature only; routes still check revocation)"""
+    now = time.monotonic()
+    cached = session_uids.get(session_token)
+    if cached and cached[1] > now:
+        return cached[0]
+    try:
+        uid = (await asyncio.to_thread(auth.verify_session_cookie, session_token))["uid"]
+    except Exception:
+        session_uids.pop(session_token, None)
+        return None
+    session_uids[session_token] = (uid, now + SESSION_UID_CACHE_SECONDS)
+    session_uids.move_to_end(session_token)
+    while len(session_uids) > SESSION_UID_CACHE_SIZE:
+        session_uids.popitem(last=False)
+    return uid
+
+async def rate_limit_identity(request: Request) -> str | None:
+    session_token = request.cookies.get("session_token")
+    return await session_uid(session_token) if session_token else None
+
+def rate_limited_response(request: Request, decision: Decision) -> Response:
+    """429 for requests over their rate limit; HTMX gets a fragment it swaps in (see htmx.html)"""
+    headers = {"Retry-After": str(decision.retry_after)}
+    if request.headers.get("HX-Request"):
+        return templates.TemplateResponse("components/rate_limited.html", {
+            "request": request,
+            "retry_after": decision.retry_after
+        }, status_code=429, headers=headers)
+    return JSONResponse({"detail": f"Too many requests. Please try again in {decision.retry_after} seconds."},
+                        status_code=429, headers=headers)
+
+# Token buckets per user or client IP for sign-in, registration and the agent chats
+rate_limiter = RateLimiter()
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, respond=rate_limited_response, identify=rate_limit_identity)
+
 # Add maintenance mode middleware
 app.add_middleware(MaintenanceModeMiddleware)
 
+# Compress pages and HTMX fragments; this wraps MaintenanceMode and RateLimit, so the maintenance and 429 pages are compressed too
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE, content_types=COMPRESSION_CONTENT_TYPES)
+
+# Per-request Server-Timing spans (pass-through unless SERVER_TIMING=true)
+app.add_middleware(ServerTimingMiddleware)
+
+# Firestore operations per request (X-Firestore-Ops header alongside Server-Timing)
+app.add_middleware(FirestoreOpsMiddleware, expose_header=SERVER_TIMING_ENABLED or FIRESTORE_OPS_HEADER)
+
+# Request context for log records (route tagging and LOG_SAMPLE_RATES sampling)
+app.add_middleware(LogContextMiddleware)
+
+# Request latency histograms for /metrics
+app.add_middleware(MetricsMiddleware)
+
+@app.on_event("startup")
+async def start_background_monitors():
+    app.state.event_loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    # Opt-in: report synchronous calls that block the loop (LOOP_WATCHDOG=true)
+    if LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.start(asyncio.get_running_loop())
+    if session_service:
+        app.state.session_eviction_task = asyncio.create_task(session_service.run_eviction())
+    app.state.usage_flush_task = asyncio.create_task(usage_tracker.run_flusher())
+    app.state.job_workers_task = asyncio.create_task(job_queue.run())
+    app.state.rate_limit_sweeper_task = asyncio.create_task(rate_limiter.run_sweeper())
+
+@app.on_event("shutdown")
+async def flush_usage():
+    await usage_tracker.flush()
+
 # Add custom exception handler for validation errors
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -152,12 +263,124 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     """, status_code=422)
 
 # Initialize templates and static files
-templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Static files are fingerprinted and precompressed at startup; templates
+# reference them through asset_url() so they can be cached as immutable
+static_assets = StaticAssets(directory="static")
+templates = TimedJinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = static_assets.url
+app.mount("/static", static_assets, name="static")
+
+# Part of every page ETag so a deploy with new templates or assets invalidates them
+RENDER_VERSION = directory_fingerprint("templates", "static")
+
+# Registration form fields only depend on AVAILABLE_COMPANIES, so render them once
+form_fields = StaticFragments()
+for form_user_type in ("talent", "company"):
+    form_fields.add(form_user_type, templates.get_template("components/registration_fields.html").render(
+        user_type=form_user_type,
+        companies=AVAILABLE_COMPANIES
+    ))
+templates.env.globals["form_fields_version"] = form_fields.version
+
+# Caps concurrent model calls per agent; excess requests queue briefly, then get a "busy" fragment
+admission = AdmissionController(AGENT_CONCURRENCY)
+
+def busy_response(request: Request, rejected: AdmissionRejected):
+    """429 chat fragment; htmx.html lets HTMX swap it in like a normal reply"""
+    return templates.TemplateResponse("components/chat_busy.html", {
+        "request": request,
+        "retry_after": rejected.retry_after
+    }, status_code=429, headers={"Retry-After": str(rejected.retry_after)})
+
+# Concurrent identical agent runs (same agent, session and message) share one call
+agent_flight = SingleFlight("agent_run")
+
+# Token and cost accounting per agent, user and route (flushed to Firestore in batches)
+usage_tracker = UsageTracker()
+
+# Posting and assessment agent turns run as durable background jobs (handlers below the routes)
+job_queue = JobQueue(open_job_store(JOB_QUEUE_URL))
+
+# Chat pages create their agent session (and load assessment context) in the background on page load
+session_warmer = SessionWarmer()
+
+async def create_agent_session(mount: str, agent_name: str, user_id: str, session_id: str, state: dict,
+                               headers: dict | None = None, client: httpx.AsyncClient | None = None):
+    """Create the ADK session a chat will use (an existing session answers 400 and is kept)"""
+    if client is None:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            return await create_agent_session(mount, agent_name, user_id, session_id, state, headers, client)
+    session_url = f"{BASE_URL}{mount}/apps/{agent_name}/users/{user_id}/sessions/{session_id}"
+    try:
+        with span("adk.session"):
+            session_response = await client.post(session_url, json={"state": state}, headers=headers)
+        logger.debug("%s session creation response: %s", agent_name, session_response.status_code)
+        
+        # 400 means the session already exists
+        if session_response.status_code not in [200, 400]:
+            logger.error(f"Session creation failed: {session_response.text}")
+    except Exception as e:
+        logger.debug("Session creation note: %s", e)
+        # Continue - session might already exist
+
+def posting_session_headers(user_id: str, company_id: str, company_name: str) -> dict:
+    return {
+        "X-User-Type": "company",
+        "X-User-ID": user_id,
+        "X-Company-ID": company_id,
+        "X-Company-Name": company_name,
+        "Content-Type": "application/json"
+    }
+
+def assessment_session_headers(user_id: str, company_id: str, opportunity_id: str) -> dict:
+    return {
+        "X-User-Type": "company",
+        "X-User-ID": user_id,
+        "X-Company-ID": company_id,
+        "X-Opportunity-ID": opportunity_id,
+        "Content-Type": "application/json"
+    }
+
+async def load_assessment_context(opportunity_id: str, company_id: str, applications: list | None = None):
+    """Applications and company name the assessment agent is given with every question"""
+    if applications is None:
+        applications, company_info = await asyncio.gather(
+            firestore_service.get_applications_by_opportunity(opportunity_id),
+            firestore_service.get_company_info(company_id),
+        )
+    else:
+        company_info = await firestore_service.get_company_info(company_id)
+    company_name = company_info.get('name', 'Unknown Company') if company_info else 'Unknown Company'
+    return applications, company_name
+
+def warm_assessment_session(user_id: str, opportunity_id: str, opportunity: dict, applications: list | None = None):
+    """Create the assessment session and preload its context while the detail page renders"""
+    company_id = opportunity.get('company_id')
+    session_id = f"assessment_session_{user_id}_{opportunity_id}"
+    
+    async def warm():
+        await create_agent_session("/adk/assessment", "assessment_agent", user_id, session_id,
+                                   {"opportunity_id": opportunity_id, "company_id": company_id},
+                                   assessment_session_headers(user_id, company_id, opportunity_id))
+        loaded, company_name = await load_assessment_context(opportunity_id, company_id, applications)
+        return {"last_application_at": opportunity.get('last_application_at'),
+                "applications": loaded, "company_name": company_name}
+    
+    session_warmer.schedule("assessment_agent", ("assessment_agent", user_id, session_id), warm)
 
 # Mount three independent ADK agents
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 logger.info(f"Looking for agents in directory: {BASE_DIR}")
+session_service = None
+if SESSION_DB_URL.startswith(FIRESTORE_SCHEME):
+    session_service = FirestoreSessionService()
+    use_firestore_sessions(session_service)
+    logger.info("ADK sessions stored in Firestore (compacted above %d tokens, idle TTL %sh)",
+                session_service.token_budget, session_service.idle_ttl / 3600)
+elif SESSION_DB_URL:
+    logger.info(f"ADK sessions stored in {SESSION_DB_URL.split('://')[0]} database")
+else:
+    logger.info("ADK sessions kept in process memory (single worker only)")
 
 try:
     # Mount dashboard agent (job_matching_agent)
@@ -165,7 +388,8 @@ try:
         agents_dir=os.path.join(BASE_DIR, "job_matching_agent"),
         allow_origins=["*"] if ENVIRONMENT == "development" else [],
         web=True,  # This enables the dev UI for dashboard agent
-        trace_to_cloud=False
+        trace_to_cloud=False,
+        session_db_url=SESSION_DB_URL
     )
     app.mount("/adk/dashboard", dashboard_app, name="adk-dashboard")
     logger.info("Dashboard agent mounted under /adk/dashboard")
@@ -175,7 +399,8 @@ try:
         agents_dir=os.path.join(BASE_DIR, "job_posting_agent"),
         allow_origins=["*"] if ENVIRONMENT == "development" else [],
         web=False,  # No dev UI for specialized agents
-        trace_to_cloud=False
+        trace_to_cloud=False,
+        session_db_url=SESSION_DB_URL
     )
     app.mount("/adk/posting", posting_app, name="adk-posting")
     logger.info("Job posting agent mounted under /adk/posting")
@@ -185,7 +410,8 @@ try:
         agents_dir=os.path.join(BASE_DIR, "assessment_agent"),
         allow_origins=["*"] if ENVIRONMENT == "development" else [],
         web=False,  # No dev UI for specialized agents
-        trace_to_cloud=False
+        trace_to_cloud=False,
+        session_db_url=SESSION_DB_URL
     )
     app.mount("/adk/assessment", assessment_app, name="adk-assessment")
     logger.info("Assessment agent mounted under /adk/assessment")
@@ -198,78 +424,6 @@ except Exception as e:
     logger.error(f"Failed to create/mount ADK apps: {e}")
     raise
 
-# Utility Functions
-def parse_opportunity_from_response(response_text: str) -> dict:
-    """Parse structured opportunity data from agent response"""
-    try:
-        # Extract the structured data between OPPORTUNITY_READY markers
-        pattern = r'OPPORTUNITY_READY\s*(.*?)(?=```|$)'
-        match = re.search(pattern, response_text, re.DOTALL)
-        
-        if not match:
-            raise ValueError("No OPPORTUNITY_READY section found")
-        
-        data_section = match.group(1).strip()
-        
-        # Parse each field
-        result = {}
-        
-        # Extract title
-        title_match = re.search(r'Title:\s*(.+)', data_section)
-        result['title'] = title_match.group(1).strip() if title_match else ""
-        
-        # Extract description
-        desc_match = re.search(r'Description:\s*(.+?)(?=\nRequirements:|$)', data_section, re.DOTALL)
-        result['description'] = desc_match.group(1).strip() if desc_match else ""
-        
-        # Extract requirements
-        req_match = re.search(r'Requirements:\s*(.+?)(?=\nLocation:|$)', data_section, re.DOTALL)
-        result['requirements'] = req_match.group(1).strip() if req_match else ""
-        
-        # Extract location
-        loc_match = re.search(r'Location:\s*(.+)', data_section)
-        result['location'] = loc_match.group(1).strip() if loc_match else ""
-        
-        # Extract employment type
-        emp_match = re.search(r'Employment Type:\s*(.+)', data_section)
-        result['employment_type'] = emp_match.group(1).strip() if emp_match else "full-time"
-        
-        # Extract salary range
-        sal_match = re.search(r'Salary Range:\s*(.+)', data_section)
-        salary = sal_match.group(1).strip() if sal_match else ""
-        if salary and salary.lower() != "not specified":
-            result['salary_range'] = salary
-        
-        # Extract survey questions
-        questions = []
-        question_pattern = r'(\d+)\.\s*(.+?)(?=\n\d+\.|$)'
-        question_matches = re.findall(question_pattern, data_section, re.DOTALL)
-        
-        for _, question_text in question_matches:
-            questions.append({
-                "question": question_text.strip(),
-                "type": "text",
-                "required": True
-            })
-        
-        result['survey_questions'] = questions
-        
-        # Validate required fields
-        required_fields = ['title', 'description', 'requirements', 'location', 'employment_type']
-        missing_fields = [field for field in required_fields if not result.get(field)]
-        
-        if missing_fields:
-            raise ValueError(f"Missing required fields: {missing_fields}")
-        
-        if len(questions) < 2:
-            raise ValueError("At least 2 survey questions are required")
-        
-        return result
-        
-    except Exception as e:
-        logger.error(f"Error parsing opportunity data: {e}")
-        raise ValueError(f"Failed to parse opportunity: {str(e)}")
-
 # Auth Helper Functions
 async def get_current_user(session_token: str = Cookie(None)) -> dict | None:
     """Get current user from session token"""
@@ -277,7 +431,8 @@ async def get_current_user(session_token: str = Cookie(None)) -> dict | None:
         return None
     
     try:
-        decoded_token = auth.verify_session_cookie(session_token, check_revoked=True)
+        with span("auth.verify_session_cookie"):
+            decoded_token = auth.verify_session_cookie(session_token, check_revoked=True)
         return decoded_token
     except Exception as e:
         logger.error(f"Error verifying session cookie: {e}")
@@ -290,6 +445,12 @@ async def require_auth(session_token: str = Cookie(None)) -> dict:
         raise HTTPException(status_code=401, detail="Authentication required")
     return user
 
+async def require_debug_admin(user = Depends(require_auth)) -> dict:
+    """Outside development, only accounts in PROFILE_ADMIN_EMAILS may use sensitive debug endpoints"""
+    if ENVIRONMENT != "development" and user.get('email') not in PROFILE_ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Debug endpoint not allowed for this account")
+    return user
+
 async def optional_auth(session_token: str = Cookie(None)) -> dict | None:
     """Optional authentication for pages that work with or without login"""
     return await get_current_user(session_token)
@@ -321,6 +482,7 @@ async def register_page(request: Request, user_type: str = "talent", user = Depe
     return templates.TemplateResponse("register.html", {
         "request": request,
         "user_type": user_type,
+        "companies": AVAILABLE_COMPANIES,
         "firebase_config": web_config
     })
 
@@ -350,7 +512,7 @@ async def register(request: Request):
             id_token = data.get('idToken')
             company_id = None
             
-            logger.info(f"JSON Registration attempt - Email: {email}, User Type: {user_type}")
+            logger.info("JSON Registration attempt - Email: %s, User Type: %s", email, user_type)
             
             if not id_token or user_type not in ['company', 'talent']:
                 raise HTTPException(status_code=400, detail="Invalid registration data")
@@ -361,9 +523,10 @@ async def register(request: Request):
                 
             # Verify the ID token
             try:
-                decoded_token = auth.verify_id_token(id_token)
+                with span("auth.verify_id_token"):
+                    decoded_token = auth.verify_id_token(id_token)
                 user_id = decoded_token['uid']
-                logger.info(f"Token verified - UID: {user_id}")
+                logger.info("Token verified - UID: %s", user_id)
             except Exception as e:
                 logger.error(f"Token verification error: {e}")
                 raise HTTPException(status_code=400, detail=str(e))
@@ -378,7 +541,7 @@ async def register(request: Request):
             name = form_data.get('name')
             company_id = form_data.get('company_id')
             
-            logger.info(f"Form Registration attempt - Email: {email}, User Type: {user_type}, Company ID: {company_id}")
+            logger.info("Form Registration attempt - Email: %s, User Type: %s, Company ID: %s", email, user_type, company_id)
             
             if user_type not in ['company', 'talent']:
                 logger.error(f"Invalid user type: {user_type}")
@@ -407,7 +570,7 @@ async def register(request: Request):
                     display_name=name
                 )
                 user_id = user_record.uid
-                logger.info(f"Created Firebase user - UID: {user_id}")
+                logger.info("Created Firebase user - UID: %s", user_id)
             except Exception as e:
                 logger.error(f"Firebase user creation error: {e}")
                 # Return HTML error response for form requests (status 200 so HTMX processes it)
@@ -438,7 +601,7 @@ async def register(request: Request):
             </div>
             """, status_code=200)
         
-        logger.info(f"Registration successful for user: {email}")
+        logger.info("Registration successful for user: %s", email)
         
         # Return appropriate response based on request type
         if "application/json" in content_type:
@@ -446,7 +609,8 @@ async def register(request: Request):
             # Create session cookie for JSON requests
             if 'id_token' in locals():
                 expires_in = timedelta(days=14)
-                session_cookie = auth.create_session_cookie(id_token, expires_in=expires_in)
+                with span("auth.create_session_cookie"):
+                    session_cookie = auth.create_session_cookie(id_token, expires_in=expires_in)
                 
                 response = Response(content='{"success": true, "redirect": "/dashboard"}', media_type="application/json")
                 response.set_cookie(
@@ -498,16 +662,18 @@ async def login(request: Request):
         
         # Verify the ID token
         try:
-            decoded_token = auth.verify_id_token(id_token)
+            with span("auth.verify_id_token"):
+                decoded_token = auth.verify_id_token(id_token)
             user_id = decoded_token.get('uid')
-            logger.info(f"Login successful - UID: {user_id}")
+            logger.info("Login successful - UID: %s", user_id)
         except Exception as e:
             logger.error(f"Token verification error: {e}")
             raise HTTPException(status_code=400, detail=str(e))
         
         # Create session cookie
         expires_in = timedelta(days=14)
-        session_cookie = auth.create_session_cookie(id_token, expires_in=expires_in)
+        with span("auth.create_session_cookie"):
+            session_cookie = auth.create_session_cookie(id_token, expires_in=expires_in)
         
         response = Response(content='{"success": true, "redirect": "/dashboard"}', media_type="application/json")
         response.set_cookie(
@@ -533,7 +699,12 @@ async def dashboard(request: Request, user = Depends(require_auth)):
         logger.error(f"No profile found for user: {user['uid']}")
         return RedirectResponse(url="/register", status_code=302)
     
-    logger.info(f"Dashboard accessed by user: {user.get('email')}")
+    # The chat's session is created while the page renders
+    session_id = f"session_{user['uid']}"
+    session_warmer.schedule("job_matching_agent", ("job_matching_agent", user['uid'], session_id),
+                            lambda: create_agent_session("/adk", "job_matching_agent", user['uid'], session_id, {}))
+    
+    logger.info("Dashboard accessed by user: %s", user.get('email'))
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
         "user": user,
@@ -561,7 +732,12 @@ async def company_page(request: Request, company_id: str, user = Depends(require
     # Get opportunities for this company
     opportunities = await firestore_service.get_opportunities_by_company(company_id)
     
-    logger.info(f"Company page accessed: {company_id} by user: {user.get('email')}")
+    etag = weak_etag(RENDER_VERSION, user['uid'], version_of(user_profile.get('updated_at')),
+                     company_info.get('user_count'), latest_update(opportunities))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    logger.info("Company page accessed: %s by user: %s", company_id, user.get('email'))
     return templates.TemplateResponse("company.html", {
         "request": request,
         "user": user,
@@ -569,7 +745,7 @@ async def company_page(request: Request, company_id: str, user = Depends(require
         "company": company_info,
         "opportunities": opportunities,
         "firebase_config": web_config
-    })
+    }, headers=cache_headers(etag))
 
 @app.get("/company/{company_id}/opportunities/create", response_class=HTMLResponse)
 async def create_opportunity_page(request: Request, company_id: str, user = Depends(require_auth)):
@@ -588,7 +764,15 @@ async def create_opportunity_page(request: Request, company_id: str, user = Depe
     if not company_info:
         raise HTTPException(status_code=404, detail="Company not found")
     
-    logger.info(f"Opportunity creation page accessed for company: {company_id} by user: {user.get('email')}")
+    # The chat's session is created while the page renders
+    company_name = company_info.get('name', 'Unknown Company')
+    session_id = f"posting_session_{user['uid']}_{company_id}"
+    session_warmer.schedule("job_posting_agent", ("job_posting_agent", user['uid'], session_id), lambda: create_agent_session(
+        "/adk/posting", "job_posting_agent", user['uid'], session_id,
+        {"company_id": company_id, "company_name": company_name, "created_by": user['uid']},
+        posting_session_headers(user['uid'], company_id, company_name)))
+    
+    logger.info("Opportunity creation page accessed for company: %s by user: %s", company_id, user.get('email'))
     return templates.TemplateResponse("create_opportunity.html", {
         "request": request,
         "user": user,
@@ -610,6 +794,16 @@ async def opportunity_detail(request: Request, opportunity_id: str, user = Depen
     if not user_profile:
         raise HTTPException(status_code=404, detail="User profile not found")
     
+    # New applications bump last_application_at, which covers both the
+    # talent "already applied" state and the company applications count
+    etag = weak_etag(RENDER_VERSION, user['uid'], version_of(user_profile.get('updated_at')),
+                     version_of(opportunity.get('updated_at')), version_of(opportunity.get('last_application_at')))
+    is_owner = user_profile.get('user_type') == 'company' and user_profile.get('company_id') == opportunity.get('company_id')
+    if etag_matches(request, etag):
+        if is_owner:
+            warm_assessment_session(user['uid'], opportunity_id, opportunity)
+        return not_modified(etag)
+    
     # Check if user has already applied (for talent users)
     has_applied = False
     if user_profile.get('user_type') == 'talent':
@@ -617,11 +811,13 @@ async def opportunity_detail(request: Request, opportunity_id: str, user = Depen
     
     # Get applications count for company users who own this opportunity
     applications_count = 0
-    if user_profile.get('user_type') == 'company' and user_profile.get('company_id') == opportunity.get('company_id'):
+    if is_owner:
         applications = await firestore_service.get_applications_by_opportunity(opportunity_id)
         applications_count = len(applications)
+        # The assessment chat's session and context are ready before the first question
+        warm_assessment_session(user['uid'], opportunity_id, opportunity, applications)
     
-    logger.info(f"Opportunity detail accessed: {opportunity_id} by user: {user.get('email')}")
+    logger.info("Opportunity detail accessed: %s by user: %s", opportunity_id, user.get('email'))
     return templates.TemplateResponse("opportunity_detail.html", {
         "request": request,
         "user": user,
@@ -630,7 +826,7 @@ async def opportunity_detail(request: Request, opportunity_id: str, user = Depen
         "has_applied": has_applied,
         "applications_count": applications_count,
         "firebase_config": web_config
-    })
+    }, headers=cache_headers(etag))
 
 @app.get("/opportunities", response_class=HTMLResponse)
 async def opportunities_list(request: Request, user = Depends(require_auth)):
@@ -643,14 +839,19 @@ async def opportunities_list(request: Request, user = Depends(require_auth)):
     # Get all active opportunities
     all_opportunities = await firestore_service.get_all_opportunities()
     
-    logger.info(f"Opportunities list accessed by user: {user.get('email')} (found {len(all_opportunities)} opportunities)")
+    etag = weak_etag(RENDER_VERSION, user['uid'], version_of(user_profile.get('updated_at')),
+                     latest_update(all_opportunities))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    logger.info("Opportunities list accessed by user: %s (found %s opportunities)", user.get('email'), len(all_opportunities))
     return templates.TemplateResponse("opportunities_list.html", {
         "request": request,
         "user": user,
         "user_profile": user_profile,
         "opportunities": all_opportunities,
         "firebase_config": web_config
-    })
+    }, headers=cache_headers(etag))
 
 @app.post("/api/chat")
 async def chat_with_agent(
@@ -659,6 +860,7 @@ async def chat_with_agent(
     user = Depends(require_auth)
 ):
     """Chat with the job matching agent via HTMX"""
+    request_started = time.perf_counter()
     try:
         user_profile = await firestore_service.get_user_profile(user['uid'])
         if not user_profile:
@@ -672,83 +874,73 @@ async def chat_with_agent(
         session_id = f"session_{user['uid']}"
         user_id = user["uid"]
         
-        # Add context about user type to the message
         user_type = user_profile.get("user_type", "talent")
+
+        # Guidance and navigation intents are answered straight from the agent's tools
+        from job_matching_agent.intents import route_guidance
+        routed = route_guidance(message, user_type, {"user_type": user_type, "company_id": user_profile.get("company_id")})
+        agent_fast_path.labels(agent_name, routed.intent if routed else "none").inc()
+        if routed:
+            logger.debug("Fast path answered %s (confidence %.2f)", routed.intent, routed.confidence)
+            return templates.TemplateResponse("components/chat_message.html", {
+                "request": request,
+                "user_message": message,
+                "agent_response": routed.response,
+                "timestamp": datetime.now()
+            })
+
+        # Add context about user type to the message
         contextual_message = f"[User type: {user_type}] {message}"
         
-        # First, create or ensure session exists (call ADK endpoint directly)
-        async with httpx.AsyncClient(timeout=30.0) as client:  # Increased timeout to 30 seconds
-            # Create session first - this is required before sending messages
-            session_url = f"{BASE_URL}/adk/apps/{agent_name}/users/{user_id}/sessions/{session_id}"
-            try:
-                session_response = await client.post(session_url, 
-                    json={"state": {}}
-                )
-                logger.debug(f"Session creation response: {session_response.status_code}")
-                
-                # If session creation fails (and it's not because it already exists), handle the error
-                if session_response.status_code not in [200, 400]:  # 400 might mean session already exists
-                    logger.error(f"Session creation failed: {session_response.text}")
-                    
-            except Exception as e:
-                logger.debug(f"Session creation note: {e}")
-                # Continue - session might already exist
+        # Identical messages in flight for one session (e.g. a double submit) share a single agent run
+        async def run_agent():
+            # First, create or ensure session exists (call ADK endpoint directly)
+            async with admission.slot(agent_name, user_id), httpx.AsyncClient(timeout=30.0) as client, chat_requests_in_flight.labels(agent_name).track():  # Increased timeout to 30 seconds
+                # Usually already created in the background when the dashboard loaded
+                warmth = await session_warmer.ensure(agent_name, (agent_name, user_id, session_id), lambda: create_agent_session(
+                    "/adk", agent_name, user_id, session_id, {}, client=client))
             
-            # Send message to agent via ADK's /run endpoint
-            run_url = f"{BASE_URL}/adk/run"
-            run_payload = {
-                "appName": agent_name,        # camelCase, not snake_case
-                "userId": user_id,            # camelCase, not snake_case  
-                "sessionId": session_id,      # camelCase, not snake_case
-                "newMessage": {               # camelCase, not snake_case
-                    "role": "user",
-                    "parts": [{"text": contextual_message}]
-                },
-                "streaming": False            # Add required streaming field
-            }
+                # Send message to agent via ADK's /run endpoint
+                run_url = f"{BASE_URL}/adk/run"
+                run_payload = {
+                    "appName": agent_name,        # camelCase, not snake_case
+                    "userId": user_id,            # camelCase, not snake_case  
+                    "sessionId": session_id,      # camelCase, not snake_case
+                    "newMessage": {               # camelCase, not snake_case
+                        "role": "user",
+                        "parts": [{"text": contextual_message}]
+                    },
+                    "streaming": False            # Add required streaming field
+                }
             
-            logger.debug(f"Sending payload to {run_url}: {run_payload}")
+                logger.debug("Sending payload to %s: %s", run_url, run_payload)
             
-            run_response = await client.post(run_url, json=run_payload)
+                with span("adk.run"), agent_request_duration.labels(agent_name).time():
+                    run_response = await client.post(run_url, json=run_payload)
             
-            # Log the error details if request fails
-            if run_response.status_code != 200:
-                error_details = run_response.text
-                logger.error(f"ADK run endpoint error {run_response.status_code}: {error_details}")
-                # Try to get more details from the response
-                try:
-                    error_json = run_response.json()
-                    logger.error(f"Error JSON: {error_json}")
-                except:
-                    pass
-                raise httpx.HTTPStatusError(f"ADK endpoint error: {error_details}", request=run_response.request, response=run_response)
-            
-            # Parse the response events
-            events = run_response.json()
-            logger.debug(f"ADK response events: {events}")
+                # Log the error details if request fails
+                if run_response.status_code != 200:
+                    error_details = run_response.text
+                    logger.error(f"ADK run endpoint error {run_response.status_code}: {error_details}")
+                    # Try to get more details from the response
+                    try:
+                        error_json = run_response.json()
+                        logger.error(f"Error JSON: {error_json}")
+                    except:
+                        pass
+                    raise httpx.HTTPStatusError(f"ADK endpoint error: {error_details}", request=run_response.request, response=run_response)
             
-            final_response = "I'm sorry, I couldn't process that request."
+                # Parse the response events
+                events = run_response.json()
+                logger.debug("ADK response events: %s", events)
+                usage_tracker.record(agent_name, extract_model(events, model_router.primary(agent_name)), user_id, route_template(request.scope),
+                                     extract_usage(events), contextual_message)
             
-            # Look for the final response in the events
-            if isinstance(events, list):
-                for event in events:
-                    logger.debug(f"Processing event: {event}")
-                    if event.get("turnComplete") and event.get("content"):
-                        content = event["content"]
-                        if content.get("parts"):
-                            for part in content["parts"]:
-                                if part.get("text"):
-                                    final_response = part["text"]
-                                    break
-                            if final_response != "I'm sorry, I couldn't process that request.":
-                                break
-                    # Also check for other possible response formats
-                    elif event.get("content") and event.get("content", {}).get("parts"):
-                        content = event["content"]
-                        for part in content["parts"]:
-                            if part.get("text"):
-                                final_response = part["text"]
-                                break
+                final_response = extract_final_response(events, "I'm sorry, I couldn't process that request.")
+            session_warmer.first_reply((agent_name, user_id, session_id), warmth, time.perf_counter() - request_started)
+            return final_response
+
+        final_response = await agent_flight.do((agent_name, session_id, message), run_agent)
         
         # Return HTMX partial template
         return templates.TemplateResponse("components/chat_message.html", {
@@ -758,6 +950,8 @@ async def chat_with_agent(
             "timestamp": datetime.now()
         })
         
+    except AdmissionRejected as e:
+        return busy_response(request, e)
     except Exception as e:
         logger.error(f"Chat error: {e}")
         return templates.TemplateResponse("components/chat_error.html", {
@@ -783,36 +977,53 @@ async def create_opportunity_chat(
             raise HTTPException(status_code=403, detail="Access denied")
         
         # Use dedicated job posting agent
-        agent_name = "job_posting_agent"
+        from job_posting_agent.agent import root_agent as posting_agent
+        agent_name = posting_agent.name
         
         # Prepare session and user IDs
         session_id = f"posting_session_{user['uid']}_{company_id}"
         user_id = user["uid"]
         
-        # Get company info for context
-        company_info = await firestore_service.get_company_info(company_id)
-        company_name = company_info.get('name', 'Unknown Company') if company_info else 'Unknown Company'
+        # The agent turn (and creating the opportunity) runs as a background job; a double submit joins it
+        job = await job_queue.enqueue("posting", user_id, {
+            "company_id": company_id,
+            "session_id": session_id,
+            "message": message,
+            "route": route_template(request.scope),
+        }, dedupe_key=f"{agent_name}|{session_id}|{message}")
+        return job_fragment(request, await job_queue.wait(job))
         
+    except Exception as e:
+        logger.error(f"Opportunity creation chat error: {e}")
+        return templates.TemplateResponse("components/chat_error.html", {
+            "request": request,
+            "error": "Failed to process opportunity creation message. Please try again."
+        })
+
+@job_queue.handler("posting")
+async def posting_job(job: Job) -> dict:
+    """One job posting agent turn; creates the opportunity once the agent reports it ready"""
+    from job_posting_agent.agent import root_agent as posting_agent
+    agent_name = posting_agent.name
+    user_id = job.user_id
+    company_id = job.payload["company_id"]
+    session_id = job.payload["session_id"]
+    message = job.payload["message"]
+    
+    # Get company info for context
+    company_info = await firestore_service.get_company_info(company_id)
+    company_name = company_info.get('name', 'Unknown Company') if company_info else 'Unknown Company'
+    
+    try:
         # Send message to job posting agent via ADK
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Create session with context
-            session_url = f"{BASE_URL}/adk/posting/apps/{agent_name}/users/{user_id}/sessions/{session_id}"
-            session_headers = {
-                "X-User-Type": "company",
-                "X-User-ID": user_id,
-                "X-Company-ID": company_id,
-                "X-Company-Name": company_name,
-                "Content-Type": "application/json"
-            }
-            
-            try:
-                session_response = await client.post(session_url, 
-                    json={"state": {"company_id": company_id, "company_name": company_name, "created_by": user_id}}, 
-                    headers=session_headers)
-                logger.debug(f"Posting session creation response: {session_response.status_code}")
-            except Exception as e:
-                logger.debug(f"Posting session creation note: {e}")
-            
+        async with admission.slot(agent_name, user_id), httpx.AsyncClient(timeout=JOB_AGENT_TIMEOUT) as client, chat_requests_in_flight.labels(agent_name).track():
+            # Create session with context (usually done in the background when the creation page loaded)
+            session_headers = posting_session_headers(user_id, company_id, company_name)
+            warmth = await session_warmer.ensure(agent_name, (agent_name, user_id, session_id), lambda: create_agent_session(
+                "/adk/posting", agent_name, user_id, session_id,
+                {"company_id": company_id, "company_name": company_name, "created_by": user_id},
+                session_headers, client))
+        
             # Send message to agent
             run_url = f"{BASE_URL}/adk/posting/run"
             run_payload = {
@@ -825,56 +1036,46 @@ async def create_opportunity_chat(
                 },
                 "streaming": False
             }
-            
-            logger.debug(f"Sending job posting payload: {run_payload}")
-            run_response = await client.post(run_url, json=run_payload, headers=session_headers)
-            
+        
+            logger.debug("Sending job posting payload: %s", run_payload)
+            # Once the message reaches the agent, a repeat could publish the opportunity twice
+            await job_queue.final_attempt(job)
+            with span("adk.run"), agent_request_duration.labels(agent_name).time():
+                run_response = await client.post(run_url, json=run_payload, headers=session_headers)
+        
             if run_response.status_code != 200:
                 error_details = run_response.text
                 logger.error(f"Job posting ADK error {run_response.status_code}: {error_details}")
                 raise httpx.HTTPStatusError(f"ADK endpoint error: {error_details}", request=run_response.request, response=run_response)
-            
+        
             # Parse the response
             events = run_response.json()
-            final_response = "Hello! I'm your specialized job posting assistant. Let's create an amazing opportunity together!"
-            
-            if isinstance(events, list):
-                for event in events:
-                    if event.get("turnComplete") and event.get("content"):
-                        content = event["content"]
-                        if content.get("parts"):
-                            for part in content["parts"]:
-                                if part.get("text"):
-                                    final_response = part["text"]
-                                    break
-                            if final_response != "I'm ready to help you create an opportunity. Please provide details about the job position.":
-                                break
-                    elif event.get("content") and event.get("content", {}).get("parts"):
-                        content = event["content"]
-                        for part in content["parts"]:
-                            if part.get("text"):
-                                final_response = part["text"]
-                                break
+            usage_tracker.record(agent_name, extract_model(events, model_router.primary(agent_name)), user_id, job.payload["route"],
+                                 extract_usage(events), message)
+            final_response = extract_final_response(events, "Hello! I'm your specialized job posting assistant. Let's create an amazing opportunity together!")
+    except AdmissionRejected as e:
+        raise RetryLater(e.retry_after, str(e))
+    
+    # Check if agent provided structured opportunity data
+    if "OPPORTUNITY_READY" in final_response:
+        await job_queue.progress(job, "Publishing your opportunity…")
+        try:
+            opportunity_data = parse_opportunity_from_response(final_response)
+            opportunity_data.update({
+                "company_id": company_id,
+                "company_name": company_name,
+                "created_by": user_id,
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+                "status": "active"
+            })
         
-        # Check if agent provided structured opportunity data
-        if "OPPORTUNITY_READY" in final_response:
-            try:
-                opportunity_data = parse_opportunity_from_response(final_response)
-                opportunity_data.update({
-                    "company_id": company_id,
-                    "company_name": company_name,
-                    "created_by": user_id,
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow(),
-                    "status": "active"
-                })
-                
-                # Create opportunity in Firestore
-                opportunity_id = await firestore_service.create_opportunity(opportunity_data)
-                
-                if opportunity_id:
-                    logger.info(f"Successfully created opportunity {opportunity_id} from agent response")
-                    final_response = f"""🎉 **Opportunity Created Successfully!**
+            # Create opportunity in Firestore
+            opportunity_id = await firestore_service.create_opportunity(opportunity_data)
+        
+            if opportunity_id:
+                logger.info("Successfully created opportunity %s from agent response", opportunity_id)
+                final_response = f"""🎉 **Opportunity Created Successfully!**
 
 **"{opportunity_data.get('title')}"** has been posted and is now live on your company page.
 
@@ -886,29 +1087,26 @@ async def create_opportunity_chat(
 • [Create another opportunity](/company/{company_id}/opportunities/create)
 
 Candidates can now discover and apply to this position!"""
-                else:
-                    final_response = "❌ **Creation Failed**: Unable to save opportunity to database. Please try again."
-                    
-            except Exception as parse_error:
-                logger.error(f"Failed to parse opportunity data: {parse_error}")
-                final_response = f"❌ **Parsing Error**: {final_response}\n\n*Note: Please try rephrasing your request.*"
-        
-        logger.debug(f"Job posting agent response: {final_response[:200]}...")
-        
-        # Return HTMX partial template
-        return templates.TemplateResponse("components/chat_message.html", {
-            "request": request,
-            "user_message": message,
-            "agent_response": final_response,
-            "timestamp": datetime.now()
-        })
-        
-    except Exception as e:
-        logger.error(f"Opportunity creation chat error: {e}")
-        return templates.TemplateResponse("components/chat_error.html", {
-            "request": request,
-            "error": "Failed to process opportunity creation message. Please try again."
-        })
+            else:
+                final_response = "❌ **Creation Failed**: Unable to save opportunity to database. Please try again."
+            
+        except Exception as parse_error:
+            logger.error(f"Failed to parse opportunity data: {parse_error}")
+            final_response = f"❌ **Parsing Error**: {final_response}\n\n*Note: Please try rephrasing your request.*"
+    
+    logger.debug("Job posting agent response: %s...", final_response[:200])
+    session_warmer.first_reply((agent_name, user_id, session_id), warmth, time.time() - job.created_at)
+    return {"response": final_response}
+
+ALREADY_APPLIED_HTML = """
+                <div class="application-result already-applied">
+                    <p><strong>❌ Already Applied</strong></p>
+                    <p>You have already submitted an application for this opportunity.</p>
+                    <div class="opportunity-actions">
+                        <a href="/dashboard" class="action-button secondary-button">Return to Dashboard</a>
+                    </div>
+                </div>
+            """
 
 @app.post("/api/opportunities/{opportunity_id}/apply")
 async def submit_application(
@@ -934,15 +1132,7 @@ async def submit_application(
         # Check if already applied
         has_applied = await firestore_service.check_existing_application(opportunity_id, user['uid'])
         if has_applied:
-            return HTMLResponse(content="""
-                <div class="application-result already-applied">
-                    <p><strong>❌ Already Applied</strong></p>
-                    <p>You have already submitted an application for this opportunity.</p>
-                    <div class="opportunity-actions">
-                        <a href="/dashboard" class="action-button secondary-button">Return to Dashboard</a>
-                    </div>
-                </div>
-            """)
+            return HTMLResponse(content=ALREADY_APPLIED_HTML)
         
         # Collect survey responses
         survey_responses = {}
@@ -964,11 +1154,14 @@ async def submit_application(
             "survey_responses": survey_responses
         }
         
-        # Submit application
-        application_id = await firestore_service.submit_application(application_data)
+        # Submit application; a concurrent submit (e.g. a double click) may have got past the check above
+        try:
+            application_id = await firestore_service.submit_application(application_data)
+        except AlreadyApplied:
+            return HTMLResponse(content=ALREADY_APPLIED_HTML)
         
         if application_id:
-            logger.info(f"Application submitted: {application_id} for opportunity: {opportunity_id} by user: {user.get('email')}")
+            logger.info("Application submitted: %s for opportunity: %s by user: %s", application_id, opportunity_id, user.get('email'))
             return HTMLResponse(content=f"""
                 <div class="application-result success">
                     <p><strong>🎉 Application Submitted Successfully!</strong></p>
@@ -1013,6 +1206,12 @@ async def logout(request: Request):
     response.delete_cookie("session_token")
     return response
 
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics():
+    """Request, Firestore, agent, cache and event-loop metrics in Prometheus text format"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # Health check endpoints
 @app.get("/health")
 async def health_check():
@@ -1052,7 +1251,7 @@ async def debug_adk():
         from job_matching_agent.agent import root_agent
         return {
             "agent_name": root_agent.name,
-            "agent_model": root_agent.model,
+            "agent_model": model_router.primary(root_agent.name),
             "adk_dev_ui_url": f"{BASE_URL}/adk/dev-ui/",
             "agent_endpoint": f"/adk/apps/{root_agent.name}/users/test/sessions/test",
             "status": "ADK mounted successfully under /adk"
@@ -1099,6 +1298,97 @@ async def debug_secrets():
             "timestamp": datetime.now().isoformat()
         }
 
+@app.get("/debug/compression")
+async def debug_compression():
+    """Debug endpoint to see response compression byte savings per route"""
+    return {
+        "minimum_size": COMPRESSION_MIN_SIZE,
+        "content_types": COMPRESSION_CONTENT_TYPES,
+        "routes": compression_stats.snapshot()
+    }
+
+@app.get("/debug/admission")
+async def debug_admission():
+    """Debug endpoint showing agent slots in use and queued requests"""
+    return {"agents": admission.snapshot()}
+
+@app.get("/debug/fast-path")
+async def debug_fast_path():
+    """Debug endpoint showing how many dashboard chats the intent fast path answered"""
+    intents = {intent: child.value for (agent, intent), child in agent_fast_path.children.items()}
+    total = sum(intents.values())
+    return {
+        "intents": intents,
+        "total": total,
+        "hit_rate": round(1 - intents.get("none", 0) / total, 3) if total else None
+    }
+
+@app.get("/debug/response-cache")
+async def debug_response_cache(user = Depends(require_debug_admin)):
+    """Debug endpoint showing response cache hit rate and the model time and tokens it saved"""
+    return response_cache.snapshot()
+
+@app.get("/debug/context-cache")
+async def debug_context_cache():
+    """Debug endpoint listing the model-side context caches this worker is using"""
+    return context_cache.snapshot()
+
+@app.get("/debug/jobs")
+async def debug_jobs():
+    """Debug endpoint with background job counts by status"""
+    return await job_queue.snapshot()
+
+@app.get("/debug/rate-limits")
+async def debug_rate_limits():
+    """Debug endpoint with rate limit policies and the buckets this worker holds"""
+    return rate_limiter.snapshot()
+
+@app.get("/debug/warmup")
+async def debug_warmup():
+    """Debug endpoint with warmed sessions and mean time to first reply (warm vs cold)"""
+    return session_warmer.snapshot()
+
+@app.get("/debug/models")
+async def debug_models():
+    """Debug endpoint showing model routes and each model's rolling p95 and error rate"""
+    return model_router.snapshot()
+
+@app.get("/debug/usage")
+async def debug_usage(user = Depends(require_debug_admin)):
+    """Debug endpoint with this worker's token and cost totals and its largest prompts"""
+    return usage_tracker.snapshot()
+
+@app.get("/debug/usage/report")
+async def debug_usage_report(days: int = 7, user = Depends(require_debug_admin)):
+    """Token and cost report across all workers (from Firestore), with the highest-token prompts"""
+    await usage_tracker.flush()
+    return await usage_tracker.report(days=max(1, min(days, 90)))
+
+@app.get("/debug/blocking")
+async def debug_blocking(user = Depends(require_debug_admin)):
+    """Debug endpoint listing call sites that blocked the event loop, worst first"""
+    return {
+        "enabled": LOOP_WATCHDOG_ENABLED,
+        "threshold_ms": loop_watchdog.threshold * 1000,
+        "sites": loop_watchdog.report()
+    }
+
+@app.get("/debug/profile")
+async def debug_profile(seconds: float = 10, hz: int = 100, user = Depends(require_debug_admin)):
+    """Sample the live process and return a flamegraph-compatible collapsed-stack file"""
+    seconds = min(max(seconds, 1), MAX_PROFILE_SECONDS)
+    hz = min(max(hz, 1), 1000)
+    
+    logger.info(f"Profiling for {seconds}s at {hz}Hz requested by {user.get('email')}")
+    try:
+        stacks = await asyncio.to_thread(sample_stacks, seconds, hz, BASE_DIR)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return PlainTextResponse(collapsed(stacks), headers={
+        "Content-Disposition": f'attachment; filename="profile-{datetime.now():%Y%m%d-%H%M%S}.collapsed"'
+    })
+
 @app.get("/debug/routes")
 async def debug_routes():
     """Debug endpoint to see all available routes"""
@@ -1199,61 +1489,11 @@ async def test_firestore_users():
 
 # HTMX endpoints for dynamic form fields
 @app.get("/api/form-fields/{user_type}")
-async def get_form_fields(request: Request, user_type: str):
-    """Return form fields based on user type selection"""
-    if user_type == "company":
-        return HTMLResponse(content="""
-        <div class="form-group">
-            <label for="email">Email</label>
-            <input type="email" id="email" name="email" required>
-        </div>
-        
-        <div class="form-group">
-            <label for="password">Password</label>
-            <input type="password" id="password" name="password" required>
-        </div>
-        
-        <div class="form-group">
-            <label for="confirm_password">Confirm Password</label>
-            <input type="password" id="confirm_password" name="confirm_password" required>
-        </div>
-        
-        <div class="form-group">
-            <label for="company_id">Select Your Company</label>
-            <select name="company_id" required>
-                <option value="">Choose a company...</option>
-                <option value="company_1">Horizon_Health_Network</option>
-                <option value="company_2">BuildWell_Construction_Group</option>
-                <option value="company_3">Sparkly_Studios</option>
-            </select>
-        </div>
-        
-        <input type="hidden" name="user_type" value="company">
-        """)
-    else:  # talent
-        return HTMLResponse(content="""
-        <div class="form-group">
-            <label for="email">Email</label>
-            <input type="email" id="email" name="email" required>
-        </div>
-        
-        <div class="form-group">
-            <label for="password">Password</label>
-            <input type="password" id="password" name="password" required>
-        </div>
-        
-        <div class="form-group">
-            <label for="confirm_password">Confirm Password</label>
-            <input type="password" id="confirm_password" name="confirm_password" required>
-        </div>
-        
-        <div class="form-group">
-            <label for="name">Full Name</label>
-            <input type="text" name="name" required>
-        </div>
-        
-        <input type="hidden" name="user_type" value="talent">
-        """)
+async def get_form_fields(request: Request, user_type: str, v: str | None = None):
+    """Return form fields based on user type selection (prebuilt at startup)"""
+    if user_type != "company":
+        user_type = "talent"
+    return form_fields.response(request, user_type, version=v)
 
 # Test page for company flow
 @app.get("/test/company-flow")
@@ -1265,13 +1505,13 @@ async def test_company_flow(request: Request):
 @app.get("/test/register-form")
 async def test_register_form():
     """Test endpoint to show a working registration form"""
-    return HTMLResponse(content="""
+    return HTMLResponse(content=f"""
     <!DOCTYPE html>
     <html>
     <head>
         <title>Test Registration</title>
-        <script src="https://unpkg.com/htmx.org@1.9.10"></script>
-        <link rel="stylesheet" href="/static/css/styles.css">
+        <script defer src="{static_assets.url('js/htmx.js')}"></script>
+        <link rel="stylesheet" href="{static_assets.url('css/styles.css')}">
     </head>
     <body>
         <div class="auth-container">
@@ -1330,7 +1570,7 @@ async def test_adk_complete_flow():
             session_url = f"{BASE_URL}/adk/apps/{agent_name}/users/{user_id}/sessions/{session_id}"
             session_payload = {"state": {}}
             
-            logger.info(f"Creating session at: {session_url}")
+            logger.info("Creating session at: %s", session_url)
             session_response = await client.post(session_url, json=session_payload)
             
             session_result = {
@@ -1358,7 +1598,7 @@ async def test_adk_complete_flow():
                 "streaming": False
             }
             
-            logger.info(f"Sending message to: {run_url}")
+            logger.info("Sending message to: %s", run_url)
             run_response = await client.post(run_url, json=run_payload)
             
             return {
@@ -1413,58 +1653,71 @@ async def assess_candidates(
         if user_profile.get('user_type') != 'company' or user_profile.get('company_id') != opportunity.get('company_id'):
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Get applications for this opportunity
-        applications = await firestore_service.get_applications_by_opportunity(opportunity_id)
-        
         # Use dedicated assessment agent
-        agent_name = "assessment_agent"
+        from assessment_agent.agent import root_agent as assessment_agent
+        agent_name = assessment_agent.name
         
         # Prepare session and user IDs
         session_id = f"assessment_session_{user['uid']}_{opportunity_id}"
         user_id = user["uid"]
         
-        # Get company info for context
-        company_info = await firestore_service.get_company_info(user_profile.get('company_id'))
-        company_name = company_info.get('name', 'Unknown Company') if company_info else 'Unknown Company'
+        # Analysing every applicant runs as a background job; a double submit joins it
+        job = await job_queue.enqueue("assessment", user_id, {
+            "opportunity_id": opportunity_id,
+            "company_id": user_profile.get('company_id'),
+            "session_id": session_id,
+            "message": message,
+            "route": route_template(request.scope),
+        }, dedupe_key=f"{agent_name}|{session_id}|{message}")
+        return job_fragment(request, await job_queue.wait(job))
         
+    except Exception as e:
+        logger.error(f"Assessment chat error: {e}")
+        return templates.TemplateResponse("components/chat_error.html", {
+            "request": request,
+            "error": "Failed to process assessment message. Please try again."
+        })
+
+@job_queue.handler("assessment")
+async def assessment_job(job: Job) -> dict:
+    """Assessment agent turn with the opportunity and all of its applicants as context"""
+    from assessment_agent.agent import root_agent as assessment_agent
+    agent_name = assessment_agent.name
+    user_id = job.user_id
+    opportunity_id = job.payload["opportunity_id"]
+    company_id = job.payload["company_id"]
+    session_id = job.payload["session_id"]
+    message = job.payload["message"]
+    
+    session_key = (agent_name, user_id, session_id)
+    
+    await job_queue.progress(job, "Reading the applications…")
+    opportunity = await firestore_service.get_opportunity(opportunity_id)
+    if not opportunity:
+        return {"error": "This opportunity no longer exists."}
+    # Context preloaded with the detail page, unless an application has arrived since
+    warm = session_warmer.context(session_key)
+    if warm and warm["last_application_at"] == opportunity.get('last_application_at'):
+        applications, company_name = warm["applications"], warm["company_name"]
+    else:
+        applications, company_name = await load_assessment_context(opportunity_id, company_id)
+    
+    await job_queue.progress(job, f"Assessing {len(applications)} applicant{'' if len(applications) == 1 else 's'}…")
+    try:
         # Send message to assessment agent via ADK
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Create session with context
-            session_url = f"{BASE_URL}/adk/assessment/apps/{agent_name}/users/{user_id}/sessions/{session_id}"
-            session_headers = {
-                "X-User-Type": "company",
-                "X-User-ID": user_id,
-                "X-Company-ID": user_profile.get('company_id'),
-                "X-Opportunity-ID": opportunity_id,
-                "Content-Type": "application/json"
-            }
-            
-            try:
-                session_response = await client.post(session_url, 
-                    json={"state": {"opportunity_id": opportunity_id, "company_id": user_profile.get('company_id')}}, 
-                    headers=session_headers)
-                logger.debug(f"Assessment session creation response: {session_response.status_code}")
-            except Exception as e:
-                logger.debug(f"Assessment session creation note: {e}")
-            
+        async with admission.slot(agent_name, user_id), httpx.AsyncClient(timeout=JOB_AGENT_TIMEOUT) as client, chat_requests_in_flight.labels(agent_name).track():
+            # Create session with context (usually done in the background when the detail page loaded)
+            session_headers = assessment_session_headers(user_id, company_id, opportunity_id)
+            warmth = await session_warmer.ensure(agent_name, session_key, lambda: create_agent_session(
+                "/adk/assessment", agent_name, user_id, session_id,
+                {"opportunity_id": opportunity_id, "company_id": company_id}, session_headers, client))
+        
             # Load assessment data and provide to agent
             run_url = f"{BASE_URL}/adk/assessment/run"
-            
+        
             # Prepare rich context for assessment agent
-            assessment_context = f"""Assessment Context:
-**Job Opportunity:** {opportunity.get('title')}
-**Company:** {company_name}
-**Description:** {opportunity.get('description')}
-**Requirements:** {opportunity.get('requirements', 'No specific requirements listed')}
-
-**Survey Questions:**
-{chr(10).join([f"{i+1}. {q.get('question', '')}" for i, q in enumerate(opportunity.get('survey_questions', []))])}
-
-**Candidates:** {len(applications)} applicant(s) have applied
-{chr(10).join([f"- {app['applicant_name']} ({app['applicant_email']})" for app in applications])}
-
-**User Question:** {message}"""
-            
+            assessment_context = build_assessment_context(opportunity, company_name, applications, message)
+        
             run_payload = {
                 "appName": agent_name,
                 "userId": user_id,
@@ -1475,51 +1728,63 @@ async def assess_candidates(
                 },
                 "streaming": False
             }
-            
-            logger.debug(f"Sending assessment payload: {run_payload}")
-            run_response = await client.post(run_url, json=run_payload, headers=session_headers)
-            
+        
+            logger.debug("Sending assessment payload: %s", run_payload)
+            with span("adk.run"), agent_request_duration.labels(agent_name).time():
+                run_response = await client.post(run_url, json=run_payload, headers=session_headers)
+        
             if run_response.status_code != 200:
                 error_details = run_response.text
                 logger.error(f"Assessment ADK error {run_response.status_code}: {error_details}")
                 raise httpx.HTTPStatusError(f"ADK endpoint error: {error_details}", request=run_response.request, response=run_response)
-            
+        
             # Parse the response
             events = run_response.json()
-            final_response = f"Hello! I'm your candidate assessment specialist. I'm ready to help you evaluate applicants for this opportunity."
-            
-            if isinstance(events, list):
-                for event in events:
-                    if event.get("turnComplete") and event.get("content"):
-                        content = event["content"]
-                        if content.get("parts"):
-                            for part in content["parts"]:
-                                if part.get("text"):
-                                    final_response = part["text"]
-                                    break
-                            if final_response != f"Hello! I'm your candidate assessment specialist. I'm ready to help you evaluate applicants for this opportunity.":
-                                break
-                    elif event.get("content") and event.get("content", {}).get("parts"):
-                        content = event["content"]
-                        for part in content["parts"]:
-                            if part.get("text"):
-                                final_response = part["text"]
-                                break
-        
-        # Return HTMX partial template
+            usage_tracker.record(agent_name, extract_model(events, model_router.primary(agent_name)), user_id, job.payload["route"],
+                                 extract_usage(events), assessment_context)
+            final_response = extract_final_response(events, "Hello! I'm your candidate assessment specialist. I'm ready to help you evaluate applicants for this opportunity.")
+    except AdmissionRejected as e:
+        raise RetryLater(e.retry_after, str(e))
+    session_warmer.first_reply(session_key, warmth, time.time() - job.created_at)
+    return {"response": final_response}
+
+JOB_ERRORS = {
+    "posting": "Failed to process opportunity creation message. Please try again.",
+    "assessment": "Failed to process assessment message. Please try again.",
+}
+
+def job_fragment(request: Request, job: Job):
+    """Chat fragment for a job: the reply once finished, otherwise a placeholder that polls /api/jobs/{id}"""
+    if job.status == DONE and job.result and "response" in job.result:
         return templates.TemplateResponse("components/chat_message.html", {
             "request": request,
-            "user_message": message,
-            "agent_response": final_response,
-            "timestamp": datetime.now()
+            "user_message": job.payload["message"],
+            "agent_response": job.result["response"],
+            "timestamp": datetime.fromtimestamp(job.finished_at)
         })
-        
-    except Exception as e:
-        logger.error(f"Assessment chat error: {e}")
+    if job.finished:
         return templates.TemplateResponse("components/chat_error.html", {
             "request": request,
-            "error": "Failed to process assessment message. Please try again."
+            "error": (job.result or {}).get("error") or JOB_ERRORS.get(job.kind, "Something went wrong. Please try again.")
+        })
+    return templates.TemplateResponse("components/chat_pending.html", {
+        "request": request,
+        "job": job,
+        "user_message": job.payload["message"],
+        "timestamp": datetime.fromtimestamp(job.created_at)
+    })
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(request: Request, job_id: str, user = Depends(require_auth)):
+    """Polled by chat_pending.html until the job has finished"""
+    job = await job_queue.get(job_id)
+    if not job or job.user_id != user["uid"]:
+        # 200 so HTMX replaces the placeholder (and stops polling)
+        return templates.TemplateResponse("components/chat_error.html", {
+            "request": request,
+            "error": "This request is no longer available. Please send your message again."
         })
+    return job_fragment(request, job)
 
 if __name__ == "__main__":
     import uvicorn
@@ -2,23 +2,73 @@
 """
 Entry point for running the Job Matching App
 Respects PORT environment variable for Cloud Run compatibility
+
+Production profile: WEB_CONCURRENCY worker processes (default: one per
+available CPU, at least 2). Workers don't share memory, so ADK sessions
+move to a shared store (SESSION_DB_URL). Production defaults to Firestore,
+which all instances share and which keeps history compacted; several
+development workers share a local SQLite file. Background agent jobs
+(JOB_QUEUE_URL) follow the same split: Firestore in production, a local
+SQLite file otherwise. Rate limit buckets (RATE_LIMIT_URL) are shared
+through Firestore in production and kept in memory otherwise; behind
+Cloud Run's front end the client address is the last X-Forwarded-For hop.
 """
 
 import os
 import uvicorn
-from main import app
+
+# Used in development when several workers run without an explicit
+# SESSION_DB_URL. SQLite is only shared by the workers on one machine
+DEFAULT_SESSION_DB_URL = "sqlite:///./adk_sessions.db?timeout=30"
+# Used in production: durable, shared by every Cloud Run instance
+PRODUCTION_SESSION_DB_URL = "firestore://"
+# Job records must be visible to whichever instance the status poll reaches
+PRODUCTION_JOB_QUEUE_URL = "firestore://"
+# A client's requests may reach any instance, so its limits must be shared
+PRODUCTION_RATE_LIMIT_URL = "firestore://"
+
+
+def default_workers() -> int:
+    if os.getenv("ENVIRONMENT", "development") != "production":
+        return 1
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    # Synchronous Firestore/Auth calls block a worker's event loop, so even
+    # a single vCPU benefits from a second worker
+    return max(2, cpus)
+
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = "0.0.0.0"
-    
+    workers = int(os.getenv("WEB_CONCURRENCY", default_workers()))
+
+    if not os.getenv("SESSION_DB_URL"):
+        if os.getenv("ENVIRONMENT", "development") == "production":
+            os.environ["SESSION_DB_URL"] = PRODUCTION_SESSION_DB_URL
+        elif workers > 1:
+            os.environ["SESSION_DB_URL"] = DEFAULT_SESSION_DB_URL
+    if not os.getenv("JOB_QUEUE_URL") and os.getenv("ENVIRONMENT", "development") == "production":
+        os.environ["JOB_QUEUE_URL"] = PRODUCTION_JOB_QUEUE_URL
+    if os.getenv("ENVIRONMENT", "development") == "production":
+        os.environ.setdefault("RATE_LIMIT_URL", PRODUCTION_RATE_LIMIT_URL)
+        os.environ.setdefault("RATE_LIMIT_PROXY_HOPS", "1")
+
     print(f"🚀 Starting Job Matching App on {host}:{port}")
     print(f"📊 Environment: {os.getenv('ENVIRONMENT', 'development')}")
     print(f"🔧 Maintenance Mode: {os.getenv('MAINTENANCE_MODE', 'false')}")
-    
+    print(f"👷 Workers: {workers}")
+    print(f"💬 ADK sessions: {os.getenv('SESSION_DB_URL') or 'in-memory'}")
+    print(f"📋 Agent jobs: {os.getenv('JOB_QUEUE_URL') or 'sqlite:///./jobs.db'}")
+    print(f"🚦 Rate limits: {os.getenv('RATE_LIMIT_URL') or 'memory://'}")
+
+    # An import string lets each worker process load the app itself
     uvicorn.run(
-        app=app,
+        "main:app",
         host=host,
         port=port,
+        workers=workers,
         log_level="info"
-    ) 
\ No newline at end of file
+    )
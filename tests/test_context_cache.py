@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from benchmarks.fake_llm import FakeCacheBackend
+from utils.agent_responses import build_assessment_context
+from utils.context_cache import ContextCache, context_cache_requests, split_marked_context
+
+SPLIT = split_marked_context("Assessment Context:", "\n\n**User Question:** ")
+INSTRUCTION = "You are an expert hiring assistant."
+CALLBACK_CONTEXT = SimpleNamespace(agent_name="assessment_agent")
+
+
+def opportunity(title: str) -> dict:
+    return {"title": title, "description": "Plans and runs projects. " * 40, "requirements": "Five years",
+            "survey_questions": [{"question": "Why this role?"}]}
+
+
+def applications() -> list:
+    return [{"applicant_name": f"Applicant {i}", "applicant_email": f"a{i}@example.com",
+             "survey_responses": {"question_0": "Because it fits. " * 20}} for i in range(3)]
+
+
+def request(*messages: str) -> LlmRequest:
+    contents = []
+    for i, text in enumerate(messages):
+        if i:
+            contents.append(types.Content(role="model", parts=[types.Part(text="An answer.")]))
+        contents.append(types.Content(role="user", parts=[types.Part(text=text)]))
+    return LlmRequest(model="gemini-2.0-flash", contents=contents,
+                      config=types.GenerateContentConfig(system_instruction=INSTRUCTION))
+
+
+def run(cache: ContextCache, llm_request: LlmRequest, expected_result: str):
+    counter = context_cache_requests.labels("assessment_agent", expected_result)
+    before = counter.value
+    callback = cache.before_model_callback(SPLIT)
+    assert asyncio.run(callback(CALLBACK_CONTEXT, llm_request)) is None
+    assert counter.value == before + 1
+    return llm_request
+
+
+def texts(llm_request: LlmRequest) -> list:
+    return [part.text for content in llm_request.contents for part in content.parts]
+
+
+def test_sessions_on_one_opportunity_share_a_cache_without_the_context():
+    backend = FakeCacheBackend()
+    cache = ContextCache(backend=backend, min_tokens=100, enabled=True)
+    context = build_assessment_context(opportunity("Project Manager"), "Horizon Health", applications(), "Who fits?")
+
+    first = run(cache, request(context), "created")
+    assert first.config.cached_content
+    assert first.config.system_instruction is None
+    assert texts(first) == ["**User Question:** Who fits?"]
+    assert backend.created == 1
+
+    # A follow-up in the same session repeats the context; both copies are served from the cache
+    follow_up = build_assessment_context(opportunity("Project Manager"), "Horizon Health", applications(), "And skills?")
+    second = run(cache, request(context, follow_up), "hit")
+    assert second.config.cached_content == first.config.cached_content
+    assert texts(second) == ["**User Question:** Who fits?", "An answer.", "**User Question:** And skills?"]
+
+    # Another session on the same opportunity asks something else
+    other = build_assessment_context(opportunity("Project Manager"), "Horizon Health", applications(), "Rank them")
+    third = run(cache, request(other), "hit")
+    assert third.config.cached_content == first.config.cached_content
+    assert backend.created == 1
+    assert len(cache.snapshot()["entries"]) == 1
+
+
+def test_another_worker_finds_the_cache_instead_of_creating_one():
+    backend = FakeCacheBackend()
+    context = build_assessment_context(opportunity("Project Manager"), "Horizon Health", applications(), "Who fits?")
+    first = run(ContextCache(backend=backend, min_tokens=100, enabled=True), request(context), "created")
+    second = run(ContextCache(backend=backend, min_tokens=100, enabled=True), request(context), "shared")
+    assert second.config.cached_content == first.config.cached_content
+    assert backend.created == 1
+
+
+def test_different_context_creates_a_new_cache():
+    backend = FakeCacheBackend()
+    cache = ContextCache(backend=backend, min_tokens=100, enabled=True)
+    first = run(cache, request(build_assessment_context(
+        opportunity("Project Manager"), "Horizon Health", applications(), "Who fits?")), "created")
+    second = run(cache, request(build_assessment_context(
+        opportunity("Site Engineer"), "BuildWell", applications(), "Who fits?")), "created")
+    assert second.config.cached_content and second.config.cached_content != first.config.cached_content
+    assert backend.created == 2
+
+
+def test_small_prefix_is_sent_unchanged():
+    backend = FakeCacheBackend()
+    cache = ContextCache(backend=backend, min_tokens=100_000, enabled=True)
+    context = build_assessment_context(opportunity("Project Manager"), "Horizon Health", applications(), "Who fits?")
+    llm_request = run(cache, request(context), "small")
+    assert llm_request.config.cached_content is None
+    assert llm_request.config.system_instruction == INSTRUCTION
+    assert texts(llm_request) == [context]
+    assert backend.created == 0
@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+from utils.firestore_ops import FirestoreOps, _count_document_call, _current_ops, to_thread
+
+
+class FakeDocument:
+    def get(self):
+        return SimpleNamespace(exists=True, id="doc", to_dict=lambda: {"name": "x"})
+
+
+FakeDocument.get = _count_document_call(FakeDocument.get, "get")
+
+
+async def load_profile():
+    return await to_thread(lambda: FakeDocument().get())
+
+
+async def load_profiles(count: int):
+    for _ in range(count):
+        await load_profile()
+
+
+def run_in_request(coroutine) -> FirestoreOps:
+    async def request():
+        ops = FirestoreOps()
+        token = _current_ops.set(ops)
+        try:
+            await coroutine
+        finally:
+            _current_ops.reset(token)
+        return ops
+    return asyncio.run(request())
+
+
+def test_read_in_a_thread_is_attributed_to_the_coroutine_that_offloaded_it():
+    ops = run_in_request(load_profiles(3))
+    [(site, count)] = ops.sites.items()
+    assert site.startswith("get tests/test_firestore_ops.py:")
+    assert site.endswith(" in load_profile")
+    assert count == 3
+    assert ops.documents == 3
+
+
+def test_direct_read_is_attributed_to_its_own_line():
+    async def read_inline():
+        FakeDocument().get()
+
+    ops = run_in_request(read_inline())
+    [site] = ops.sites
+    assert site.endswith(" in read_inline")
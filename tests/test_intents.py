@@ -0,0 +1,39 @@
+import pytest
+
+from job_matching_agent.intents import route_guidance
+
+CONTEXT = {"user_type": "company", "company_id": "company_1"}
+
+
+@pytest.mark.parametrize("user_type, message, expected", [
+    # Creating postings
+    ("company", "How do I create an opportunity?", "create_opportunity"),
+    ("company", "Post a new job", "create_opportunity"),
+    ("company", "create job posting", "create_opportunity"),
+    ("company", "I want to add a position", "create_opportunity"),
+    # Existing postings are not a request to create one
+    ("company", "What jobs are open?", None),
+    ("company", "list my jobs", None),
+    ("company", "open positions", None),
+    ("company", "any new jobs?", None),
+    # Navigation
+    ("company", "Take me to my dashboard", "company_dashboard"),
+    ("company", "show applicants", "company_dashboard"),
+    ("company", "list my postings", "company_dashboard"),
+    ("talent", "Show me available jobs", "browse_opportunities"),
+    ("talent", "What jobs are open?", "browse_opportunities"),
+    # Capabilities
+    ("talent", "What can you do?", "capabilities"),
+    ("company", "help", "capabilities"),
+    # Specific or personal requests need the LLM
+    ("company", "Create an opportunity for a night-shift nurse in the ICU", None),
+    ("talent", "Can you review my resume for a nursing role?", None),
+    ("talent", "create a job posting", None),
+    ("talent", "Which of these jobs pays the most in Chicago and offers remote work?", None),
+    ("company", "", None),
+])
+def test_route_guidance(user_type, message, expected):
+    match = route_guidance(message, user_type, {**CONTEXT, "user_type": user_type})
+    assert (match.intent if match else None) == expected
+    if match:
+        assert match.response
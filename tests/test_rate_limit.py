@@ -0,0 +1,40 @@
+from utils.rate_limit import MemoryBuckets, Policy
+
+LOGIN = Policy("login", "ip", 10, 60, (("POST", "/api/login"),))
+REGISTER = Policy("register", "ip", 5, 600, (("POST", "/api/register"),))
+
+
+def test_sweep_drops_full_buckets_behind_one_that_is_still_refilling():
+    buckets = MemoryBuckets()
+    # Oldest first: two login buckets, then a register bucket that refills ten times slower
+    buckets.take("login:ip:1", LOGIN, now=0)
+    buckets.take("login:ip:2", LOGIN, now=1)
+    buckets.take("register:ip:3", REGISTER, now=2)
+    buckets.take("login:ip:4", LOGIN, now=3)
+
+    # One login token refills in 6s; a register token takes 120s
+    assert buckets.sweep(now=30) == 3
+    assert list(buckets.buckets) == ["register:ip:3"]
+
+    assert buckets.sweep(now=200) == 1
+    assert len(buckets) == 0
+
+
+def test_sweep_limited_to_some_keys_leaves_the_others():
+    buckets = MemoryBuckets()
+    buckets.take("login:ip:1", LOGIN, now=0)
+    buckets.take("login:ip:2", LOGIN, now=0)
+
+    assert buckets.sweep(now=30, keys=["login:ip:2", "login:ip:gone"]) == 1
+    assert list(buckets.buckets) == ["login:ip:1"]
+
+
+def test_sweep_keeps_buckets_that_are_not_full():
+    buckets = MemoryBuckets()
+    for _ in range(10):
+        buckets.take("login:ip:1", LOGIN, now=0)
+
+    # Empty after ten requests; full again only after the whole 60s period
+    assert buckets.sweep(now=59) == 0
+    assert buckets.peek("login:ip:1", LOGIN, now=59) == 0
+    assert buckets.sweep(now=60) == 1
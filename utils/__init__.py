@@ -6,3 +6,9 @@ from .model import *
 
 # Secret Manager utilities
 from .secrets import get_secret, load_firebase_config_from_secrets
+
+# Static asset pipeline
+from .assets import StaticAssets
+
+# Conditional GET helpers
+from .etag import weak_etag, etag_matches, not_modified
@@ -0,0 +1,412 @@
+"""
+Firestore-backed ADK session service with history compaction and idle TTL.
+
+Each session is one document in ``adk_sessions``. Its events are stored
+as a compact JSON list (``exclude_none``), and appends use ArrayUnion, so
+a turn costs a single write. ``app:`` and ``user:`` state live in their
+own documents, as in ADK's other services.
+
+History stays bounded. After an agent's final response, if the
+session's events are estimated at more than SESSION_TOKEN_BUDGET
+tokens, the older turns are summarised by the ``session_summary`` route
+of utils/model_router.py (SESSION_SUMMARY_MODEL, with failover). They
+are replaced by a single summary event, and the most recent turns are
+kept verbatim (about half the budget). If the model call fails, a
+shorter extractive summary is used instead.
+
+Sessions idle for longer than SESSION_IDLE_TTL_HOURS are treated as
+missing. ``evict_idle_sessions()`` deletes them, and main.py runs it
+periodically. Firestore can also delete them itself with a TTL policy on
+``expires_at``:
+
+    gcloud firestore fields ttls update expires_at --collection-group=adk_sessions --enable-ttl
+
+Selected with SESSION_DB_URL=firestore:// (see run.py).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from firebase_admin import firestore as admin_firestore
+from google.adk.events import Event
+from google.adk.models.llm_request import LlmRequest
+from google.adk.sessions import BaseSessionService, Session, State
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.genai import types
+
+from .metrics import registry
+from .model_router import model_router
+
+logger = logging.getLogger(__name__)
+
+FIRESTORE_SCHEME = "firestore://"
+SESSION_COLLECTION = "adk_sessions"
+APP_STATE_COLLECTION = "adk_app_state"
+USER_STATE_COLLECTION = "adk_user_state"
+
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", 6000))
+SESSION_IDLE_TTL_HOURS = float(os.getenv("SESSION_IDLE_TTL_HOURS", 72))
+SESSION_EVICTION_INTERVAL = int(os.getenv("SESSION_EVICTION_INTERVAL", 3600))
+
+SUMMARY_ROUTE = "session_summary"
+SUMMARY_PREFIX = "[Summary of the earlier conversation]"
+SUMMARY_PROMPT = (
+    "Summarise this conversation between a user and an assistant so it can continue without the full "
+    "history. Keep names, companies, opportunities, preferences, decisions and open questions. "
+    "Write at most 200 words.\n\n"
+)
+
+session_compactions = registry.counter(
+    "adk_session_compactions_total", "Times an ADK session history was summarised", ("app", "method"))
+session_events_compacted = registry.counter(
+    "adk_session_events_compacted_total", "ADK events replaced by a summary", ("app",))
+session_history_tokens = registry.histogram(
+    "adk_session_history_tokens", "Estimated tokens of session history loaded for a turn", ("app",),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+sessions_evicted = registry.counter(
+    "adk_sessions_evicted_total", "Idle ADK sessions deleted after the TTL")
+
+
+def estimate_tokens(events) -> int:
+    """Rough token count (4 characters per token) of the events' text, calls and results"""
+    chars = 0
+    for event in events:
+        if not event.content or not event.content.parts:
+            continue
+        for part in event.content.parts:
+            if part.text:
+                chars += len(part.text)
+            elif part.function_call:
+                chars += len(json.dumps(part.function_call.args or {}, default=str)) + len(part.function_call.name or "")
+            elif part.function_response:
+                chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // 4
+
+
+def transcript(events, max_chars_per_part: Optional[int] = None) -> str:
+    lines = []
+    for event in events:
+        if not event.content or not event.content.parts:
+            continue
+        for part in event.content.parts:
+            if part.text:
+                text = part.text.strip()
+                if max_chars_per_part and len(text) > max_chars_per_part:
+                    text = text[:max_chars_per_part] + "..."
+                lines.append(f"{event.author}: {text}")
+            elif part.function_call:
+                lines.append(f"{event.author} called {part.function_call.name}")
+    return "\n".join(lines)
+
+
+def extractive_summary(events) -> str:
+    """Fallback when the summary model is unavailable: the first line of every message"""
+    return transcript(events, max_chars_per_part=160)
+
+
+async def summarize_events(events) -> str:
+    request = LlmRequest(
+        model=model_router.primary(SUMMARY_ROUTE),
+        contents=[types.Content(role="user", parts=[types.Part(text=SUMMARY_PROMPT + transcript(events))])],
+        config=types.GenerateContentConfig(temperature=0.2, max_output_tokens=512),
+    )
+    text = ""
+    async for response in model_router.generate(SUMMARY_ROUTE, request, stream=False):
+        if (response.custom_metadata or {}).get("degraded"):
+            raise RuntimeError("no healthy summary model")
+        if response.content and response.content.parts:
+            text = "".join(part.text or "" for part in response.content.parts)
+    return text.strip()
+
+
+def compaction_cut(events, keep_tokens: int) -> int:
+    """Index of the first event to keep: recent turns worth ``keep_tokens``, starting at a user message"""
+    kept = 0
+    cut = len(events)
+    while cut > 0 and kept + estimate_tokens(events[cut - 1:cut]) <= keep_tokens:
+        cut -= 1
+        kept += estimate_tokens(events[cut:cut + 1])
+    # Never split a turn: the kept history starts with the user's message
+    while cut < len(events) and events[cut].author != "user":
+        cut += 1
+    if cut == len(events):
+        # The latest turn alone is over the budget; keep it anyway
+        cut = next((i for i in range(len(events) - 1, -1, -1) if events[i].author == "user"), 0)
+    return cut
+
+
+def _split_state(state: dict) -> tuple:
+    app_state, user_state, session_state = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return app_state, user_state, session_state
+
+
+def _merged_state(session_state: dict, app_state: dict, user_state: dict) -> dict:
+    state = dict(session_state)
+    state.update({State.APP_PREFIX + k: v for k, v in app_state.items()})
+    state.update({State.USER_PREFIX + k: v for k, v in user_state.items()})
+    return state
+
+
+def _dotted(field: str, values: dict) -> dict:
+    """Update paths for individual map keys, so concurrent writers don't replace each other's keys"""
+    return {admin_firestore.FieldPath(field, key).to_api_repr(): value for key, value in values.items()}
+
+
+def _dump(event: Event) -> dict:
+    return event.model_dump(mode="json", exclude_none=True, by_alias=True)
+
+
+class FirestoreSessionService(BaseSessionService):
+    def __init__(self, token_budget: int = SESSION_TOKEN_BUDGET, idle_ttl_hours: float = SESSION_IDLE_TTL_HOURS):
+        self.token_budget = token_budget
+        self.idle_ttl = idle_ttl_hours * 3600
+        self._db = None
+
+    @property
+    def db(self):
+        # Created on first use, so the service can be built before Firebase Admin is initialised
+        if self._db is None:
+            self._db = admin_firestore.client()
+        return self._db
+
+    def _session_ref(self, app_name: str, user_id: str, session_id: str):
+        doc_id = "|".join(part.replace("/", "%2F") for part in (app_name, user_id, session_id))
+        return self.db.collection(SESSION_COLLECTION).document(doc_id)
+
+    def _app_state_ref(self, app_name: str):
+        return self.db.collection(APP_STATE_COLLECTION).document(app_name.replace("/", "%2F"))
+
+    def _user_state_ref(self, app_name: str, user_id: str):
+        return self.db.collection(USER_STATE_COLLECTION).document(
+            f"{app_name}|{user_id}".replace("/", "%2F"))
+
+    def _expires_at(self, timestamp: float) -> datetime:
+        return datetime.fromtimestamp(timestamp, timezone.utc) + timedelta(seconds=self.idle_ttl)
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        app_delta, user_delta, session_state = _split_state(state)
+        now = time.time()
+
+        def write():
+            batch = self.db.batch()
+            batch.set(self._session_ref(app_name, user_id, session_id), {
+                "app_name": app_name,
+                "user_id": user_id,
+                "session_id": session_id,
+                "state": session_state,
+                "events": [],
+                "compactions": 0,
+                "last_update_time": now,
+                "expires_at": self._expires_at(now),
+            })
+            if app_delta:
+                batch.set(self._app_state_ref(app_name), {"state": app_delta}, merge=True)
+            if user_delta:
+                batch.set(self._user_state_ref(app_name, user_id), {"state": user_delta}, merge=True)
+            batch.commit()
+            app_doc, user_doc = self.db.get_all([self._app_state_ref(app_name),
+                                                 self._user_state_ref(app_name, user_id)])
+            return ((app_doc.to_dict() or {}).get("state", {}) if app_doc.exists else {},
+                    (user_doc.to_dict() or {}).get("state", {}) if user_doc.exists else {})
+
+        app_state, user_state = await asyncio.to_thread(write)
+        return Session(app_name=app_name, user_id=user_id, id=session_id,
+                       state=_merged_state(session_state, app_state, user_state), last_update_time=now)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        refs = [self._session_ref(app_name, user_id, session_id), self._app_state_ref(app_name),
+                self._user_state_ref(app_name, user_id)]
+        # One round trip for the session and both state documents
+        snapshots = {snap.reference.path: snap for snap in await asyncio.to_thread(self.db.get_all, refs)}
+        session_doc, app_doc, user_doc = (snapshots.get(ref.path) for ref in refs)
+        if session_doc is None or not session_doc.exists:
+            return None
+
+        data = session_doc.to_dict()
+        if data.get("last_update_time", 0) + self.idle_ttl < time.time():
+            await asyncio.to_thread(session_doc.reference.delete)
+            sessions_evicted.labels().inc()
+            return None
+
+        events = [Event.model_validate(e) for e in data.get("events", [])]
+        session_history_tokens.labels(app_name).observe(estimate_tokens(events))
+        if config:
+            if config.num_recent_events:
+                events = events[-config.num_recent_events:]
+            if config.after_timestamp:
+                events = [e for e in events if e.timestamp >= config.after_timestamp]
+
+        state = _merged_state(
+            data.get("state", {}),
+            (app_doc.to_dict() or {}).get("state", {}) if app_doc and app_doc.exists else {},
+            (user_doc.to_dict() or {}).get("state", {}) if user_doc and user_doc.exists else {},
+        )
+        return Session(app_name=app_name, user_id=user_id, id=session_id, state=state, events=events,
+                       last_update_time=data.get("last_update_time", 0.0))
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        def query():
+            return list(self.db.collection(SESSION_COLLECTION)
+                        .where("app_name", "==", app_name)
+                        .where("user_id", "==", user_id)
+                        .select(["session_id", "state", "last_update_time"])
+                        .stream())
+
+        sessions = []
+        for doc in await asyncio.to_thread(query):
+            data = doc.to_dict()
+            sessions.append(Session(app_name=app_name, user_id=user_id, id=data["session_id"], state={},
+                                    last_update_time=data.get("last_update_time", 0.0)))
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await asyncio.to_thread(self._session_ref(app_name, user_id, session_id).delete)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+
+        app_delta, user_delta, session_delta = _split_state(
+            event.actions.state_delta if event.actions else None)
+
+        def write():
+            batch = self.db.batch()
+            batch.update(self._session_ref(session.app_name, session.user_id, session.id), {
+                "events": admin_firestore.ArrayUnion([_dump(event)]),
+                "last_update_time": event.timestamp,
+                "expires_at": self._expires_at(event.timestamp),
+                **_dotted("state", session_delta),
+            })
+            if app_delta:
+                batch.set(self._app_state_ref(session.app_name), {"state": app_delta}, merge=True)
+            if user_delta:
+                batch.set(self._user_state_ref(session.app_name, session.user_id),
+                          {"state": user_delta}, merge=True)
+            batch.commit()
+
+        await asyncio.to_thread(write)
+
+        if (event.author != "user" and event.is_final_response()
+                and estimate_tokens(session.events) > self.token_budget):
+            try:
+                await self.compact(session)
+            except Exception as e:
+                # The turn itself succeeded; compaction is retried after the next one
+                logger.warning("Session compaction failed for %s/%s: %s", session.app_name, session.id, e)
+        return event
+
+    async def compact(self, session: Session) -> bool:
+        """Replace older turns with a summary event, keeping recent turns worth half the budget"""
+        cut = compaction_cut(session.events, self.token_budget // 2)
+        if cut <= 1:
+            # Nothing before the most recent turn (or only an earlier summary)
+            return False
+        older, recent = session.events[:cut], session.events[cut:]
+
+        try:
+            summary = await summarize_events(older)
+            method = "model"
+        except Exception as e:
+            logger.warning("Summary model failed, using extractive summary: %s", e)
+            summary = ""
+        if not summary:
+            summary = extractive_summary(older)
+            method = "extractive"
+
+        summary_event = Event(
+            author="user",
+            invocation_id=older[-1].invocation_id,
+            timestamp=older[-1].timestamp,
+            content=types.Content(role="user", parts=[types.Part(text=f"{SUMMARY_PREFIX}\n{summary}")]),
+        )
+        compacted_ids = {e.id for e in older}
+        ref = self._session_ref(session.app_name, session.user_id, session.id)
+
+        @admin_firestore.transactional
+        def rewrite(transaction):
+            # Events appended by a concurrent turn since this one loaded are kept
+            stored = ref.get(transaction=transaction).to_dict().get("events", [])
+            remaining = [e for e in stored if e.get("id") not in compacted_ids]
+            transaction.update(ref, {
+                "events": [_dump(summary_event)] + remaining,
+                "compactions": admin_firestore.Increment(1),
+            })
+
+        await asyncio.to_thread(rewrite, self.db.transaction())
+        session.events[:] = [summary_event] + recent
+        session_compactions.labels(session.app_name, method).inc()
+        session_events_compacted.labels(session.app_name).inc(len(older))
+        logger.info("Compacted %d events of session %s/%s (%s summary)",
+                    len(older), session.app_name, session.id, method)
+        return True
+
+    async def evict_idle_sessions(self, batch_size: int = 200) -> int:
+        """Delete sessions whose ``expires_at`` has passed; returns how many were deleted"""
+        def sweep() -> int:
+            deleted = 0
+            while True:
+                docs = list(self.db.collection(SESSION_COLLECTION)
+                            .where("expires_at", "<", datetime.now(timezone.utc))
+                            .select([])
+                            .limit(batch_size)
+                            .stream())
+                if not docs:
+                    return deleted
+                batch = self.db.batch()
+                for doc in docs:
+                    batch.delete(doc.reference)
+                batch.commit()
+                deleted += len(docs)
+
+        deleted = await asyncio.to_thread(sweep)
+        if deleted:
+            sessions_evicted.labels().inc(deleted)
+            logger.info("Evicted %d idle ADK sessions", deleted)
+        return deleted
+
+    async def run_eviction(self, interval: int = SESSION_EVICTION_INTERVAL):
+        while True:
+            try:
+                await self.evict_idle_sessions()
+            except Exception as e:
+                logger.warning("Idle session eviction failed: %s", e)
+            await asyncio.sleep(interval)
+
+
+def use_firestore_sessions(service: FirestoreSessionService):
+    """Make ``get_fast_api_app(session_db_url="firestore://")`` use ``service``.
+
+    ADK 1.2's get_fast_api_app builds a DatabaseSessionService from any
+    session_db_url. The class it looks up is replaced with a factory that
+    returns ``service`` for firestore:// URLs and defers to the original
+    class for everything else.
+    """
+    from google.adk.cli import fast_api
+
+    database_service = getattr(fast_api.DatabaseSessionService, "wrapped", fast_api.DatabaseSessionService)
+
+    def session_service_for(db_url: str, **kwargs):
+        if db_url.startswith(FIRESTORE_SCHEME):
+            return service
+        return database_service(db_url=db_url, **kwargs)
+
+    session_service_for.wrapped = database_service
+    fast_api.DatabaseSessionService = session_service_for
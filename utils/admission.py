@@ -0,0 +1,214 @@
+"""
+Admission control for agent-bound requests.
+
+Each agent gets a fixed number of concurrent model calls
+(AGENT_MAX_CONCURRENCY, or a per-agent override in AGENT_CONCURRENCY).
+Requests beyond that wait in a bounded queue. When the queue is full, or
+a request has waited AGENT_QUEUE_TIMEOUT seconds, it is rejected straight
+away with ``AdmissionRejected``. The caller answers with a 429 "busy"
+fragment and a Retry-After estimate. This way a burst can't exhaust the
+model quota and fail every request at once.
+
+Fairness: one user holds at most AGENT_MAX_PER_USER slots and has at most
+that many requests queued. Freed slots go to queued users in rotation, so
+a user who sends many messages can't keep others waiting.
+
+Limits apply per worker process.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", 8))
+AGENT_MAX_QUEUE = int(os.getenv("AGENT_MAX_QUEUE", 32))
+AGENT_QUEUE_TIMEOUT = float(os.getenv("AGENT_QUEUE_TIMEOUT", 10))
+AGENT_MAX_PER_USER = int(os.getenv("AGENT_MAX_PER_USER", 1))
+
+agent_queue_depth = registry.gauge(
+    "agent_queue_depth", "Requests waiting for an agent slot", ("agent",))
+agent_slots_in_use = registry.gauge(
+    "agent_slots_in_use", "Agent slots currently held", ("agent",))
+agent_queue_wait = registry.histogram(
+    "agent_queue_wait_seconds", "Time spent waiting for an agent slot", ("agent",))
+agent_admission_rejected = registry.counter(
+    "agent_admission_rejected_total", "Agent requests turned away by admission control", ("agent", "reason"))
+
+
+def parse_limits(value: str) -> Dict[str, int]:
+    """Parse ``"assessment_agent=2,job_posting_agent=4"``"""
+    limits = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, limit = item.split("=", 1)
+        try:
+            limits[name.strip()] = int(limit)
+        except ValueError:
+            logger.warning("Ignoring invalid agent concurrency limit %r", item)
+    return limits
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, agent: str, reason: str, retry_after: int):
+        super().__init__(f"{agent} busy ({reason})")
+        self.agent = agent
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AgentLimiter:
+    def __init__(self, name: str, max_concurrent: int = AGENT_MAX_CONCURRENCY, max_queue: int = AGENT_MAX_QUEUE,
+                 queue_timeout: float = AGENT_QUEUE_TIMEOUT, per_user: int = AGENT_MAX_PER_USER):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.per_user = per_user
+        self.active = 0
+        self.active_by_user: Counter = Counter()
+        # user id -> that user's waiters, in the order users will be served
+        self.waiters: "OrderedDict[str, deque]" = OrderedDict()
+        self.queued = 0
+        # Smoothed slot hold time, for Retry-After
+        self.hold_seconds = 5.0
+
+    def _update_gauges(self):
+        agent_queue_depth.labels(self.name).set(self.queued)
+        agent_slots_in_use.labels(self.name).set(self.active)
+
+    def _reject(self, reason: str):
+        agent_admission_rejected.labels(self.name, reason).inc()
+        # Time for the requests ahead to drain through the available slots
+        retry_after = max(1, math.ceil(self.hold_seconds * (self.queued + 1) / self.max_concurrent))
+        logger.info("Admission rejected for %s: %s (queued %d, active %d)", self.name, reason, self.queued, self.active)
+        raise AdmissionRejected(self.name, reason, retry_after)
+
+    def _grant(self, user_id: str):
+        self.active += 1
+        self.active_by_user[user_id] += 1
+
+    def _dispatch(self):
+        """Hand free slots to waiting users in rotation"""
+        granted = True
+        while granted and self.active < self.max_concurrent:
+            granted = False
+            for user_id in list(self.waiters):
+                if self.active >= self.max_concurrent:
+                    break
+                if self.active_by_user[user_id] >= self.per_user:
+                    continue
+                queue = self.waiters.pop(user_id)
+                while queue and queue[0].done():
+                    # Timed out or cancelled, not yet removed by its task
+                    queue.popleft()
+                    self.queued -= 1
+                if queue:
+                    future = queue.popleft()
+                    self.queued -= 1
+                    self._grant(user_id)
+                    future.set_result(None)
+                    granted = True
+                if queue:
+                    # Back of the rotation
+                    self.waiters[user_id] = queue
+        self._update_gauges()
+
+    def _remove_waiter(self, user_id: str, future: asyncio.Future):
+        queue = self.waiters.get(user_id)
+        if queue and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            if not queue:
+                del self.waiters[user_id]
+        self._update_gauges()
+
+    def _release(self, user_id: str):
+        self.active -= 1
+        self.active_by_user[user_id] -= 1
+        if not self.active_by_user[user_id]:
+            del self.active_by_user[user_id]
+        self._dispatch()
+
+    async def _acquire(self, user_id: str):
+        # Free slots are always handed to eligible waiters first, so a free
+        # slot here means nobody who could use it is queued
+        if self.active < self.max_concurrent and self.active_by_user[user_id] < self.per_user:
+            self._grant(user_id)
+            self._update_gauges()
+            return
+        if self.queued >= self.max_queue:
+            self._reject("queue_full")
+        if len(self.waiters.get(user_id, ())) >= self.per_user:
+            self._reject("user_limit")
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(user_id, deque()).append(future)
+        self.queued += 1
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Granted just as we gave up
+                self._release(user_id)
+            else:
+                self._remove_waiter(user_id, future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("timeout")
+
+    @asynccontextmanager
+    async def slot(self, user_id: str):
+        """Hold one of the agent's slots; raises AdmissionRejected when busy"""
+        start = time.perf_counter()
+        await self._acquire(user_id)
+        acquired = time.perf_counter()
+        agent_queue_wait.labels(self.name).observe(acquired - start)
+        try:
+            yield
+        finally:
+            self.hold_seconds = 0.8 * self.hold_seconds + 0.2 * (time.perf_counter() - acquired)
+            self._release(user_id)
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "per_user": self.per_user,
+            "active": self.active,
+            "queued": self.queued,
+            "users_waiting": len(self.waiters),
+            "hold_seconds": round(self.hold_seconds, 2),
+        }
+
+
+class AdmissionController:
+    def __init__(self, limits: Optional[Dict[str, int]] = None, **defaults):
+        self.limits = limits or {}
+        self.defaults = defaults
+        self.limiters: Dict[str, AgentLimiter] = {}
+
+    def limiter(self, agent: str) -> AgentLimiter:
+        limiter = self.limiters.get(agent)
+        if limiter is None:
+            options = dict(self.defaults)
+            if agent in self.limits:
+                options["max_concurrent"] = self.limits[agent]
+            limiter = self.limiters[agent] = AgentLimiter(agent, **options)
+        return limiter
+
+    def slot(self, agent: str, user_id: str):
+        return self.limiter(agent).slot(user_id)
+
+    def snapshot(self) -> dict:
+        return {name: limiter.snapshot() for name, limiter in self.limiters.items()}
@@ -0,0 +1,156 @@
+"""
+Helpers for building agent prompts and reading agent replies.
+
+They are kept out of main.py so they can be imported (and benchmarked)
+without initialising Firebase or mounting the ADK apps.
+"""
+
+import logging
+import re
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def parse_opportunity_from_response(response_text: str) -> dict:
+    """Parse structured opportunity data from agent response"""
+    try:
+        # Extract the structured data between OPPORTUNITY_READY markers
+        pattern = r'OPPORTUNITY_READY\s*(.*?)(?=```|$)'
+        match = re.search(pattern, response_text, re.DOTALL)
+        
+        if not match:
+            raise ValueError("No OPPORTUNITY_READY section found")
+        
+        data_section = match.group(1).strip()
+        
+        # Parse each field
+        result = {}
+        
+        # Extract title
+        title_match = re.search(r'Title:\s*(.+)', data_section)
+        result['title'] = title_match.group(1).strip() if title_match else ""
+        
+        # Extract description
+        desc_match = re.search(r'Description:\s*(.+?)(?=\nRequirements:|$)', data_section, re.DOTALL)
+        result['description'] = desc_match.group(1).strip() if desc_match else ""
+        
+        # Extract requirements
+        req_match = re.search(r'Requirements:\s*(.+?)(?=\nLocation:|$)', data_section, re.DOTALL)
+        result['requirements'] = req_match.group(1).strip() if req_match else ""
+        
+        # Extract location
+        loc_match = re.search(r'Location:\s*(.+)', data_section)
+        result['location'] = loc_match.group(1).strip() if loc_match else ""
+        
+        # Extract employment type
+        emp_match = re.search(r'Employment Type:\s*(.+)', data_section)
+        result['employment_type'] = emp_match.group(1).strip() if emp_match else "full-time"
+        
+        # Extract salary range
+        sal_match = re.search(r'Salary Range:\s*(.+)', data_section)
+        salary = sal_match.group(1).strip() if sal_match else ""
+        if salary and salary.lower() != "not specified":
+            result['salary_range'] = salary
+        
+        # Extract survey questions
+        questions = []
+        question_pattern = r'(\d+)\.\s*(.+?)(?=\n\d+\.|$)'
+        question_matches = re.findall(question_pattern, data_section, re.DOTALL)
+        
+        for _, question_text in question_matches:
+            questions.append({
+                "question": question_text.strip(),
+                "type": "text",
+                "required": True
+            })
+        
+        result['survey_questions'] = questions
+        
+        # Validate required fields
+        required_fields = ['title', 'description', 'requirements', 'location', 'employment_type']
+        missing_fields = [field for field in required_fields if not result.get(field)]
+        
+        if missing_fields:
+            raise ValueError(f"Missing required fields: {missing_fields}")
+        
+        if len(questions) < 2:
+            raise ValueError("At least 2 survey questions are required")
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error parsing opportunity data: {e}")
+        raise ValueError(f"Failed to parse opportunity: {str(e)}")
+
+
+def extract_final_response(events: Any, default: str) -> str:
+    """
+    Text of the agent's reply in ADK /run events.
+
+    The first text part of a ``turnComplete`` event wins; otherwise the
+    last event with a text part; otherwise ``default``.
+    """
+    final_response = default
+    if not isinstance(events, list):
+        return final_response
+
+    for event in events:
+        content = event.get("content")
+        if not content or not content.get("parts"):
+            continue
+        text = next((part["text"] for part in content["parts"] if part.get("text")), None)
+        if text is None:
+            continue
+        if event.get("turnComplete"):
+            return text
+        final_response = text
+    return final_response
+
+
+def extract_usage(events: Any) -> Dict[str, int]:
+    """Token counts the model reported (``usageMetadata``) summed over ADK /run events, one per model call"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "total_tokens": 0, "model_calls": 0}
+    if not isinstance(events, list):
+        return usage
+    for event in events:
+        metadata = event.get("usageMetadata")
+        if not metadata:
+            continue
+        usage["prompt_tokens"] += metadata.get("promptTokenCount") or 0
+        usage["completion_tokens"] += metadata.get("candidatesTokenCount") or 0
+        usage["cached_tokens"] += metadata.get("cachedContentTokenCount") or 0
+        usage["total_tokens"] += metadata.get("totalTokenCount") or 0
+        usage["model_calls"] += 1
+    return usage
+
+
+def extract_model(events: Any, default: str) -> str:
+    """Model that answered the turn, as tagged by the model router (``customMetadata.model``)"""
+    model = default
+    if isinstance(events, list):
+        for event in events:
+            model = (event.get("customMetadata") or {}).get("model") or model
+    return model
+
+
+def build_assessment_context(opportunity: Dict[str, Any], company_name: str,
+                             applications: List[Dict[str, Any]], message: str) -> str:
+    """Prompt for the assessment agent: the opportunity, its survey and the applicants"""
+    questions = "\n".join(
+        f"{i + 1}. {q.get('question', '')}" for i, q in enumerate(opportunity.get('survey_questions', []))
+    )
+    candidates = "\n".join(f"- {app['applicant_name']} ({app['applicant_email']})" for app in applications)
+    return f"""Assessment Context:
+**Job Opportunity:** {opportunity.get('title')}
+**Company:** {company_name}
+**Description:** {opportunity.get('description')}
+**Requirements:** {opportunity.get('requirements', 'No specific requirements listed')}
+
+**Survey Questions:**
+{questions}
+
+**Candidates:** {len(applications)} applicant(s) have applied
+{candidates}
+
+**User Question:** {message}"""
@@ -0,0 +1,204 @@
+"""
+Static asset pipeline: content-hashed filenames, precompressed variants and
+long-lived caching for everything under ``static/``.
+"""
+
+import gzip
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # Optional - gzip variants are always built
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # Optional - images are served as-is without Pillow
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+# Only keep a compressed variant when it saves at least this much
+MIN_COMPRESSION_RATIO = 0.9
+HASH_LENGTH = 10
+
+
+@dataclass
+class StaticAsset:
+    path: str
+    hashed_path: str
+    media_type: str
+    digest: str
+    variants: Dict[str, bytes] = field(default_factory=dict)
+    webp: Optional[bytes] = None
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Parse an Accept-Encoding header into the set of acceptable codings"""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        _, _, quality = params.replace(" ", "").partition("q=")
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding)
+    return accepted
+
+
+def _optimize_image(path: str, data: bytes) -> tuple[bytes, Optional[bytes]]:
+    """Losslessly re-encode a PNG and build a WebP variant when Pillow is available"""
+    if Image is None or not path.lower().endswith(".png"):
+        return data, None
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            png_buffer = io.BytesIO()
+            image.save(png_buffer, format="PNG", optimize=True)
+            webp_buffer = io.BytesIO()
+            image.save(webp_buffer, format="WEBP", lossless=True, method=6)
+    except Exception as e:
+        logger.warning(f"Image optimization failed for {path}: {e}")
+        return data, None
+
+    optimized = png_buffer.getvalue()
+    webp = webp_buffer.getvalue()
+    if len(optimized) >= len(data):
+        optimized = data
+    return optimized, webp if len(webp) < len(optimized) else None
+
+
+class StaticAssets(StaticFiles):
+    """
+    StaticFiles replacement that builds an in-memory manifest at startup.
+
+    Every file is served from memory under its content-hashed name
+    (``css/styles.3f2a1b4c9d.css``) with ``Cache-Control: immutable``, so
+    repeat page views never refetch it. The plain name keeps working with
+    revalidation for links that bypass ``asset_url``. Brotli and gzip
+    variants are precomputed and picked from ``Accept-Encoding``.
+    """
+
+    def __init__(self, directory: str, prefix: str = "/static"):
+        super().__init__(directory=directory)
+        self.prefix = prefix.rstrip("/")
+        self.assets: Dict[str, StaticAsset] = {}
+        self.manifest: Dict[str, str] = {}
+        self._hashed: Dict[str, StaticAsset] = {}
+        self.build()
+
+    def build(self):
+        """Read, fingerprint and precompress every file in the static directory"""
+        self.assets.clear()
+        self.manifest.clear()
+        self._hashed.clear()
+
+        original_bytes = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in sorted(files):
+                full_path = os.path.join(root, filename)
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    data = f.read()
+                original_bytes += len(data)
+                asset = self._build_asset(path, data)
+                self.assets[path] = asset
+                self._hashed[asset.hashed_path] = asset
+                self.manifest[path] = asset.hashed_path
+
+        logger.info(f"Built static asset manifest: {len(self.assets)} files, {original_bytes} bytes")
+
+    def _build_asset(self, path: str, data: bytes) -> StaticAsset:
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        data, webp = _optimize_image(path, data)
+
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        name, ext = os.path.splitext(path)
+        asset = StaticAsset(
+            path=path,
+            hashed_path=f"{name}.{digest}{ext}",
+            media_type=media_type,
+            digest=digest,
+            variants={"identity": data},
+            webp=webp,
+        )
+
+        # PNG/WebP payloads are already compressed; everything else is worth a try
+        if media_type not in ("image/png", "image/jpeg", "image/webp", "image/gif"):
+            candidates = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(data, quality=11)
+            for encoding, compressed in candidates.items():
+                if len(compressed) < len(data) * MIN_COMPRESSION_RATIO:
+                    asset.variants[encoding] = compressed
+        return asset
+
+    def url(self, path: str) -> str:
+        """Template helper: return the fingerprinted URL for a static file"""
+        path = path.lstrip("/")
+        hashed_path = self.manifest.get(path)
+        if hashed_path is None:
+            logger.warning(f"Static asset not found in manifest: {path}")
+            return f"{self.prefix}/{path}"
+        return f"{self.prefix}/{hashed_path}"
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        path = path.replace(os.sep, "/")
+        asset = self._hashed.get(path)
+        immutable = asset is not None
+        if asset is None:
+            asset = self.assets.get(path)
+        if asset is None:
+            # Files added after startup still resolve through StaticFiles
+            return await super().get_response(path, scope)
+
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+
+        request_headers = Headers(scope=scope)
+        body, encoding, media_type, etag = self._negotiate(asset, request_headers)
+        vary = "Accept-Encoding, Accept" if asset.webp is not None else "Accept-Encoding"
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            "ETag": etag,
+            "Vary": vary,
+        }
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    def _negotiate(self, asset: StaticAsset, request_headers: Headers) -> tuple[bytes, str, str, str]:
+        """Pick the representation to send; returns (body, encoding, media type, etag)"""
+        if asset.webp is not None and "image/webp" in request_headers.get("accept", ""):
+            return asset.webp, "identity", "image/webp", f'"{asset.digest}-webp"'
+
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in asset.variants:
+                return asset.variants[encoding], encoding, asset.media_type, f'"{asset.digest}-{encoding}"'
+        return asset.variants["identity"], "identity", asset.media_type, f'"{asset.digest}"'
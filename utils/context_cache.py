@@ -0,0 +1,283 @@
+"""
+Model-side context caching for the agents' static prompt prefix.
+
+Every turn resends an agent's instruction and tool schemas. The
+assessment agent also resends the opportunity and applicant context with
+every message. ``ContextCache.before_model_callback()`` returns an ADK
+before_model_callback that keeps this prefix identical from turn to turn
+and, where it is large enough, serves it from a Gemini cached content:
+
+1. Repeated context blocks are collapsed. When a user message carries
+   the same context as an earlier message (``split_context`` separates
+   the two parts), only its question is sent. The first copy stays where
+   it is, so the prefix doesn't change.
+2. The prefix is the system instruction, tools and the context part of
+   the first message carrying context. That message's question stays in
+   the request, so every conversation about the same context (e.g. the
+   same opportunity and applicants) shares one prefix. Its key is a hash
+   of the model and that content. If the prefix is
+   estimated at CONTEXT_CACHE_MIN_TOKENS or more (model minimums vary),
+   the request is pointed at a cached content for that key, and the
+   cached parts are removed from the request.
+3. Smaller prefixes are sent unchanged and rely on the API's implicit
+   prefix caching, which needs exactly the stable prefix step 1 keeps.
+
+Lifetime: caches are created with CONTEXT_CACHE_TTL. When one is used
+within the last quarter of its TTL, the TTL is extended. At most
+CONTEXT_CACHE_MAX_ENTRIES are tracked per process, and the least
+recently used one is deleted beyond that. Caches carry the key in their
+display name, so another worker that misses locally finds and reuses an
+existing cache instead of creating a duplicate. If a prefix can't be
+cached (too small for the model, or an API error), it isn't retried
+until one TTL has passed.
+
+The backend is pluggable. benchmarks/fake_llm.py installs an in-memory
+one, so load tests exercise prefix reuse without calling the API.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from google.genai import types
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", 4096))
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", 900))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", 100))
+DISPLAY_NAME_PREFIX = "laiers-"
+CHARS_PER_TOKEN = 4
+
+context_cache_requests = registry.counter(
+    "context_cache_requests_total",
+    "Model requests by context cache outcome (hit/shared/created/small/uncacheable/error)", ("agent", "result"))
+context_cache_entries = registry.gauge("context_cache_entries", "Context caches tracked by this process")
+context_cache_tokens = registry.counter(
+    "context_cache_prefix_tokens_total", "Estimated prompt tokens served from context caches", ("agent",))
+
+SplitContext = Callable[[str], Optional[Tuple[str, str]]]
+
+
+def split_marked_context(marker: str, question_marker: str) -> SplitContext:
+    """Split messages that start with ``marker`` into (context, question) at ``question_marker``"""
+    def split(text: str) -> Optional[Tuple[str, str]]:
+        if not text.startswith(marker) or question_marker not in text:
+            return None
+        context, question = text.split(question_marker, 1)
+        return context, question_marker.lstrip() + question
+    return split
+
+
+def collapse_repeated_context(contents: List[types.Content], split: SplitContext) -> List[types.Content]:
+    """Keep the first copy of each context block; later identical copies keep only their question"""
+    seen = set()
+    collapsed = []
+    for content in contents:
+        if content.role == "user" and content.parts and content.parts[0].text:
+            parts = split(content.parts[0].text)
+            if parts:
+                context, question = parts
+                if context in seen:
+                    content = types.Content(role="user", parts=[types.Part(text=question), *content.parts[1:]])
+                seen.add(context)
+        collapsed.append(content)
+    return collapsed
+
+
+def _estimate_tokens(*texts: str) -> int:
+    return sum(len(text) for text in texts) // CHARS_PER_TOKEN
+
+
+def _dump(items) -> str:
+    return json.dumps([item.model_dump(mode="json", exclude_none=True) for item in items or []], sort_keys=True)
+
+
+@dataclass
+class CacheEntry:
+    name: Optional[str]
+    expires_at: float
+    last_used: float
+    tokens: int
+
+
+class GenaiCacheBackend:
+    """Gemini cached contents through google-genai (same credentials as the agents)"""
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client()
+        return self._client
+
+    async def create(self, model: str, display_name: str, system_instruction: Optional[str],
+                     tools: Optional[list], contents: list, ttl: int) -> Tuple[str, float]:
+        cache = await self.client.aio.caches.create(model=model, config=types.CreateCachedContentConfig(
+            display_name=display_name,
+            system_instruction=system_instruction,
+            tools=tools or None,
+            contents=contents or None,
+            ttl=f"{ttl}s",
+        ))
+        return cache.name, cache.expire_time.timestamp()
+
+    async def find(self, display_name: str) -> Optional[Tuple[str, float]]:
+        async for cache in await self.client.aio.caches.list(config={"page_size": 100}):
+            if cache.display_name == display_name and cache.expire_time.timestamp() > time.time():
+                return cache.name, cache.expire_time.timestamp()
+        return None
+
+    async def refresh(self, name: str, ttl: int) -> float:
+        cache = await self.client.aio.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl}s"))
+        return cache.expire_time.timestamp()
+
+    async def delete(self, name: str):
+        await self.client.aio.caches.delete(name=name)
+
+
+class ContextCache:
+    def __init__(self, backend=None, min_tokens: int = CONTEXT_CACHE_MIN_TOKENS, ttl: int = CONTEXT_CACHE_TTL,
+                 max_entries: int = CONTEXT_CACHE_MAX_ENTRIES, enabled: bool = CONTEXT_CACHE_ENABLED):
+        self.backend = backend or GenaiCacheBackend()
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.entries: Dict[str, CacheEntry] = {}
+
+    def before_model_callback(self, split_context: Optional[SplitContext] = None):
+        async def callback(callback_context, llm_request):
+            if not self.enabled:
+                return None
+            agent = callback_context.agent_name
+            try:
+                if split_context:
+                    llm_request.contents = collapse_repeated_context(llm_request.contents, split_context)
+                await self.apply(agent, llm_request, split_context)
+            except Exception as e:
+                # Never fail a turn over caching; the request goes out uncached
+                context_cache_requests.labels(agent, "error").inc()
+                logger.warning("Context cache skipped for %s: %s", agent, e)
+            return None
+        return callback
+
+    def _split_prefix(self, llm_request, split_context: Optional[SplitContext]
+                      ) -> Tuple[List[types.Content], List[types.Content]]:
+        """Contents to cache along with the instruction and tools, and the contents left in the request"""
+        contents = llm_request.contents
+        if not split_context:
+            return [], contents
+        for index, content in enumerate(contents):
+            if content.role == "user" and content.parts and content.parts[0].text:
+                parts = split_context(content.parts[0].text)
+                if parts:
+                    context, question = parts
+                    # Only the context is cached; the question is specific to this conversation
+                    cached = types.Content(role="user", parts=[types.Part(text=context)])
+                    asked = types.Content(role="user", parts=[types.Part(text=question), *content.parts[1:]])
+                    return contents[:index] + [cached], [asked] + contents[index + 1:]
+        return [], contents
+
+    async def apply(self, agent: str, llm_request, split_context: Optional[SplitContext] = None):
+        config = llm_request.config
+        if config is None or config.cached_content:
+            return
+        instruction = config.system_instruction if isinstance(config.system_instruction, str) else ""
+        prefix, remaining = self._split_prefix(llm_request, split_context)
+        tools_json = _dump(config.tools)
+        prefix_json = _dump(prefix)
+        tokens = _estimate_tokens(instruction, tools_json, prefix_json)
+        if tokens < self.min_tokens:
+            context_cache_requests.labels(agent, "small").inc()
+            return
+
+        key = hashlib.sha256(
+            "\x00".join((llm_request.model or "", instruction, tools_json, prefix_json)).encode()
+        ).hexdigest()[:32]
+        entry, result = await self._entry(key, llm_request.model, instruction, config.tools, prefix, tokens)
+        context_cache_requests.labels(agent, result).inc()
+        if entry is None or entry.name is None:
+            return
+
+        config.cached_content = entry.name
+        config.system_instruction = None
+        config.tools = None
+        config.tool_config = None
+        llm_request.contents = remaining
+        context_cache_tokens.labels(agent).inc(tokens)
+
+    async def _entry(self, key: str, model: str, instruction: str, tools, prefix, tokens: int):
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at <= now + 5:
+            del self.entries[key]
+            entry = None
+
+        if entry is not None:
+            if entry.name is None:
+                return entry, "uncacheable"
+            entry.last_used = now
+            if entry.expires_at - now < self.ttl / 4:
+                try:
+                    entry.expires_at = await self.backend.refresh(entry.name, self.ttl)
+                except Exception as e:
+                    logger.warning("Could not extend context cache %s: %s", entry.name, e)
+            return entry, "hit"
+
+        display_name = DISPLAY_NAME_PREFIX + key
+        result = "shared"
+        try:
+            found = await self.backend.find(display_name)
+            if found is None:
+                found = await self.backend.create(model, display_name, instruction or None, tools, prefix, self.ttl)
+                result = "created"
+                logger.info("Created context cache for %s (~%d tokens)", model, tokens)
+            entry = CacheEntry(found[0], found[1], now, tokens)
+        except Exception as e:
+            # Typically a prefix below the model's minimum; don't retry on every turn
+            logger.info("Context cache unavailable for %s (~%d tokens): %s", model, tokens, e)
+            entry = CacheEntry(None, now + self.ttl, now, tokens)
+            result = "uncacheable"
+
+        self.entries[key] = entry
+        await self._evict()
+        return entry, result
+
+    async def _evict(self):
+        while len(self.entries) > self.max_entries:
+            key = min(self.entries, key=lambda k: self.entries[k].last_used)
+            entry = self.entries.pop(key)
+            if entry.name:
+                try:
+                    await self.backend.delete(entry.name)
+                except Exception as e:
+                    logger.warning("Could not delete context cache %s: %s", entry.name, e)
+        context_cache_entries.labels().set(len(self.entries))
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {
+            "enabled": self.enabled,
+            "min_tokens": self.min_tokens,
+            "ttl": self.ttl,
+            "entries": [
+                {"key": key, "name": entry.name, "tokens": entry.tokens,
+                 "expires_in": round(entry.expires_at - now), "idle": round(now - entry.last_used)}
+                for key, entry in self.entries.items()
+            ],
+        }
+
+
+# Shared by the agents (before_model_callback) and /debug/context-cache
+context_cache = ContextCache()
@@ -0,0 +1,73 @@
+"""
+Weak ETag helpers for conditional GET on server-rendered pages.
+"""
+
+import hashlib
+import os
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .metrics import record_cache
+
+# Rendered pages must be revalidated on every navigation, but a matching
+# ETag lets the server answer with an empty 304 instead of a full page
+PAGE_CACHE_CONTROL = "private, no-cache"
+
+
+def directory_fingerprint(*directories: str) -> str:
+    """Hash file names and contents so a deploy with new templates/assets changes every ETag"""
+    digest = hashlib.sha1()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for filename in sorted(files):
+                full_path = os.path.join(root, filename)
+                digest.update(full_path.encode())
+                with open(full_path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def version_of(value: Optional[datetime]) -> str:
+    """Stable string form of a Firestore timestamp (or empty when missing)"""
+    return value.isoformat() if value else ""
+
+
+def latest_update(opportunities: Iterable[dict]) -> str:
+    """Version of a listing: max updated_at plus the ids, so removals also change it"""
+    opportunities = list(opportunities)
+    timestamps = [o.get("updated_at") for o in opportunities if o.get("updated_at")]
+    latest = version_of(max(timestamps)) if timestamps else ""
+    ids = ",".join(o.get("id", "") for o in opportunities)
+    return f"{latest}|{ids}"
+
+
+def weak_etag(*parts: Any) -> str:
+    """Build a weak ETag from the values that determine a rendered page"""
+    digest = hashlib.sha1("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def etag_matches(request: Request, etag: str, cache: str = "page_etag") -> bool:
+    """Weak comparison of If-None-Match against the current ETag (recorded as a cache hit/miss)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        matched = False
+    elif if_none_match.strip() == "*":
+        matched = True
+    else:
+        candidate = etag.removeprefix("W/")
+        matched = any(tag.strip().removeprefix("W/") == candidate for tag in if_none_match.split(","))
+    record_cache(cache, matched)
+    return matched
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL}
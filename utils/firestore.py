@@ -1,12 +1,20 @@
 from firebase_admin import firestore as admin_firestore
+from google.api_core.exceptions import AlreadyExists
 from datetime import datetime
 from typing import Optional, Dict, Any
 import logging
 import os
 import json
 
+from .firestore_ops import to_thread
+from .singleflight import SingleFlight, coalesce
+
 logger = logging.getLogger(__name__)
 
+# Identical reads in flight at the same time share one Firestore round trip.
+# Reads run in a worker thread so the event loop can serve (and coalesce) other requests meanwhile
+read_flight = SingleFlight("firestore")
+
 # Define predefined company list
 AVAILABLE_COMPANIES = [
     {"id": "company_1", "name": "Horizon Health Network", "description": "Healthcare Mid-size hospital system"},
@@ -14,6 +22,26 @@ AVAILABLE_COMPANIES = [
     {"id": "company_3", "name": "Sparkly Studios", "description": "Creative Media - Startup animation studio"}
 ]
 
+class AlreadyApplied(Exception):
+    """Raised by submit_application when the applicant has already applied to the opportunity"""
+
+
+def application_id(opportunity_id: str, applicant_id: str) -> str:
+    # One document per applicant and opportunity, so concurrent submits can't both be stored
+    return f"{opportunity_id}_{applicant_id}"
+
+
+def documents_to_dicts(docs, sort_by: str = None, default=None) -> list:
+    """Snapshot data with the document id added, newest first by ``sort_by`` when given"""
+    results = []
+    for doc in docs:
+        data = doc.to_dict()
+        data['id'] = doc.id
+        results.append(data)
+    if sort_by:
+        results.sort(key=lambda x: x.get(sort_by, default), reverse=True)
+    return results
+
 class FirestoreService:
     def __init__(self):
         # Load project ID from web config or environment variable
@@ -87,9 +115,10 @@ class FirestoreService:
             logger.error(f"Error creating user profile: {e}")
             return False
 
+    @coalesce(read_flight)
     async def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
         try:
-            doc = self.users_collection.document(user_id).get()
+            doc = await to_thread(lambda: self.users_collection.document(user_id).get())
             if doc.exists:
                 return doc.to_dict()
             return None
@@ -116,12 +145,14 @@ class FirestoreService:
             logger.error(f"Error deleting user profile: {e}")
             return False
 
+    @coalesce(read_flight)
     async def get_company_info(self, company_id: str) -> Optional[Dict[str, Any]]:
         try:
             company = next((company for company in AVAILABLE_COMPANIES if company["id"] == company_id), None)
             if company:
                 company_users = []
-                users_query = self.users_collection.where('company_id', '==', company_id).stream()
+                users_query = await to_thread(
+                    lambda: list(self.users_collection.where('company_id', '==', company_id).stream()))
                 for user_doc in users_query:
                     user_data = user_doc.to_dict()
                     company_users.append({
@@ -158,17 +189,12 @@ class FirestoreService:
             logger.error(f"Error creating opportunity: {e}")
             return None
 
+    @coalesce(read_flight)
     async def get_opportunities_by_company(self, company_id: str) -> list:
         try:
             query = self.db.collection('opportunities').where('company_id', '==', company_id).where('status', '==', 'active')
-            docs = query.stream()
-            opportunities = []
-            for doc in docs:
-                opportunity_data = doc.to_dict()
-                opportunity_data['id'] = doc.id
-                opportunities.append(opportunity_data)
-
-            opportunities.sort(key=lambda x: x.get('created_at'), reverse=True)
+            docs = await to_thread(lambda: list(query.stream()))
+            opportunities = documents_to_dicts(docs, sort_by='created_at')
 
             logger.info(f"Retrieved {len(opportunities)} opportunities for company: {company_id}")
             return opportunities
@@ -176,17 +202,12 @@ class FirestoreService:
             logger.error(f"Error getting opportunities for company {company_id}: {e}")
             return []
 
+    @coalesce(read_flight)
     async def get_all_opportunities(self) -> list:
         try:
             query = self.db.collection('opportunities').where('status', '==', 'active')
-            docs = query.stream()
-            opportunities = []
-            for doc in docs:
-                opportunity_data = doc.to_dict()
-                opportunity_data['id'] = doc.id
-                opportunities.append(opportunity_data)
-
-            opportunities.sort(key=lambda x: x.get('created_at'), reverse=True)
+            docs = await to_thread(lambda: list(query.stream()))
+            opportunities = documents_to_dicts(docs, sort_by='created_at')
 
             logger.info(f"Retrieved {len(opportunities)} total active opportunities")
             return opportunities
@@ -194,9 +215,10 @@ class FirestoreService:
             logger.error(f"Error getting all opportunities: {e}")
             return []
 
+    @coalesce(read_flight)
     async def get_opportunity(self, opportunity_id: str) -> Optional[Dict[str, Any]]:
         try:
-            doc = self.db.collection('opportunities').document(opportunity_id).get()
+            doc = await to_thread(lambda: self.db.collection('opportunities').document(opportunity_id).get())
             if doc.exists:
                 opportunity_data = doc.to_dict()
                 opportunity_data['id'] = doc.id
@@ -209,26 +231,36 @@ class FirestoreService:
     async def submit_application(self, application_data: Dict[str, Any]) -> Optional[str]:
         try:
             application_data['applied_at'] = datetime.utcnow()
-            doc_ref = self.db.collection('applications').document()
-            doc_ref.set(application_data)
+            doc_ref = self.db.collection('applications').document(
+                application_id(application_data['opportunity_id'], application_data['applicant_id']))
+            try:
+                doc_ref.create(application_data)
+            except AlreadyExists:
+                raise AlreadyApplied(doc_ref.id)
             logger.info(f"Created application: {doc_ref.id} for opportunity: {application_data.get('opportunity_id')}")
+            self._touch_opportunity_applications(application_data.get('opportunity_id'), application_data['applied_at'])
             return doc_ref.id
+        except AlreadyApplied:
+            raise
         except Exception as e:
             logger.error(f"Error creating application: {e}")
             return None
 
+    def _touch_opportunity_applications(self, opportunity_id: str, applied_at: datetime):
+        # Opportunity pages use this as part of their ETag; a failure here only
+        # means a stale applications count until the next edit, so don't fail the application
+        try:
+            self.db.collection('opportunities').document(opportunity_id).update({'last_application_at': applied_at})
+        except Exception as e:
+            logger.warning(f"Failed to update last_application_at for opportunity {opportunity_id}: {e}")
+
+    @coalesce(read_flight)
     async def get_applications_by_opportunity(self, opportunity_id: str) -> list:
         try:
-            applications = []
             query = self.db.collection('applications')\
                 .where('opportunity_id', '==', opportunity_id)
-
-            for doc in query.stream():
-                application_data = doc.to_dict()
-                application_data['id'] = doc.id
-                applications.append(application_data)
-
-            applications.sort(key=lambda x: x.get('applied_at', datetime.min), reverse=True)
+            docs = await to_thread(lambda: list(query.stream()))
+            applications = documents_to_dicts(docs, sort_by='applied_at', default=datetime.min)
 
             logger.info(f"Retrieved {len(applications)} applications for opportunity: {opportunity_id}")
             return applications
@@ -236,12 +268,13 @@ class FirestoreService:
             logger.error(f"Error getting applications for opportunity {opportunity_id}: {e}")
             return []
 
+    @coalesce(read_flight)
     async def check_existing_application(self, opportunity_id: str, applicant_id: str) -> bool:
         try:
             query = self.db.collection('applications')\
                 .where('opportunity_id', '==', opportunity_id)\
                 .where('applicant_id', '==', applicant_id).limit(1)
-            docs = list(query.stream())
+            docs = await to_thread(lambda: list(query.stream()))
             return len(docs) > 0
         except Exception as e:
             logger.error(f"Error checking existing application: {e}")
@@ -0,0 +1,250 @@
+"""
+Request-scoped Firestore operation counting and N+1 detection.
+
+``install_operation_counters()`` wraps the Firestore client primitives
+(document get/create/set/update/delete and query streams). Each call is
+recorded against the tracker of the current request, together with the
+documents returned, an estimate of the bytes read and the application
+line that issued it. ``FirestoreOpsMiddleware`` creates the tracker,
+exports per-route totals to ``/metrics`` and logs a warning when a
+request issues too many operations, or the same line repeats one often
+enough to look like a per-item read in a loop.
+
+Reads offloaded with ``to_thread()`` from this module are attributed to
+the coroutine that offloaded them: its call site is captured before the
+work leaves the event loop, since the worker thread's own stack only
+shows the lambda that wraps the read.
+
+Outside a request nothing is tracked and the wrappers only cost a
+context-variable lookup.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+
+from .metrics import registry
+from .middleware import route_template
+
+logger = logging.getLogger(__name__)
+
+FIRESTORE_OPS_WARN_THRESHOLD = int(os.getenv("FIRESTORE_OPS_WARN_THRESHOLD", 20))
+FIRESTORE_REPEAT_WARN_THRESHOLD = int(os.getenv("FIRESTORE_REPEAT_WARN_THRESHOLD", 5))
+# Also set by the load test, which checks operations per request against a baseline
+FIRESTORE_OPS_HEADER = os.getenv("FIRESTORE_OPS_HEADER", "false").lower() == "true"
+
+firestore_operations_per_request = registry.histogram(
+    "firestore_operations_per_request", "Firestore operations issued per HTTP request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 20, 50, 100))
+firestore_documents_read = registry.counter(
+    "firestore_documents_read_total", "Firestore documents read by route", ("route",))
+firestore_bytes_read = registry.counter(
+    "firestore_bytes_read_total", "Estimated Firestore bytes read by route", ("route",))
+firestore_n_plus_one = registry.counter(
+    "firestore_n_plus_one_total", "Requests where one call site repeated past the warning threshold", ("route",))
+
+_current_ops: ContextVar[Optional["FirestoreOps"]] = ContextVar("firestore_ops", default=None)
+# Call site of the coroutine that handed Firestore work to a thread (see to_thread)
+_offloaded_from: ContextVar[Optional[str]] = ContextVar("firestore_offloaded_from", default=None)
+
+_ROOT_DIR = os.getcwd()
+_LIBRARY_MARKERS = ("site-packages", "dist-packages", os.sep + "asyncio" + os.sep)
+_installed = False
+
+
+class FirestoreOps:
+    """Firestore operations recorded for one request"""
+
+    __slots__ = ("operations", "documents", "bytes_read", "writes", "sites")
+
+    def __init__(self):
+        self.operations = 0
+        self.documents = 0
+        self.bytes_read = 0
+        self.writes = 0
+        self.sites = Counter()
+
+    def record(self, kind: str, site: str):
+        self.operations += 1
+        if kind in ("create", "set", "update", "delete"):
+            self.writes += 1
+        self.sites[f"{kind} {site}"] += 1
+
+    def read(self, documents: int, size: int):
+        self.documents += documents
+        self.bytes_read += size
+
+    def repeated_sites(self, threshold: int = FIRESTORE_REPEAT_WARN_THRESHOLD) -> list:
+        return [(site, count) for site, count in self.sites.most_common() if count >= threshold]
+
+    def to_dict(self) -> dict:
+        return {
+            "operations": self.operations,
+            "documents": self.documents,
+            "bytes_read": self.bytes_read,
+            "writes": self.writes,
+            "sites": dict(self.sites.most_common()),
+        }
+
+    def header_value(self) -> str:
+        return f"{self.operations}; docs={self.documents}; bytes={self.bytes_read}; writes={self.writes}"
+
+
+def current_ops() -> Optional[FirestoreOps]:
+    return _current_ops.get()
+
+
+def estimate_size(value) -> int:
+    """Approximate Firestore storage size of a value (strings are UTF-8 bytes + 1, numbers 8 bytes)"""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value) + 1
+    if isinstance(value, dict):
+        return sum(len(str(k)) + 1 + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    return 16
+
+
+def _snapshot_size(snapshot) -> int:
+    data = snapshot.to_dict() if snapshot.exists else None
+    return estimate_size(data) + len(snapshot.id) + 16 if data is not None else 0
+
+
+def _call_site() -> str:
+    """First application frame outside this module and installed libraries"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(_ROOT_DIR) and filename != __file__
+                and not any(marker in filename for marker in _LIBRARY_MARKERS)):
+            return f"{os.path.relpath(filename, _ROOT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+async def to_thread(fn, *args, **kwargs):
+    """``asyncio.to_thread`` for Firestore work; its operations are attributed to the caller of this function"""
+    if _current_ops.get() is None:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    # The worker thread runs in a copy of this context
+    token = _offloaded_from.set(_call_site())
+    try:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    finally:
+        _offloaded_from.reset(token)
+
+
+def _count_document_call(method, kind: str):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        ops = _current_ops.get()
+        if ops is None:
+            return method(self, *args, **kwargs)
+        ops.record(kind, _offloaded_from.get() or _call_site())
+        result = method(self, *args, **kwargs)
+        if kind == "get":
+            ops.read(1 if result.exists else 0, _snapshot_size(result))
+        return result
+    return wrapper
+
+
+def _count_query_stream(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        ops = _current_ops.get()
+        if ops is None:
+            return method(self, *args, **kwargs)
+        ops.record("query", _offloaded_from.get() or _call_site())
+        return _counted_stream(method(self, *args, **kwargs), ops)
+    return wrapper
+
+
+def _counted_stream(snapshots, ops: FirestoreOps):
+    for snapshot in snapshots:
+        ops.read(1, _snapshot_size(snapshot))
+        yield snapshot
+
+
+def install_operation_counters():
+    """Wrap the Firestore client primitives once per process"""
+    global _installed
+    if _installed:
+        return
+    try:
+        from google.cloud.firestore_v1.document import DocumentReference
+        from google.cloud.firestore_v1.query import Query
+    except ImportError as e:
+        logger.warning(f"Firestore operation counters not installed: {e}")
+        return
+
+    for kind in ("get", "create", "set", "update", "delete"):
+        setattr(DocumentReference, kind, _count_document_call(getattr(DocumentReference, kind), kind))
+    # Collection streams and Query.get both go through Query.stream, so each query is counted once
+    Query.stream = _count_query_stream(Query.stream)
+    _installed = True
+    logger.info("Firestore operation counters installed")
+
+
+class FirestoreOpsMiddleware:
+    """Track Firestore operations per request and warn about likely N+1 patterns"""
+
+    def __init__(self, app, warn_threshold: int = FIRESTORE_OPS_WARN_THRESHOLD,
+                 repeat_threshold: int = FIRESTORE_REPEAT_WARN_THRESHOLD, expose_header: bool = False):
+        self.app = app
+        self.warn_threshold = warn_threshold
+        self.repeat_threshold = repeat_threshold
+        self.expose_header = expose_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ops = FirestoreOps()
+        token = _current_ops.set(ops)
+        scope.setdefault("state", {})["firestore_ops"] = ops
+
+        async def send_with_ops(message):
+            if self.expose_header and message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"]).append("X-Firestore-Ops", ops.header_value())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_ops)
+        finally:
+            _current_ops.reset(token)
+            self._report(scope, ops)
+
+    def _report(self, scope, ops: FirestoreOps):
+        route = route_template(scope)
+        firestore_operations_per_request.labels(route).observe(ops.operations)
+        if ops.operations == 0:
+            return
+        firestore_documents_read.labels(route).inc(ops.documents)
+        firestore_bytes_read.labels(route).inc(ops.bytes_read)
+
+        repeated = ops.repeated_sites(self.repeat_threshold)
+        if repeated:
+            firestore_n_plus_one.labels(route).inc()
+        if repeated or ops.operations > self.warn_threshold:
+            logger.warning("firestore_ops %s", json.dumps({
+                "method": scope["method"],
+                "route": route,
+                "possible_n_plus_one": bool(repeated),
+                **ops.to_dict(),
+            }))
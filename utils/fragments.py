@@ -0,0 +1,46 @@
+"""
+In-memory cache for HTMX fragments that only change on deploy.
+"""
+
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .etag import etag_matches
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+class StaticFragments:
+    """
+    Fragments rendered once at startup and kept as encoded bytes.
+
+    ``version`` hashes every fragment, so templates can link to
+    ``...?v={{ version }}`` and let the browser cache the response forever;
+    requests without the current version still get an ETag for revalidation.
+    """
+
+    def __init__(self, media_type: str = "text/html; charset=utf-8"):
+        self.media_type = media_type
+        self.fragments: Dict[str, bytes] = {}
+        self.etags: Dict[str, str] = {}
+        self.version = ""
+
+    def add(self, key: str, content: str):
+        body = content.encode("utf-8")
+        self.fragments[key] = body
+        self.etags[key] = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        self.version = hashlib.sha1("".join(sorted(self.etags.values())).encode()).hexdigest()[:10]
+
+    def response(self, request: Request, key: str, version: Optional[str] = None) -> Response:
+        etag = self.etags[key]
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if version == self.version else REVALIDATE_CACHE_CONTROL,
+        }
+        if etag_matches(request, etag, cache="fragments"):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.fragments[key], media_type=self.media_type, headers=headers)
@@ -0,0 +1,507 @@
+"""
+Durable background jobs for long-running agent work.
+
+Candidate assessment and opportunity creation can take longer than a
+request should wait. ``JobQueue.enqueue()`` stores a job record and
+returns straight away. A small pool of async workers in every process
+(JOB_WORKERS) claims queued jobs and runs the handler registered for
+their kind. Pages poll the job's status fragment until the result is in.
+A job keeps running if the browser disconnects, and the status record
+outlives the worker that ran it.
+
+Records live in JOB_QUEUE_URL:
+
+- ``sqlite:///path.db`` (default ``./jobs.db``): shared by the workers on
+  one machine;
+- ``firestore://``: the ``jobs`` collection, shared by every instance
+  (the production default, see run.py).
+
+A running job's record is refreshed every few seconds. If it hasn't been
+refreshed for JOB_LEASE_SECONDS (the process was stopped or crashed),
+another worker puts it back in the queue. After JOB_MAX_ATTEMPTS runs
+the job is marked failed. A handler raises ``RetryLater`` to go back in
+the queue without using up an attempt, for example when the agent is
+busy. Finished jobs are deleted after JOB_RETENTION_HOURS.
+
+A handler whose work has effects a repeat would duplicate (e.g. a message
+already sent to an agent) calls ``final_attempt(job)`` first. From then
+on, an error or a lost worker fails the job instead of running it again.
+
+``enqueue(..., dedupe_key=...)`` returns the existing job while one with
+the same key is queued or running, so a double-submitted form doesn't
+start the work twice. The check and the insert are one atomic step: in
+SQLite a unique index on the key of active jobs, in Firestore a
+transaction on a ``job_dedupe`` document named after the key.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from firebase_admin import firestore as admin_firestore
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "sqlite:///./jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 120))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", 24))
+# How long a request waits for its job before answering with a polling fragment
+JOB_INLINE_WAIT = float(os.getenv("JOB_INLINE_WAIT", 3))
+
+SQLITE_SCHEME = "sqlite:///"
+FIRESTORE_SCHEME = "firestore://"
+JOB_COLLECTION = "jobs"
+DEDUPE_COLLECTION = "job_dedupe"
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+jobs_total = registry.counter(
+    "jobs_total", "Background job transitions by kind (enqueued/done/failed/retried/recovered)", ("kind", "event"))
+job_queue_wait = registry.histogram(
+    "job_queue_wait_seconds", "Time background jobs spent queued before a worker claimed them", ("kind",))
+job_duration = registry.histogram(
+    "job_duration_seconds", "Background job run time", ("kind",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0))
+jobs_running = registry.gauge("jobs_running", "Background jobs this process is running", ("kind",))
+
+
+class RetryLater(Exception):
+    """Raised by a handler to requeue its job without counting the attempt"""
+
+    def __init__(self, delay: float, reason: str = ""):
+        super().__init__(reason or f"retry in {delay}s")
+        self.delay = delay
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    user_id: str
+    payload: Dict[str, Any]
+    status: str = QUEUED
+    progress: str = ""
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    dedupe_key: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    run_after: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+
+class SQLiteJobStore:
+    """Jobs in a local SQLite file; claims are a single atomic UPDATE"""
+
+    COLUMNS = ("id", "kind", "user_id", "payload", "status", "progress", "result", "error", "attempts",
+               "dedupe_key", "created_at", "updated_at", "run_after", "started_at", "finished_at")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._ready = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit: every statement is its own transaction
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            self._prepare(conn)
+            yield conn
+        finally:
+            conn.close()
+
+    def _prepare(self, conn: sqlite3.Connection):
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT NOT NULL, user_id TEXT NOT NULL, payload TEXT NOT NULL,
+                status TEXT NOT NULL, progress TEXT NOT NULL DEFAULT '', result TEXT, error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0, dedupe_key TEXT, created_at REAL NOT NULL,
+                updated_at REAL NOT NULL, run_after REAL NOT NULL DEFAULT 0, started_at REAL, finished_at REAL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, run_after, created_at)")
+            conn.execute("DROP INDEX IF EXISTS jobs_dedupe")
+            try:
+                # At most one active job per dedupe key
+                conn.execute(f"""CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_dedupe ON jobs (dedupe_key)
+                    WHERE dedupe_key IS NOT NULL AND status IN ('{QUEUED}', '{RUNNING}')""")
+            except sqlite3.IntegrityError as e:
+                # Duplicates from before the index existed; they finish or expire normally
+                logger.warning("Job dedupe index not created, duplicates are active: %s", e)
+            self._ready = True
+
+    def _job(self, row: Optional[sqlite3.Row]) -> Optional[Job]:
+        if row is None:
+            return None
+        data = dict(row)
+        data["payload"] = json.loads(data["payload"])
+        data["result"] = json.loads(data["result"]) if data["result"] else None
+        return Job(**data)
+
+    def insert(self, job: Job) -> Job:
+        """Store ``job``, or return the active job that already has its dedupe key"""
+        data = asdict(job)
+        data["payload"] = json.dumps(job.payload)
+        data["result"] = json.dumps(job.result) if job.result is not None else None
+        with self._connect() as conn:
+            while True:
+                cursor = conn.execute(
+                    f"INSERT OR IGNORE INTO jobs ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self.COLUMNS))})", [data[column] for column in self.COLUMNS])
+                if cursor.rowcount == 1:
+                    return job
+                if not job.dedupe_key:
+                    raise sqlite3.IntegrityError(f"job {job.id} already exists")
+                existing = self._job(conn.execute(
+                    "SELECT * FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) LIMIT 1",
+                    (job.dedupe_key, *ACTIVE)).fetchone())
+                if existing is not None:
+                    return existing
+                # The job holding the key finished in between; insert again
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._connect() as conn:
+            return self._job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def claim(self, kinds: List[str]) -> Optional[Job]:
+        now = time.time()
+        placeholders = ", ".join("?" * len(kinds))
+        with self._connect() as conn:
+            return self._job(conn.execute(f"""
+                UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, updated_at = ?
+                WHERE id = (SELECT id FROM jobs WHERE status = ? AND run_after <= ? AND kind IN ({placeholders})
+                            ORDER BY created_at LIMIT 1)
+                  AND status = ?
+                RETURNING *""", (RUNNING, now, now, QUEUED, now, *kinds, QUEUED)).fetchone())
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                         [*fields.values(), job_id])
+
+    def stale(self, before: float) -> List[Job]:
+        with self._connect() as conn:
+            return [self._job(row) for row in conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND updated_at < ?", (RUNNING, before))]
+
+    def requeue_stale(self, job_id: str, before: float, **fields) -> bool:
+        """Apply ``fields`` only if the job is still running with an expired lease"""
+        fields["updated_at"] = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} "
+                "WHERE id = ? AND status = ? AND updated_at < ?", [*fields.values(), job_id, RUNNING, before])
+            return cursor.rowcount == 1
+
+    def purge(self, before: float) -> int:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                                (DONE, FAILED, before)).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            return {row["status"]: row["n"] for row in conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+
+class FirestoreJobStore:
+    """Jobs in the ``jobs`` collection; claims and lease recovery run in transactions"""
+
+    # Queued jobs read per claim attempt; only equality filters, so no composite index is needed
+    CLAIM_SCAN = 20
+
+    def __init__(self):
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = admin_firestore.client()
+        return self._db
+
+    def _ref(self, job_id: str):
+        return self.db.collection(JOB_COLLECTION).document(job_id)
+
+    @staticmethod
+    def _job(snapshot) -> Optional[Job]:
+        return Job(**snapshot.to_dict()) if snapshot.exists else None
+
+    def insert(self, job: Job) -> Job:
+        """Store ``job``, or return the active job that already has its dedupe key"""
+        if not job.dedupe_key:
+            self._ref(job.id).create(asdict(job))
+            return job
+        # Names the job holding the key; concurrent inserts with one key conflict on it and are retried
+        lock = self.db.collection(DEDUPE_COLLECTION).document(hashlib.sha256(job.dedupe_key.encode()).hexdigest())
+
+        @admin_firestore.transactional
+        def apply(transaction):
+            held = lock.get(transaction=transaction)
+            if held.exists:
+                existing = self._job(self._ref(held.get("job_id")).get(transaction=transaction))
+                if existing is not None and existing.status in ACTIVE:
+                    return existing
+            transaction.set(lock, {"job_id": job.id, "created_at": job.created_at})
+            transaction.create(self._ref(job.id), asdict(job))
+            return job
+        return apply(self.db.transaction())
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._job(self._ref(job_id).get())
+
+    def _transition(self, job_id: str, expected: Callable[[Job], bool], fields: dict) -> Optional[Job]:
+        @admin_firestore.transactional
+        def apply(transaction):
+            job = self._job(self._ref(job_id).get(transaction=transaction))
+            if job is None or not expected(job):
+                return None
+            transaction.update(self._ref(job_id), fields)
+            for name, value in fields.items():
+                setattr(job, name, value)
+            return job
+        return apply(self.db.transaction())
+
+    def claim(self, kinds: List[str]) -> Optional[Job]:
+        now = time.time()
+        candidates = [self._job(snapshot) for snapshot in
+                      self.db.collection(JOB_COLLECTION).where("status", "==", QUEUED).limit(self.CLAIM_SCAN).stream()]
+        for candidate in sorted(candidates, key=lambda job: job.created_at):
+            if candidate.kind not in kinds or candidate.run_after > now:
+                continue
+            job = self._transition(candidate.id, lambda job: job.status == QUEUED, {
+                "status": RUNNING, "attempts": candidate.attempts + 1, "started_at": now, "updated_at": now})
+            if job is not None:
+                return job
+        return None
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        self._ref(job_id).update(fields)
+
+    def stale(self, before: float) -> List[Job]:
+        return [job for job in (self._job(snapshot) for snapshot in
+                                self.db.collection(JOB_COLLECTION).where("status", "==", RUNNING).stream())
+                if job.updated_at < before]
+
+    def requeue_stale(self, job_id: str, before: float, **fields) -> bool:
+        fields["updated_at"] = time.time()
+        return self._transition(
+            job_id, lambda job: job.status == RUNNING and job.updated_at < before, fields) is not None
+
+    def purge(self, before: float, batch_size: int = 200) -> int:
+        # Only finished jobs have a finished_at; null values never match a range filter.
+        # Dedupe documents older than the retention name jobs that finished long ago.
+        deleted = 0
+        for collection, field_name in ((JOB_COLLECTION, "finished_at"), (DEDUPE_COLLECTION, "created_at")):
+            while True:
+                docs = list(self.db.collection(collection)
+                            .where(field_name, "<", before)
+                            .select([])
+                            .limit(batch_size)
+                            .stream())
+                if not docs:
+                    break
+                batch = self.db.batch()
+                for doc in docs:
+                    batch.delete(doc.reference)
+                batch.commit()
+                if collection == JOB_COLLECTION:
+                    deleted += len(docs)
+        return deleted
+
+    def counts(self) -> Dict[str, int]:
+        return {status: self.db.collection(JOB_COLLECTION).where("status", "==", status).count().get()[0][0].value
+                for status in ACTIVE}
+
+
+def open_job_store(url: str = JOB_QUEUE_URL):
+    if url.startswith(FIRESTORE_SCHEME):
+        return FirestoreJobStore()
+    if url.startswith(SQLITE_SCHEME):
+        return SQLiteJobStore(url[len(SQLITE_SCHEME):])
+    raise ValueError(f"Unsupported JOB_QUEUE_URL {url!r} (use sqlite:///path or firestore://)")
+
+
+Handler = Callable[[Job], Awaitable[Dict[str, Any]]]
+
+
+class JobQueue:
+    def __init__(self, store, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL,
+                 lease_seconds: int = JOB_LEASE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.handlers: Dict[str, Handler] = {}
+        self._wakeup = asyncio.Event()
+        # Jobs finishing in this process, so inline waits don't have to poll the store
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    def handler(self, kind: str):
+        """Register ``async def handler(job) -> result dict`` for jobs of ``kind``"""
+        def decorator(fn: Handler) -> Handler:
+            self.handlers[kind] = fn
+            return fn
+        return decorator
+
+    async def enqueue(self, kind: str, user_id: str, payload: Dict[str, Any],
+                      dedupe_key: Optional[str] = None) -> Job:
+        job = Job(uuid.uuid4().hex, kind, user_id, payload, dedupe_key=dedupe_key)
+        stored = await asyncio.to_thread(self.store.insert, job)
+        if stored.id != job.id:
+            logger.debug("Job %s already %s for %r", stored.id, stored.status, dedupe_key)
+            return stored
+        jobs_total.labels(kind, "enqueued").inc()
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job: Job, timeout: float = JOB_INLINE_WAIT) -> Job:
+        """The job once finished, or its latest record after ``timeout`` seconds"""
+        if job.finished or timeout <= 0:
+            return job
+        event = self._finished.setdefault(job.id, asyncio.Event())
+        deadline = time.monotonic() + timeout
+        try:
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    # Another process may run it; look at the record at least every poll interval
+                    await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+                job = await self.get(job.id) or job
+                if job.finished:
+                    return job
+            return job
+        finally:
+            self._finished.pop(job.id, None)
+
+    async def progress(self, job: Job, text: str):
+        """Show ``text`` in the job's status fragment (also refreshes its lease)"""
+        job.progress = text
+        await asyncio.to_thread(self.store.update, job.id, progress=text)
+
+    async def final_attempt(self, job: Job):
+        """Fail the job instead of retrying it from here on (also after a lost worker)"""
+        job.attempts = max(job.attempts, self.max_attempts)
+        await asyncio.to_thread(self.store.update, job.id, attempts=job.attempts)
+
+    async def run(self):
+        """Worker pool plus lease recovery and cleanup; runs until cancelled"""
+        await asyncio.gather(*(self._work() for _ in range(self.workers)), self._maintain())
+
+    async def _work(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim, list(self.handlers))
+            except Exception as e:
+                logger.warning("Could not claim a job: %s", e)
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 4)
+            try:
+                await asyncio.to_thread(self.store.update, job.id)
+            except Exception as e:
+                logger.warning("Could not refresh lease of job %s: %s", job.id, e)
+
+    async def _run(self, job: Job):
+        job_queue_wait.labels(job.kind).observe(max(0.0, (job.started_at or time.time()) - job.created_at))
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        started = time.perf_counter()
+        fields: Dict[str, Any]
+        try:
+            with jobs_running.labels(job.kind).track():
+                result = await self.handlers[job.kind](job)
+            fields = {"status": DONE, "result": result, "error": None, "finished_at": time.time()}
+            jobs_total.labels(job.kind, "done").inc()
+        except RetryLater as e:
+            fields = {"status": QUEUED, "attempts": job.attempts - 1, "run_after": time.time() + e.delay}
+            jobs_total.labels(job.kind, "retried").inc()
+        except Exception as e:
+            logger.exception("Job %s (%s) failed on attempt %d", job.id, job.kind, job.attempts)
+            if job.attempts < self.max_attempts:
+                fields = {"status": QUEUED, "error": str(e), "run_after": time.time() + 2 ** job.attempts}
+                jobs_total.labels(job.kind, "retried").inc()
+            else:
+                fields = {"status": FAILED, "error": str(e), "finished_at": time.time()}
+                jobs_total.labels(job.kind, "failed").inc()
+        finally:
+            heartbeat.cancel()
+        job_duration.labels(job.kind).observe(time.perf_counter() - started)
+        try:
+            await asyncio.to_thread(self.store.update, job.id, **fields)
+        except Exception as e:
+            # The lease runs out and another worker repeats the job
+            logger.error("Could not record outcome of job %s: %s", job.id, e)
+        if job.id in self._finished and fields["status"] in (DONE, FAILED):
+            self._finished[job.id].set()
+
+    async def recover_stale(self) -> int:
+        """Requeue (or fail) running jobs whose worker stopped refreshing them"""
+        before = time.time() - self.lease_seconds
+        recovered = 0
+        for job in await asyncio.to_thread(self.store.stale, before):
+            if job.attempts >= self.max_attempts:
+                fields = {"status": FAILED, "error": "worker lost", "finished_at": time.time()}
+            else:
+                fields = {"status": QUEUED}
+            if await asyncio.to_thread(self.store.requeue_stale, job.id, before, **fields):
+                recovered += 1
+                jobs_total.labels(job.kind, "recovered").inc()
+                logger.warning("Job %s (%s) lost its worker; now %s", job.id, job.kind, fields["status"])
+        return recovered
+
+    async def _maintain(self):
+        while True:
+            try:
+                await self.recover_stale()
+                await asyncio.to_thread(self.store.purge, time.time() - JOB_RETENTION_HOURS * 3600)
+            except Exception as e:
+                logger.warning("Job maintenance failed: %s", e)
+            await asyncio.sleep(self.lease_seconds / 2)
+
+    async def snapshot(self) -> dict:
+        return {
+            "store": type(self.store).__name__,
+            "workers": self.workers,
+            "handlers": sorted(self.handlers),
+            "lease_seconds": self.lease_seconds,
+            "max_attempts": self.max_attempts,
+            "jobs": await asyncio.to_thread(self.store.counts),
+        }
@@ -0,0 +1,173 @@
+"""
+Non-blocking, structured logging.
+
+``configure_logging()`` attaches a single ``QueueHandler`` to the root
+logger. A call on the request path only builds the LogRecord and puts it
+on an in-memory queue. A ``QueueListener`` thread does the %-formatting,
+JSON encoding and the write to stderr. Use lazy %-style arguments
+(``logger.debug("events: %s", events)``) so that disabled levels never
+format anything.
+
+High-volume routes can be sampled per request with ``LOG_SAMPLE_RATES``
+(for example ``/api/chat=0.1,/debug/*=0``). A sampled-out request drops
+its DEBUG/INFO records. Warnings and errors are always kept.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from .metrics import registry
+from .middleware import route_template
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+log_records_dropped = registry.counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full")
+log_records_sampled_out = registry.counter(
+    "log_records_sampled_out_total", "DEBUG/INFO log records skipped by per-route sampling", ("route",))
+
+_log_context: ContextVar[Optional["_RequestLogContext"]] = ContextVar("log_context", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse ``route=rate,route=rate``; a trailing ``*`` matches a route prefix"""
+    rates = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        route, rate = item.rsplit("=", 1)
+        rates[route.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class _RequestLogContext:
+    __slots__ = ("scope", "route", "keep")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.route = None
+        self.keep = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the current route and apply per-route sampling"""
+
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+
+    def _rate_for(self, route: str) -> float:
+        rate = self.sample_rates.get(route)
+        if rate is not None:
+            return rate
+        for pattern, rate in self.sample_rates.items():
+            if pattern.endswith("*") and route.startswith(pattern[:-1]):
+                return rate
+        return 1.0
+
+    def filter(self, record):
+        context = _log_context.get()
+        if context is None:
+            return True
+
+        if context.route is None and "route" in context.scope:
+            # Decided once per request after routing, so a kept request keeps all its records
+            context.route = route_template(context.scope)
+            context.keep = random.random() < self._rate_for(context.route)
+
+        record.route = context.route or context.scope.get("path")
+        record.method = context.scope.get("method")
+        if record.levelno >= logging.WARNING or context.keep is not False:
+            return True
+        log_records_sampled_out.labels(context.route).inc()
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller and defers formatting to the listener"""
+
+    def prepare(self, record):
+        # The queue is in-process, so the record does not need to be
+        # pickled; keep msg/args intact and let the listener format them
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.labels().inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, using the field names Cloud Logging recognises"""
+
+    def format(self, record):
+        payload = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        route = getattr(record, "route", None)
+        if route:
+            payload["route"] = route
+            payload["method"] = getattr(record, "method", None)
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def configure_logging(level: int = logging.INFO, json_format: bool = False,
+                      sample_rates: Optional[Dict[str, float]] = None):
+    """Route all root-logger output through a queue drained by a background thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(sample_rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+class LogContextMiddleware:
+    """Make the current request visible to the logging filter"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _log_context.set(_RequestLogContext(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _log_context.reset(token)
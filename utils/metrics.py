@@ -0,0 +1,258 @@
+"""
+Minimal Prometheus-style metrics with text exposition for ``/metrics``.
+
+Each labelled child pre-allocates its bucket array on first use and
+hot-path code keeps a reference to it, so recording an observation is a
+bisect and a few list increments. There are no locks. Everything runs on
+the event loop thread, and a rare lost increment from the threadpool is
+acceptable for monitoring data.
+"""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Dict, Tuple
+
+from .middleware import route_template
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+        return False
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def track(self):
+        return _InProgress(self)
+
+
+class _InProgress:
+    __slots__ = ("gauge",)
+
+    def __init__(self, gauge: GaugeChild):
+        self.gauge = gauge
+
+    def __enter__(self):
+        self.gauge.value += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.gauge.value -= 1
+        return False
+
+    # Also usable in ``async with`` alongside an async client
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        return self.__exit__(*exc)
+
+
+class HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class MetricFamily:
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: Tuple[str, ...], buckets=None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else LATENCY_BUCKETS
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            if self.kind == "counter":
+                child = CounterChild()
+            elif self.kind == "gauge":
+                child = GaugeChild()
+            else:
+                child = HistogramChild(self.buckets)
+            self.children[values] = child
+        return child
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {child.sum}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.families: Dict[str, MetricFamily] = {}
+
+    def _register(self, kind, name, documentation, labelnames=(), buckets=None) -> MetricFamily:
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = MetricFamily(kind, name, documentation, labelnames, buckets)
+        return family
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> MetricFamily:
+        return self._register("counter", name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> MetricFamily:
+        return self._register("gauge", name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=None) -> MetricFamily:
+        return self._register("histogram", name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        lines = []
+        for family in self.families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+http_requests = registry.counter(
+    "http_requests_total", "HTTP responses by route template and status", ("method", "route", "status"))
+firestore_call_duration = registry.histogram(
+    "firestore_call_duration_seconds", "FirestoreService call latency by method", ("method",))
+agent_request_duration = registry.histogram(
+    "agent_request_duration_seconds", "ADK agent run latency by app", ("agent",))
+chat_requests_in_flight = registry.gauge(
+    "chat_requests_in_flight", "Chat requests currently waiting on an agent", ("agent",))
+agent_fast_path = registry.counter(
+    "agent_fast_path_total", "Chats by fast-path intent; intent=none means the LLM answered",
+    ("agent", "intent"))
+cache_requests = registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result"))
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Delay between when a loop callback was due and when it ran", (),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+event_loop_lag_last = registry.gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample")
+
+
+def record_cache(cache: str, hit: bool):
+    cache_requests.labels(cache, "hit" if hit else "miss").inc()
+
+
+class MetricsMiddleware:
+    """Record latency and status for every HTTP request by route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = route_template(scope)
+            method = scope["method"]
+            http_request_duration.labels(method, route).observe(time.perf_counter() - started)
+            http_requests.labels(method, route, status_code).inc()
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Sleep for ``interval`` in a loop and record how late each wake-up is"""
+    histogram = event_loop_lag.labels()
+    last = event_loop_lag_last.labels()
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        histogram.observe(lag)
+        last.set(lag)
@@ -1,8 +1,17 @@
 import os
+import zlib
 from fastapi import Request, Response
 from fastapi.responses import HTMLResponse
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from .assets import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # Optional - gzip is used when brotli isn't installed
+    brotli = None
+
 class MaintenanceModeMiddleware(BaseHTTPMiddleware):
     """
     Middleware to handle maintenance mode for deployments.
@@ -22,7 +31,7 @@ class MaintenanceModeMiddleware(BaseHTTPMiddleware):
             return await call_next(request)
         
         # Allow health check endpoints to pass through
-        health_paths = ["/health", "/_ah/health", "/api/health"]
+        health_paths = ["/health", "/_ah/health", "/api/health", "/metrics"]
         if request.url.path in health_paths:
             return await call_next(request)
         
@@ -91,4 +100,205 @@ class MaintenanceModeMiddleware(BaseHTTPMiddleware):
         </html>
         """
         
-        return HTMLResponse(content=maintenance_html, status_code=503) 
\ No newline at end of file
+        return HTMLResponse(content=maintenance_html, status_code=503) 
+
+def route_template(scope) -> str:
+    """
+    Label a request by its route template (``/opportunities/{opportunity_id}``)
+    rather than its concrete path, so per-route stats stay bounded.
+    Only meaningful once routing has run, e.g. when the response starts.
+    """
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    root_path = scope.get("root_path", "")
+    if root_path:
+        # Mounted sub-apps (static files, ADK) are grouped under their mount point
+        return f"{root_path}/*"
+    return "unmatched"
+
+
+class CompressionStats:
+    """Per-route byte counters for responses seen by CompressionMiddleware"""
+
+    def __init__(self):
+        self.routes = {}
+
+    def record(self, route: str, compressed: bool, bytes_in: int, bytes_out: int):
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = [0, 0, 0, 0]
+        stats[0] += 1
+        stats[1] += 1 if compressed else 0
+        stats[2] += bytes_in
+        stats[3] += bytes_out
+
+    def snapshot(self) -> dict:
+        return {
+            route: {
+                "responses": responses,
+                "compressed": compressed,
+                "bytes_in": bytes_in,
+                "bytes_out": bytes_out,
+                "bytes_saved": bytes_in - bytes_out,
+                "ratio": round(bytes_out / bytes_in, 3) if bytes_in else None,
+            }
+            for route, (responses, compressed, bytes_in, bytes_out) in sorted(self.routes.items())
+        }
+
+
+compression_stats = CompressionStats()
+
+DEFAULT_COMPRESSIBLE_TYPES = (
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/javascript",
+    "text/event-stream",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+)
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        """Compress a chunk; ``flush`` emits everything so far so streamed events aren't held back"""
+        if self.encoding == "br":
+            output = self._brotli.process(data)
+            return output + self._brotli.flush() if flush else output
+        output = self._zlib.compress(data)
+        return output + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else output
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Gzip/Brotli response compression for pages and HTMX fragments.
+
+    Written as a plain ASGI middleware rather than BaseHTTPMiddleware so
+    streamed bodies (SSE, chunked responses) are compressed chunk by chunk
+    and flushed immediately instead of being buffered. Small fragments under
+    ``minimum_size`` and responses that already carry a Content-Encoding
+    (precompressed static assets) are passed through untouched.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 512,
+        content_types: tuple = DEFAULT_COMPRESSIBLE_TYPES,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        stats: CompressionStats = compression_stats,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.content_types = frozenset(t.strip().lower() for t in content_types if t.strip())
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, scope, send, encoding)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, scope, send, encoding: str):
+        self.middleware = middleware
+        self.scope = scope
+        self.downstream = send
+        self.encoding = encoding
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+        self.route = "unmatched"
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _should_compress(self, headers: MutableHeaders, body: bytes, more_body: bool) -> bool:
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type not in self.middleware.content_types:
+            return False
+        if more_body:
+            return True
+        return len(body) >= self.middleware.minimum_size
+
+    async def send(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            self.route = route_template(self.scope)
+            return
+        if message_type != "http.response.body":
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            if not self._should_compress(headers, body, more_body):
+                self.passthrough = True
+                self.middleware.stats.record(self.route, False, len(body), len(body))
+                await self.downstream(start)
+                await self.downstream(message)
+                return
+
+            self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body:
+                compressed = self.compressor.compress(body, flush=False) + self.compressor.finish()
+                headers["Content-Length"] = str(len(compressed))
+                self.middleware.stats.record(self.route, True, len(body), len(compressed))
+                await self.downstream(start)
+                await self.downstream({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming: length is unknown up front, so send chunked
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self.downstream(start)
+
+        if self.passthrough:
+            await self.downstream(message)
+            return
+
+        chunk = self.compressor.compress(body, flush=more_body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        self.bytes_in += len(body)
+        self.bytes_out += len(chunk)
+        if not more_body:
+            self.middleware.stats.record(self.route, True, self.bytes_in, self.bytes_out)
+        await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,342 @@
+"""
+Model selection for the agents: per-agent, per-request-class tiers with
+latency- and error-aware failover.
+
+All agent models are configured here, in MODEL_ROUTES. Each agent lists
+its candidate models for every request class, preferred model first:
+
+- ``short``: navigation, guidance and quick follow-ups;
+- ``long``: requests whose prompt is at least ROUTER_LONG_PROMPT_TOKENS,
+  such as an assessment with the opportunity and applicants attached.
+
+Short requests prefer the fast AGENT_MODEL and long ones the stronger
+AGENT_LONG_MODEL, each with AGENT_FALLBACK_MODEL behind it. Session
+summaries (utils/adk_sessions.py) are routed as ``session_summary``.
+MODEL_ROUTES overrides entries as
+``"assessment_agent.long=gemini-2.0-flash|gemini-2.0-flash-lite,..."``.
+
+Each model call is timed and counted per model and request class over a
+rolling ROUTER_WINDOW seconds. A model is unhealthy for a class when
+ROUTER_MIN_SAMPLES calls have been seen and their p95 exceeds that
+class's budget (ROUTER_P95_BUDGET_SHORT / ROUTER_P95_BUDGET_LONG) or
+more than ROUTER_MAX_ERROR_RATE of them failed. Requests then go to the
+next healthy candidate. If no candidate is healthy, the agent answers
+with a canned degraded response (DEGRADED_RESPONSES) without calling a
+model. Old samples leave the window, so an unhealthy model gets traffic
+again once its window has cleared.
+
+A call that raises before producing output is retried on the next
+healthy candidate, unless the request was already rewritten to use a
+context cache that belongs to the failed model. It is answered with the
+degraded response when nothing is left to try.
+
+Every response is tagged with the model that produced it
+(``custom_metadata["model"]``, ``customMetadata`` in ADK events), so
+usage is priced at the model actually called.
+
+Agents use ``model_router.llm(name)`` as their model. The
+``model_router.before_model_callback()`` must come before the context
+cache callback so caches are created for the chosen model. Stats are
+per worker process.
+"""
+
+import logging
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncGenerator, Deque, Dict, Optional, Tuple
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+AGENT_MODEL = os.getenv("AGENT_MODEL", "gemini-2.0-flash-lite")
+AGENT_FALLBACK_MODEL = os.getenv("AGENT_FALLBACK_MODEL", "gemini-2.0-flash")
+AGENT_LONG_MODEL = os.getenv("AGENT_LONG_MODEL", "gemini-2.5-flash")
+SESSION_SUMMARY_MODEL = os.getenv("SESSION_SUMMARY_MODEL", AGENT_FALLBACK_MODEL)
+ROUTER_LONG_PROMPT_TOKENS = int(os.getenv("ROUTER_LONG_PROMPT_TOKENS", 800))
+ROUTER_P95_BUDGET_SHORT = float(os.getenv("ROUTER_P95_BUDGET_SHORT", 6))
+ROUTER_P95_BUDGET_LONG = float(os.getenv("ROUTER_P95_BUDGET_LONG", 20))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", 0.2))
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", 300))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", 10))
+CHARS_PER_TOKEN = 4
+
+REQUEST_CLASSES = ("short", "long")
+
+# Candidate models per agent and request class, preferred first
+MODEL_ROUTES: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "job_matching_agent": {
+        "short": (AGENT_MODEL, AGENT_FALLBACK_MODEL),
+        "long": (AGENT_LONG_MODEL, AGENT_FALLBACK_MODEL),
+    },
+    "job_posting_agent": {
+        "short": (AGENT_MODEL, AGENT_FALLBACK_MODEL),
+        "long": (AGENT_LONG_MODEL, AGENT_FALLBACK_MODEL),
+    },
+    "assessment_agent": {
+        "short": (AGENT_MODEL, AGENT_FALLBACK_MODEL),
+        "long": (AGENT_LONG_MODEL, AGENT_FALLBACK_MODEL),
+    },
+    "session_summary": {
+        "short": (SESSION_SUMMARY_MODEL, AGENT_MODEL),
+        "long": (SESSION_SUMMARY_MODEL, AGENT_MODEL),
+    },
+}
+
+P95_BUDGETS = {"short": ROUTER_P95_BUDGET_SHORT, "long": ROUTER_P95_BUDGET_LONG}
+
+DEGRADED_RESPONSES = {
+    "job_matching_agent": (
+        "I'm running slowly right now, so I can't give you a full answer. You can still browse "
+        "opportunities or open your dashboard from the menu, and I'll be back shortly."
+    ),
+    "job_posting_agent": (
+        "I'm having trouble keeping up at the moment. Your conversation is saved, so please send "
+        "your last message again in a minute and we'll carry on with the posting."
+    ),
+    "assessment_agent": (
+        "Candidate analysis is temporarily unavailable. The applications are all still on this page; "
+        "please ask again in a minute."
+    ),
+}
+DEFAULT_DEGRADED_RESPONSE = "The assistant is temporarily unavailable. Please try again in a minute."
+
+model_calls = registry.counter(
+    "model_calls_total", "Model calls by agent, model, request class and outcome (ok/error)",
+    ("agent", "model", "request_class", "result"))
+model_latency = registry.histogram(
+    "model_call_duration_seconds", "Model call latency by model and request class", ("model", "request_class"),
+    buckets=(0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 12.0, 20.0, 30.0, 60.0))
+model_failovers = registry.counter(
+    "model_failovers_total", "Requests not served by the preferred model (unhealthy/error/degraded)",
+    ("agent", "reason"))
+
+
+def parse_routes(value: str) -> Dict[str, Dict[str, Tuple[str, ...]]]:
+    """Parse ``"assessment_agent.long=gemini-2.0-flash|gemini-2.0-flash-lite,..."``"""
+    routes: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+    for item in value.split(","):
+        if "=" not in item or "." not in item.split("=", 1)[0]:
+            continue
+        target, models = item.split("=", 1)
+        agent, request_class = target.strip().rsplit(".", 1)
+        candidates = tuple(model.strip() for model in models.split("|") if model.strip())
+        if request_class not in REQUEST_CLASSES or not candidates:
+            logger.warning("Ignoring invalid model route %r", item)
+            continue
+        routes.setdefault(agent, {})[request_class] = candidates
+    return routes
+
+
+for _agent, _classes in parse_routes(os.getenv("MODEL_ROUTES", "")).items():
+    MODEL_ROUTES.setdefault(_agent, {}).update(_classes)
+
+
+def classify(llm_request: LlmRequest) -> str:
+    """``long`` when the conversation sent to the model is at least ROUTER_LONG_PROMPT_TOKENS"""
+    chars = sum(len(part.text) for content in llm_request.contents or []
+                for part in content.parts or [] if part.text)
+    return "long" if chars // CHARS_PER_TOKEN >= ROUTER_LONG_PROMPT_TOKENS else "short"
+
+
+def degraded_response(agent: str) -> LlmResponse:
+    text = DEGRADED_RESPONSES.get(agent, DEFAULT_DEGRADED_RESPONSE)
+    return LlmResponse(
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        custom_metadata={"degraded": True},
+    )
+
+
+@dataclass
+class Route:
+    agent: str
+    request_class: str
+    # Healthy candidates in preference order; the first is the one chosen
+    models: Tuple[str, ...]
+
+
+# Set by the before_model_callback, read by RoutedLlm within the same model call
+_current_route: ContextVar[Optional[Route]] = ContextVar("model_route", default=None)
+
+
+class ModelStats:
+    """Latency and outcome of recent calls to one model for one request class"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.samples: Deque[Tuple[float, float, bool]] = deque()
+
+    def _trim(self):
+        cutoff = time.monotonic() - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def add(self, seconds: float, ok: bool):
+        self.samples.append((time.monotonic(), seconds, ok))
+        self._trim()
+
+    def summary(self) -> Tuple[int, Optional[float], float]:
+        """(calls, p95 seconds of successful calls, error rate) over the window"""
+        self._trim()
+        latencies = sorted(seconds for _, seconds, ok in self.samples if ok)
+        errors = sum(not ok for _, _, ok in self.samples)
+        count = len(self.samples)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        return count, p95, errors / count if count else 0.0
+
+
+class RoutedLlm(BaseLlm):
+    """Agent model that calls whichever model the router picked, with failover"""
+
+    agent: str
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        async for response in model_router.generate(self.agent, llm_request, stream):
+            yield response
+
+
+class ModelRouter:
+    def __init__(self, routes: Dict[str, Dict[str, Tuple[str, ...]]] = MODEL_ROUTES,
+                 budgets: Dict[str, float] = P95_BUDGETS, max_error_rate: float = ROUTER_MAX_ERROR_RATE,
+                 window: int = ROUTER_WINDOW, min_samples: int = ROUTER_MIN_SAMPLES):
+        self.routes = routes
+        self.budgets = budgets
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.stats: Dict[Tuple[str, str], ModelStats] = {}
+        self._llms: Dict[str, BaseLlm] = {}
+
+    def candidates(self, agent: str, request_class: str) -> Tuple[str, ...]:
+        classes = self.routes.get(agent) or {}
+        return classes.get(request_class) or classes.get("short") or (AGENT_MODEL,)
+
+    def primary(self, agent: str) -> str:
+        """The agent's preferred model, as reported to ADK and used for cost estimates"""
+        return self.candidates(agent, "short")[0]
+
+    def llm(self, agent: str) -> RoutedLlm:
+        return RoutedLlm(model=self.primary(agent), agent=agent)
+
+    def _stats(self, model: str, request_class: str) -> ModelStats:
+        key = (model, request_class)
+        if key not in self.stats:
+            self.stats[key] = ModelStats(self.window)
+        return self.stats[key]
+
+    def health(self, model: str, request_class: str) -> Optional[str]:
+        """Why the model should not be used for this class right now, or None"""
+        count, p95, error_rate = self._stats(model, request_class).summary()
+        if count < self.min_samples:
+            return None
+        if error_rate > self.max_error_rate:
+            return "errors"
+        if p95 is not None and p95 > self.budgets.get(request_class, ROUTER_P95_BUDGET_LONG):
+            return "latency"
+        return None
+
+    def select(self, agent: str, llm_request: LlmRequest) -> Route:
+        request_class = classify(llm_request)
+        healthy = tuple(model for model in self.candidates(agent, request_class)
+                        if self.health(model, request_class) is None)
+        return Route(agent, request_class, healthy)
+
+    def before_model_callback(self):
+        def callback(callback_context, llm_request):
+            route = self.select(callback_context.agent_name, llm_request)
+            _current_route.set(route)
+            if not route.models:
+                model_failovers.labels(route.agent, "degraded").inc()
+                logger.warning("No healthy model for %s (%s requests); answering degraded",
+                               route.agent, route.request_class)
+                return degraded_response(route.agent)
+            if route.models[0] != self.candidates(route.agent, route.request_class)[0]:
+                model_failovers.labels(route.agent, "unhealthy").inc()
+            llm_request.model = route.models[0]
+            return None
+        return callback
+
+    def _llm_for(self, model: str) -> BaseLlm:
+        # One client per model; LLMRegistry.new_llm builds a fresh one each time
+        if model not in self._llms:
+            self._llms[model] = LLMRegistry.new_llm(model)
+        return self._llms[model]
+
+    def record(self, agent: str, model: str, request_class: str, seconds: float, ok: bool):
+        self._stats(model, request_class).add(seconds, ok)
+        model_calls.labels(agent, model, request_class, "ok" if ok else "error").inc()
+        if ok:
+            model_latency.labels(model, request_class).observe(seconds)
+
+    async def generate(self, agent: str, llm_request: LlmRequest, stream: bool) -> AsyncGenerator[LlmResponse, None]:
+        route = _current_route.get()
+        _current_route.set(None)
+        if route is None or route.agent != agent:
+            route = self.select(agent, llm_request)
+            route = Route(agent, route.request_class, route.models or (llm_request.model,))
+
+        models = list(route.models)
+        if llm_request.model in models:
+            models.remove(llm_request.model)
+        models.insert(0, llm_request.model)
+
+        for attempt, model in enumerate(models):
+            llm_request.model = model
+            started = time.perf_counter()
+            produced = False
+            try:
+                async for response in self._llm_for(model).generate_content_async(llm_request, stream=stream):
+                    produced = True
+                    response.custom_metadata = {**(response.custom_metadata or {}), "model": model}
+                    yield response
+            except Exception as e:
+                self.record(agent, model, route.request_class, time.perf_counter() - started, False)
+                if produced:
+                    raise
+                logger.warning("Model %s failed for %s (%s): %s", model, agent, route.request_class, e)
+                if llm_request.config and llm_request.config.cached_content:
+                    # The prompt prefix now lives in this model's context cache; other models can't use it
+                    break
+                if attempt + 1 < len(models):
+                    model_failovers.labels(agent, "error").inc()
+                continue
+            self.record(agent, model, route.request_class, time.perf_counter() - started, True)
+            return
+
+        model_failovers.labels(agent, "degraded").inc()
+        yield degraded_response(agent)
+
+    def snapshot(self) -> dict:
+        models = {}
+        for (model, request_class), stats in sorted(self.stats.items()):
+            count, p95, error_rate = stats.summary()
+            models.setdefault(model, {})[request_class] = {
+                "calls": count,
+                "p95_seconds": round(p95, 3) if p95 is not None else None,
+                "error_rate": round(error_rate, 3),
+                "unhealthy": self.health(model, request_class),
+            }
+        return {
+            "routes": {agent: {cls: list(candidates) for cls, candidates in classes.items()}
+                       for agent, classes in self.routes.items()},
+            "p95_budgets": self.budgets,
+            "max_error_rate": self.max_error_rate,
+            "window_seconds": self.window,
+            "min_samples": self.min_samples,
+            "models": models,
+        }
+
+
+# Shared by the agents (model and before_model_callback) and /debug/models
+model_router = ModelRouter()
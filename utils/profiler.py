@@ -0,0 +1,70 @@
+"""
+Low-overhead sampling profiler for the live process.
+
+A background thread snapshots every thread's stack with
+``sys._current_frames()`` at a fixed rate and counts identical stacks.
+The result is in the collapsed-stack format read by flamegraph.pl,
+speedscope and similar tools. The profiled threads are never traced, so
+the cost is one stack walk per sample.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_PROFILE_SECONDS = 60
+DEFAULT_SAMPLE_HZ = 100
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    pass
+
+
+def _frame_label(frame, root_dir: str) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(root_dir):
+        filename = os.path.relpath(filename, root_dir)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename})"
+
+
+def sample_stacks(seconds: float, hz: int = DEFAULT_SAMPLE_HZ, root_dir: str = None) -> Counter:
+    """Sample all threads for ``seconds`` and count collapsed stacks"""
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+
+    root_dir = root_dir or os.getcwd()
+    interval = 1.0 / hz
+    own_thread = threading.get_ident()
+    thread_names = {}
+    stacks = Counter()
+
+    try:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame, root_dir))
+                    frame = frame.f_back
+                labels.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+    finally:
+        _profile_lock.release()
+    return stacks
+
+
+def collapsed(stacks: Counter) -> str:
+    """Render stack counts as ``frame;frame;frame count`` lines"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
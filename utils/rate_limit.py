@@ -0,0 +1,366 @@
+"""
+Per-user and per-IP rate limiting with token buckets.
+
+Sign-in (``/api/login``) and registration (``/api/register``) verify
+Firebase tokens and mint session cookies. The chat endpoints call a
+model. ``RateLimitMiddleware`` puts a token bucket in front of each. A
+bucket holds up to ``capacity`` requests and refills at
+capacity/period per second, so a client can send a short burst but not
+a sustained stream. A request that finds its bucket empty is answered
+with 429 and a Retry-After header, and never reaches the route.
+
+Policies (DEFAULT_POLICIES, overridden by RATE_LIMITS, e.g.
+"login=10/60,chat=20/60") name the routes they cover and what they are
+keyed by:
+
+- ``ip``: the client address. Behind a proxy, set RATE_LIMIT_PROXY_HOPS
+  to the number of trusted proxies that append to X-Forwarded-For.
+  IPv6 addresses are grouped by /64, which one client usually holds.
+- ``user``: the signed-in user's uid, falling back to the client address
+  for requests without a valid session.
+
+Buckets live in memory. Lookups and updates are O(1), and at most
+RATE_LIMIT_MAX_BUCKETS are kept; beyond that the least recently used is
+dropped. Every RATE_LIMIT_SWEEP_INTERVAL seconds, every bucket that has
+refilled completely is removed, whatever its place in LRU order
+(policies refill at different rates). The sweep checks
+RATE_LIMIT_SWEEP_BATCH buckets at a time and yields to the event loop
+between batches. A full
+bucket is the same as no bucket, so this frees memory without changing
+any decision.
+
+Memory buckets are per worker process. With RATE_LIMIT_URL=firestore://
+(the production default in run.py), buckets are shared by every worker
+and instance through transactions on the ``rate_limits`` collection. The
+local bucket then mirrors the last shared state. It can only hold more
+tokens than the shared one, so a local "empty" answers a flood without a
+Firestore round trip. Documents carry ``expires_at`` for a Firestore TTL
+policy. If the shared store fails, the local bucket decides on its own,
+so each worker still enforces the limit for the requests it sees.
+
+Each decision is counted in ``rate_limit_decisions_total``.
+"""
+
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "memory://")
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 50000))
+RATE_LIMIT_SWEEP_INTERVAL = int(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", 60))
+RATE_LIMIT_SWEEP_BATCH = int(os.getenv("RATE_LIMIT_SWEEP_BATCH", 5000))
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", 0))
+
+MEMORY_SCHEME = "memory://"
+FIRESTORE_SCHEME = "firestore://"
+RATE_LIMIT_COLLECTION = "rate_limits"
+
+rate_limit_decisions = registry.counter(
+    "rate_limit_decisions_total",
+    "Rate limiter decisions by policy, key type and result (allowed/limited; local_* when the shared store failed)",
+    ("policy", "key", "result"))
+rate_limit_buckets = registry.gauge("rate_limit_buckets", "Token buckets held in memory by this process")
+rate_limit_evictions = registry.counter(
+    "rate_limit_bucket_evictions_total", "Buckets removed from memory (swept when full, or dropped at capacity)",
+    ("reason",))
+
+
+@dataclass
+class Policy:
+    name: str
+    key: str  # "ip" or "user"
+    capacity: int
+    period: float  # seconds to refill an empty bucket
+    routes: Tuple[Tuple[str, str], ...]  # (method, path regex)
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+DEFAULT_POLICIES: Dict[str, Policy] = {
+    "login": Policy("login", "ip", 10, 60, (("POST", "/api/login"),)),
+    "register": Policy("register", "ip", 5, 600, (("POST", "/api/register"),)),
+    "chat": Policy("chat", "user", 20, 60, (
+        ("POST", "/api/chat"),
+        ("POST", "/api/opportunities/create"),
+        ("POST", "/api/opportunities/[^/]+/assess"),
+    )),
+}
+
+
+def parse_policies(value: str, policies: Dict[str, Policy]) -> Dict[str, Policy]:
+    """Apply ``"login=10/60,chat=20/60"`` (capacity/period seconds) to the named policies"""
+    result = dict(policies)
+    for item in value.split(","):
+        if "=" not in item or "/" not in item:
+            continue
+        name, limit = item.split("=", 1)
+        name = name.strip()
+        try:
+            capacity, period = limit.split("/", 1)
+            if name not in result:
+                raise ValueError("unknown policy")
+            result[name] = Policy(name, result[name].key, int(capacity), float(period), result[name].routes)
+        except ValueError:
+            logger.warning("Ignoring invalid rate limit %r", item)
+    return result
+
+
+def client_ip(scope, proxy_hops: int = RATE_LIMIT_PROXY_HOPS) -> str:
+    """The client address, as seen by the outermost trusted proxy; IPv6 grouped by /64"""
+    address = None
+    if proxy_hops > 0:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                hops = [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+                if hops:
+                    address = hops[-min(proxy_hops, len(hops))]
+                break
+    if address is None:
+        client = scope.get("client")
+        address = client[0] if client else "unknown"
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return address
+    if ip.version == 6:
+        return str(ipaddress.ip_network(f"{ip}/64", strict=False))
+    return str(ip)
+
+
+@dataclass
+class Decision:
+    policy: str
+    key: str  # "ip" or "user"
+    allowed: bool
+    retry_after: int = 0
+
+
+class MemoryBuckets:
+    """Token buckets in an LRU-ordered dict: key -> [tokens, updated, full_at]"""
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def _tokens(self, key: str, policy: Policy, now: float) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return policy.capacity
+        return min(policy.capacity, bucket[0] + (now - bucket[1]) * policy.rate)
+
+    def peek(self, key: str, policy: Policy, now: float) -> float:
+        """Seconds until a request would be allowed (0 if it would be now)"""
+        tokens = self._tokens(key, policy, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / policy.rate
+
+    def set(self, key: str, policy: Policy, tokens: float, now: float):
+        self.buckets[key] = [tokens, now, now + (policy.capacity - tokens) / policy.rate]
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.max_buckets:
+            self.buckets.popitem(last=False)
+            rate_limit_evictions.labels("capacity").inc()
+
+    def take(self, key: str, policy: Policy, now: float) -> float:
+        """Spend a token if there is one; returns seconds to wait (0 if allowed)"""
+        tokens = self._tokens(key, policy, now)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / policy.rate
+        self.set(key, policy, tokens, now)
+        return wait
+
+    def sweep(self, now: float, keys: Optional[List[str]] = None) -> int:
+        """Drop buckets that have refilled completely, among ``keys`` (default: all of them)"""
+        expired = [key for key in (keys if keys is not None else list(self.buckets))
+                   if (bucket := self.buckets.get(key)) is not None and bucket[2] <= now]
+        for key in expired:
+            del self.buckets[key]
+        if expired:
+            rate_limit_evictions.labels("sweep").inc(len(expired))
+        return len(expired)
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class MemoryBackend:
+    """Buckets private to this worker process"""
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.local = MemoryBuckets(max_buckets)
+
+    async def take(self, key: str, policy: Policy) -> float:
+        return self.local.take(key, policy, time.time())
+
+
+class FirestoreBackend:
+    """Buckets shared by every instance, one ``rate_limits`` document each"""
+
+    def __init__(self, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self.local = MemoryBuckets(max_buckets)
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            from firebase_admin import firestore as admin_firestore
+            self._db = admin_firestore.client()
+        return self._db
+
+    def _take(self, key: str, policy: Policy, now: float) -> Tuple[float, float]:
+        from firebase_admin import firestore as admin_firestore
+        ref = self.db.collection(RATE_LIMIT_COLLECTION).document(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+        @admin_firestore.transactional
+        def apply(transaction):
+            snapshot = ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else None
+            tokens = policy.capacity
+            if data:
+                tokens = min(policy.capacity, data["tokens"] + (now - data["updated"]) * policy.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / policy.rate
+            refilled = now + (policy.capacity - tokens) / policy.rate
+            transaction.set(ref, {"policy": policy.name, "tokens": tokens, "updated": now,
+                                  "expires_at": datetime.fromtimestamp(refilled, timezone.utc) + timedelta(hours=1)})
+            return wait, tokens
+        return apply(self.db.transaction())
+
+    async def take(self, key: str, policy: Policy) -> float:
+        now = time.time()
+        # The local copy never holds fewer tokens than the shared bucket
+        wait = self.local.peek(key, policy, now)
+        if wait:
+            return wait
+        wait, tokens = await asyncio.to_thread(self._take, key, policy, now)
+        self.local.set(key, policy, tokens, now)
+        return wait
+
+
+def open_rate_limit_backend(url: str = RATE_LIMIT_URL):
+    if url.startswith(FIRESTORE_SCHEME):
+        return FirestoreBackend()
+    if url.startswith(MEMORY_SCHEME) or not url:
+        return MemoryBackend()
+    raise ValueError(f"Unsupported RATE_LIMIT_URL {url!r} (use memory:// or firestore://)")
+
+
+Identify = Callable[[Request], Awaitable[Optional[str]]]
+
+
+class RateLimiter:
+    def __init__(self, backend=None, policies: Optional[Dict[str, Policy]] = None,
+                 sweep_interval: int = RATE_LIMIT_SWEEP_INTERVAL, enabled: bool = RATE_LIMIT_ENABLED,
+                 sweep_batch: int = RATE_LIMIT_SWEEP_BATCH):
+        self.backend = backend or open_rate_limit_backend()
+        self.policies = policies or parse_policies(os.getenv("RATE_LIMITS", ""), DEFAULT_POLICIES)
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self.enabled = enabled
+        self.routes: List[Tuple[str, re.Pattern, Policy]] = [
+            (method, re.compile(path), policy)
+            for policy in self.policies.values() for method, path in policy.routes
+        ]
+
+    def policy_for(self, method: str, path: str) -> Optional[Policy]:
+        for route_method, pattern, policy in self.routes:
+            if method == route_method and pattern.fullmatch(path):
+                return policy
+        return None
+
+    async def check(self, request: Request, identify: Optional[Identify] = None) -> Optional[Decision]:
+        """Spend a token for this request; None when no policy covers it"""
+        if not self.enabled:
+            return None
+        policy = self.policy_for(request.method, request.url.path)
+        if policy is None:
+            return None
+
+        uid = await identify(request) if identify and policy.key == "user" else None
+        key_type = "user" if uid else "ip"
+        key = f"{policy.name}:{key_type}:{uid or client_ip(request.scope)}"
+        try:
+            wait = await self.backend.take(key, policy)
+            source = ""
+        except Exception as e:
+            # This worker's own bucket still bounds what one client gets through it
+            logger.warning("Shared rate limit store unavailable, using the local bucket: %s", e)
+            wait = self.backend.local.take(key, policy, time.time())
+            source = "local_"
+
+        allowed = wait == 0
+        rate_limit_decisions.labels(policy.name, key_type, source + ("allowed" if allowed else "limited")).inc()
+        if not allowed:
+            logger.info("Rate limited %s (%s)", policy.name, key)
+        return Decision(policy.name, key_type, allowed, max(1, math.ceil(wait)) if not allowed else 0)
+
+    async def run_sweeper(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            keys = list(self.backend.local.buckets)
+            for start in range(0, len(keys), self.sweep_batch):
+                self.backend.local.sweep(time.time(), keys[start:start + self.sweep_batch])
+                await asyncio.sleep(0)
+            rate_limit_buckets.labels().set(len(self.backend.local))
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "buckets": len(self.backend.local),
+            "policies": {
+                name: {"key": policy.key, "capacity": policy.capacity, "period": policy.period,
+                       "routes": [f"{method} {path}" for method, path in policy.routes]}
+                for name, policy in self.policies.items()
+            },
+        }
+
+
+Respond = Callable[[Request, Decision], Response]
+
+
+class RateLimitMiddleware:
+    """Answer requests over their policy's limit with ``respond(request, decision)``"""
+
+    def __init__(self, app, limiter: RateLimiter, respond: Respond, identify: Optional[Identify] = None):
+        self.app = app
+        self.limiter = limiter
+        self.respond = respond
+        self.identify = identify
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        decision = await self.limiter.check(request, self.identify)
+        if decision is not None and not decision.allowed:
+            response = self.respond(request, decision)
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,323 @@
+"""
+Response cache for generic agent questions.
+
+Talent users often ask the dashboard agent near-identical questions
+("any resume tips?", "how should I prepare for an interview?"). A cached
+reply answers these without calling the model.
+
+The cache key has four parts:
+
+- the agent;
+- a hash of the agent's model, instruction and tools, so editing the
+  prompt invalidates old answers;
+- the user type;
+- the message, normalised (lowercase, punctuation and filler removed).
+
+When CACHE_EMBEDDING_MODEL is set, a message with no exact match is
+embedded. It is then compared with cached messages of the same agent,
+version and user type, and an entry whose cosine similarity is at least
+RESPONSE_CACHE_SIMILARITY counts as a hit.
+
+Messages that lean on the conversation ("what about the second one?",
+"yes", "tell me more") or carry personal details (numbers, emails, links)
+bypass the cache. Their answers depend on the session.
+
+The cache runs inside the agent as its first before_model_callback, so a
+hit is answered in place of the model call and recorded in the user's ADK
+session like any other reply; a follow-up then refers to an answer the
+agent has seen. The user type comes from the "[User type: ...]" prefix
+main.py puts on every message. Only replies from a session's first turn
+are stored. A later turn is answered with that user's earlier
+conversation in view, and its reply may repeat their details to anyone
+who asks the same question.
+
+Entries expire after RESPONSE_CACHE_TTL seconds. The least recently used
+entry is evicted beyond RESPONSE_CACHE_MAX_ENTRIES. Each hit records the
+latency and tokens the model call would have cost.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from .metrics import cache_requests, record_cache, registry
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 6 * 3600))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 512))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.92))
+CACHE_EMBEDDING_MODEL = os.getenv("CACHE_EMBEDDING_MODEL", "")
+
+CACHE_NAME = "agent_response"
+
+response_cache_saved_seconds = registry.counter(
+    "response_cache_saved_seconds_total", "Estimated model latency avoided by response cache hits", ("agent",))
+response_cache_saved_tokens = registry.counter(
+    "response_cache_saved_tokens_total", "Model tokens avoided by response cache hits", ("agent",))
+
+FILLER = frozenset("please thanks thank hi hello hey ok okay so um uh".split())
+
+# Follow-ups and references to earlier turns only make sense in their session
+CONTEXT_MARKERS = re.compile(
+    r"\b(it|that|those|these|this one|them|above|previous|earlier|before|again|more|continue|"
+    r"else|also|instead|same|second|third|last|first one|you said|what about|how about|"
+    r"yes|no|yeah|nope|sure)\b")
+# Personal specifics: numbers, emails, links
+PERSONAL_MARKERS = re.compile(r"\d|@|https?://|www\.")
+MIN_WORDS = 3
+USER_TYPE_PREFIX = re.compile(r"^\[User type: (\w+)\]\s*", re.IGNORECASE)
+# Turns between a missed lookup and the reply that answers it
+MAX_PENDING_TURNS = 256
+
+
+def normalize(message: str) -> str:
+    words = re.findall(r"[a-z']+", message.lower())
+    return " ".join(w for w in words if w not in FILLER)
+
+
+def bypass_reason(message: str) -> Optional[str]:
+    """Why this message must not be answered from the cache, or None"""
+    text = message.lower()
+    if PERSONAL_MARKERS.search(text):
+        return "personal"
+    if CONTEXT_MARKERS.search(text) or len(normalize(message).split()) < MIN_WORDS:
+        return "context"
+    return None
+
+
+def agent_version(agent) -> str:
+    """Short hash of what shapes the agent's answers: model, instruction and tool names"""
+    tools = ",".join(sorted(getattr(tool, "name", str(tool)) for tool in (agent.tools or [])))
+    source = f"{agent.model}|{agent.instruction}|{tools}"
+    return hashlib.sha1(source.encode()).hexdigest()[:12]
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    # Embeddings are normalised when stored, so the dot product is the cosine
+    return math.sumprod(a, b)
+
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = math.sqrt(math.sumprod(vector, vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+@dataclass
+class CachedResponse:
+    response: str
+    tokens: int
+    seconds: float
+    created: float
+    embedding: Optional[List[float]] = None
+    hits: int = 0
+
+
+@dataclass
+class PendingTurn:
+    lookup: "Lookup"
+    started: float
+    tokens: int = 0
+
+
+@dataclass
+class Lookup:
+    agent: str
+    partition: Tuple[str, str, str]
+    message: str
+    bypass: Optional[str] = None
+    entry: Optional[CachedResponse] = None
+    similarity: Optional[float] = None
+    embedding: Optional[List[float]] = field(default=None, repr=False)
+
+    @property
+    def hit(self) -> bool:
+        return self.entry is not None
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: int = RESPONSE_CACHE_TTL,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY, embedding_model: str = CACHE_EMBEDDING_MODEL,
+                 enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embedding_model = embedding_model
+        self.enabled = enabled
+        self.entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "bypassed": 0,
+                      "saved_seconds": 0.0, "saved_tokens": 0, "not_stored": 0}
+        self._pending: "OrderedDict[str, PendingTurn]" = OrderedDict()
+        self._client = None
+
+    async def _embed(self, text: str) -> Optional[List[float]]:
+        if not self.embedding_model:
+            return None
+        try:
+            if self._client is None:
+                from google import genai
+                self._client = genai.Client()
+            result = await self._client.aio.models.embed_content(model=self.embedding_model, contents=text)
+            return _unit(result.embeddings[0].values)
+        except Exception as e:
+            # Exact-match caching keeps working without embeddings
+            logger.warning("Embedding lookup failed, using exact matches only: %s", e)
+            return None
+
+    def _fresh(self, key: tuple) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.created > self.ttl:
+            del self.entries[key]
+            return None
+        return entry
+
+    async def lookup(self, agent: str, version: str, user_type: str, message: str) -> Lookup:
+        partition = (agent, version, user_type)
+        lookup = Lookup(agent, partition, normalize(message))
+        if not self.enabled:
+            lookup.bypass = "disabled"
+            return lookup
+        lookup.bypass = bypass_reason(message)
+        if lookup.bypass:
+            self.stats["bypassed"] += 1
+            cache_requests.labels(CACHE_NAME, "bypass").inc()
+            return lookup
+
+        key = partition + (lookup.message,)
+        lookup.entry = self._fresh(key)
+        if lookup.entry is None:
+            lookup.embedding = await self._embed(lookup.message)
+            if lookup.embedding:
+                lookup.entry, lookup.similarity = self._nearest(partition, lookup.embedding)
+        if lookup.entry is None:
+            self.stats["misses"] += 1
+            record_cache(CACHE_NAME, False)
+            return lookup
+
+        if lookup.similarity is None:
+            self.entries.move_to_end(key)
+        else:
+            self.stats["semantic_hits"] += 1
+        lookup.entry.hits += 1
+        self.stats["hits"] += 1
+        self.stats["saved_seconds"] += lookup.entry.seconds
+        self.stats["saved_tokens"] += lookup.entry.tokens
+        response_cache_saved_seconds.labels(agent).inc(lookup.entry.seconds)
+        response_cache_saved_tokens.labels(agent).inc(lookup.entry.tokens)
+        record_cache(CACHE_NAME, True)
+        return lookup
+
+    def _nearest(self, partition: tuple, embedding: List[float]) -> Tuple[Optional[CachedResponse], Optional[float]]:
+        best_key, best_score = None, self.similarity
+        for key in list(self.entries):
+            if key[:3] != partition:
+                continue
+            entry = self._fresh(key)
+            if entry is None or entry.embedding is None:
+                continue
+            score = _cosine(embedding, entry.embedding)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None, None
+        self.entries.move_to_end(best_key)
+        return self.entries[best_key], best_score
+
+    def store(self, lookup: Lookup, response: str, tokens: int, seconds: float):
+        """Cache the model's answer to a missed lookup"""
+        if lookup.bypass or lookup.hit:
+            return
+        key = lookup.partition + (lookup.message,)
+        self.entries[key] = CachedResponse(response, tokens, seconds, time.time(), lookup.embedding)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def before_model_callback(self):
+        """Answer the turn's first model call from the cache; on a miss, remember the turn for the reply"""
+        async def callback(callback_context, llm_request):
+            if not self.enabled:
+                return None
+            context = callback_context._invocation_context
+            session = context.session
+            # Later model calls of the turn (after a tool call) go to the model
+            if context.invocation_id in self._pending or any(
+                    event.invocation_id == context.invocation_id and event.author != "user"
+                    for event in session.events):
+                return None
+            text = "".join(part.text or "" for part in (context.user_content.parts or [])) \
+                if context.user_content else ""
+            match = USER_TYPE_PREFIX.match(text)
+            user_type, message = (match.group(1).lower(), text[match.end():]) if match else ("", text)
+            if not message.strip():
+                return None
+            agent = context.agent
+            lookup = await self.lookup(agent.name, agent_version(agent), user_type, message)
+            if lookup.hit:
+                return LlmResponse(
+                    content=types.Content(role="model", parts=[types.Part(text=lookup.entry.response)]),
+                    custom_metadata={"response_cache": "semantic_hit" if lookup.similarity else "hit"},
+                )
+            if lookup.bypass:
+                return None
+            if any(event.invocation_id != context.invocation_id for event in session.events):
+                self.stats["not_stored"] += 1
+                return None
+            self._pending[context.invocation_id] = PendingTurn(lookup, time.perf_counter())
+            while len(self._pending) > MAX_PENDING_TURNS:
+                self._pending.popitem(last=False)
+            return None
+        return callback
+
+    def after_model_callback(self):
+        """Store the final reply of a turn remembered by before_model_callback"""
+        def callback(callback_context, llm_response):
+            turn = self._pending.get(callback_context._invocation_context.invocation_id)
+            if turn is None or llm_response.partial:
+                return None
+            if llm_response.usage_metadata:
+                turn.tokens += llm_response.usage_metadata.total_token_count or 0
+            content = llm_response.content
+            if not content or not content.parts or any(part.function_call for part in content.parts):
+                return None
+            del self._pending[callback_context._invocation_context.invocation_id]
+            text = "".join(part.text or "" for part in content.parts).strip()
+            if text and not (llm_response.custom_metadata or {}).get("degraded") and not llm_response.error_code:
+                self.store(turn.lookup, text, turn.tokens, time.perf_counter() - turn.started)
+            return None
+        return callback
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "pending_turns": len(self._pending),
+            "ttl": self.ttl,
+            "embedding_model": self.embedding_model or None,
+            **self.stats,
+            "saved_seconds": round(self.stats["saved_seconds"], 2),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+            "top": [
+                # Cached messages were typed by users; identify them without showing the text
+                {"message_hash": hashlib.sha1(key[3].encode()).hexdigest()[:12], "user_type": key[2],
+                 "hits": entry.hits}
+                for key, entry in sorted(self.entries.items(), key=lambda item: -item[1].hits)[:10]
+            ],
+        }
+
+
+response_cache = ResponseCache()
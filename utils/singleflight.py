@@ -0,0 +1,61 @@
+"""
+Single-flight: concurrent identical calls share one execution.
+
+The first caller for a key starts the work as a task. Callers that
+arrive with the same key before it finishes await that task instead of
+repeating the Firestore query or agent run. Examples are double-submitted
+forms and several tabs reloading one page. Errors reach every caller.
+The key is forgotten as soon as the work completes, so this is not a
+cache.
+
+The work runs in its own task, so a caller that disconnects doesn't
+cancel it for the others. Followers get a deep copy of the result, so
+they can't see each other's changes to it.
+"""
+
+import asyncio
+import copy
+import functools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+single_flight_calls = registry.counter(
+    "single_flight_calls_total", "Calls through a single-flight group, by whether they ran or joined one in flight",
+    ("group", "result"))
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.calls.get(key)
+        if task is not None:
+            single_flight_calls.labels(self.name, "coalesced").inc()
+            logger.debug("Joined in-flight %s call %r", self.name, key)
+            return copy.deepcopy(await asyncio.shield(task))
+
+        single_flight_calls.labels(self.name, "executed").inc()
+        task = asyncio.ensure_future(fn())
+        self.calls[key] = task
+        task.add_done_callback(lambda _: self.calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self.calls)
+
+
+def coalesce(flight: SingleFlight):
+    """Decorate an async method so identical concurrent calls (same name and arguments) share one run"""
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            key = (id(self), method.__name__, args, tuple(sorted(kwargs.items())))
+            return await flight.do(key, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
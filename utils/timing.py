@@ -0,0 +1,184 @@
+"""
+Per-request timing spans, emitted as a Server-Timing header and a
+structured log line.
+
+Enabled with SERVER_TIMING=true. When disabled the middleware is a
+pass-through and ``span()`` returns a shared no-op context manager.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.templating import Jinja2Templates
+from starlette.datastructures import MutableHeaders
+
+from .middleware import route_template
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+_current_timing: ContextVar[Optional["RequestTiming"]] = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """Spans collected for one request, aggregated by name"""
+
+    __slots__ = ("started", "spans")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+
+    def add(self, name: str, duration: float):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [duration, 1]
+        else:
+            entry[0] += duration
+            entry[1] += 1
+
+    def header_value(self) -> str:
+        parts = [
+            f'{name};dur={total * 1000:.1f};desc="{count}x"'
+            for name, (total, count) in self.spans.items()
+        ]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+class _Span:
+    __slots__ = ("name", "timing", "started")
+
+    def __init__(self, name: str, timing: RequestTiming):
+        self.name = name
+        self.timing = timing
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timing.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """Time a block against the current request (no-op outside a timed request)"""
+    timing = _current_timing.get()
+    if timing is None:
+        return _NOOP_SPAN
+    return _Span(name, timing)
+
+
+def instrument_methods(cls, prefix: str, histogram=None):
+    """
+    Wrap every public method of ``cls`` in a span named ``prefix.method``.
+    When ``histogram`` (a metric family labelled by method) is given, every
+    call is also observed there, whether or not Server-Timing is enabled.
+    """
+    if not SERVER_TIMING_ENABLED and histogram is None:
+        return cls
+
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not callable(method):
+            continue
+        observer = histogram.labels(name) if histogram is not None else None
+        setattr(cls, name, _timed(method, f"{prefix}.{name}", observer))
+    return cls
+
+
+def _record(span_name: str, duration: float, observer):
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.add(span_name, duration)
+    if observer is not None:
+        observer.observe(duration)
+
+
+def _timed(method, span_name: str, observer=None):
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                _record(span_name, time.perf_counter() - started, observer)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _record(span_name, time.perf_counter() - started, observer)
+    return wrapper
+
+
+class TimedJinja2Templates(Jinja2Templates):
+    """Jinja2Templates that records template rendering as a ``render`` span"""
+
+    def TemplateResponse(self, *args, **kwargs):
+        with span("render"):
+            return super().TemplateResponse(*args, **kwargs)
+
+
+class ServerTimingMiddleware:
+    """Collect spans for each request and report them on the way out"""
+
+    def __init__(self, app, enabled: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        status_code = None
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(raw=message["headers"])
+                headers.append("Server-Timing", timing.header_value())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timing.reset(token)
+            logger.info("server_timing %s", json.dumps({
+                "method": scope["method"],
+                "route": route_template(scope),
+                "status": status_code,
+                "total_ms": round((time.perf_counter() - timing.started) * 1000, 1),
+                "spans": {
+                    name: {"ms": round(total * 1000, 1), "count": count}
+                    for name, (total, count) in timing.spans.items()
+                },
+            }))
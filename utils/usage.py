@@ -0,0 +1,312 @@
+"""
+Token and cost accounting for agent calls.
+
+Every agent run reports the ``usageMetadata`` of its model calls (see
+``extract_usage``). ``UsageTracker`` adds these up in memory by agent,
+user and route. Records are batched and flushed to Firestore every
+USAGE_FLUSH_INTERVAL seconds: one ``token_usage`` document per day,
+dimension and key, updated with Increment. Totals from all workers and
+instances therefore add up. Runs above USAGE_PROMPT_LOG_TOKENS are also
+written to ``token_usage_prompts``. The report lists those as the
+highest-token prompts.
+
+Daily budgets (TOKEN_BUDGET_USER_DAILY, TOKEN_BUDGET_AGENT_DAILY,
+COST_BUDGET_DAILY_USD) raise alarms rather than blocking requests. A
+warning is logged and ``token_budget_alarms_total`` is incremented once
+when a user, an agent or the whole process passes 80% of its budget for
+the day, and again at 100%. The process-wide figure is per worker.
+
+Costs use list prices per million tokens from MODEL_PRICES, which
+TOKEN_PRICES ("model=input/output,...") overrides. Cached prompt tokens
+are charged at CACHED_TOKEN_PRICE_RATIO of the input price.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from firebase_admin import firestore as admin_firestore
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+USAGE_COLLECTION = "token_usage"
+PROMPT_COLLECTION = "token_usage_prompts"
+
+USAGE_FLUSH_INTERVAL = int(os.getenv("USAGE_FLUSH_INTERVAL", 60))
+USAGE_PROMPT_LOG_TOKENS = int(os.getenv("USAGE_PROMPT_LOG_TOKENS", 4000))
+TOKEN_BUDGET_USER_DAILY = int(os.getenv("TOKEN_BUDGET_USER_DAILY", 0))
+TOKEN_BUDGET_AGENT_DAILY = int(os.getenv("TOKEN_BUDGET_AGENT_DAILY", 0))
+COST_BUDGET_DAILY_USD = float(os.getenv("COST_BUDGET_DAILY_USD", 0))
+CACHED_TOKEN_PRICE_RATIO = 0.25
+BUDGET_WARNING_RATIO = 0.8
+TOP_PROMPTS = 20
+PROMPT_PREVIEW_CHARS = 300
+# Firestore batches hold at most 500 writes
+MAX_BATCH_WRITES = 500
+
+# USD per million (input, output) tokens
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Model tokens by agent and kind (prompt/completion/cached)", ("agent", "kind"))
+llm_cost = registry.counter(
+    "llm_cost_usd_total", "Estimated model cost in USD by agent", ("agent",))
+llm_prompt_tokens = registry.histogram(
+    "llm_prompt_tokens", "Prompt tokens per agent run", ("agent",),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000))
+token_budget_alarms = registry.counter(
+    "token_budget_alarms_total", "Daily token or cost budget alarms by scope and level", ("scope", "level"))
+
+
+def parse_prices(value: str) -> Dict[str, Tuple[float, float]]:
+    """Parse ``"gemini-2.0-flash=0.10/0.40,..."``"""
+    prices = {}
+    for item in value.split(","):
+        if "=" not in item or "/" not in item:
+            continue
+        model, price = item.split("=", 1)
+        try:
+            input_price, output_price = (float(p) for p in price.split("/", 1))
+        except ValueError:
+            logger.warning("Ignoring invalid token price %r", item)
+            continue
+        prices[model.strip()] = (input_price, output_price)
+    return prices
+
+
+MODEL_PRICES.update(parse_prices(os.getenv("TOKEN_PRICES", "")))
+
+
+def estimate_cost(model: str, usage: Dict[str, int]) -> float:
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    uncached = usage["prompt_tokens"] - usage["cached_tokens"]
+    return (uncached * input_price
+            + usage["cached_tokens"] * input_price * CACHED_TOKEN_PRICE_RATIO
+            + usage["completion_tokens"] * output_price) / 1_000_000
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class UsageTotals:
+    __slots__ = ("requests", "model_calls", "prompt_tokens", "completion_tokens", "cached_tokens",
+                 "total_tokens", "cost_usd")
+
+    def __init__(self):
+        self.requests = 0
+        self.model_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.total_tokens = 0
+        self.cost_usd = 0.0
+
+    def add(self, usage: Dict[str, int], cost: float):
+        self.requests += 1
+        self.model_calls += usage["model_calls"]
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        self.cached_tokens += usage["cached_tokens"]
+        self.total_tokens += usage["total_tokens"]
+        self.cost_usd += cost
+
+    def to_dict(self) -> dict:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["cost_usd"] = round(self.cost_usd, 6)
+        return data
+
+
+class UsageTracker:
+    DIMENSIONS = ("agent", "user", "route")
+
+    def __init__(self, flush_interval: int = USAGE_FLUSH_INTERVAL, prompt_log_tokens: int = USAGE_PROMPT_LOG_TOKENS):
+        self.flush_interval = flush_interval
+        self.prompt_log_tokens = prompt_log_tokens
+        self.totals: Dict[Tuple[str, str], UsageTotals] = defaultdict(UsageTotals)
+        self.daily: Dict[Tuple[str, str, str], UsageTotals] = defaultdict(UsageTotals)
+        self.pending: Dict[Tuple[str, str, str], UsageTotals] = defaultdict(UsageTotals)
+        self.pending_prompts: List[dict] = []
+        # Min-heap of (total_tokens, sequence, record): the largest runs since startup
+        self.top_prompts: List[tuple] = []
+        self.alarms_raised = set()
+        self._sequence = 0
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = admin_firestore.client()
+        return self._db
+
+    def record(self, agent: str, model: str, user_id: str, route: str, usage: Dict[str, int], prompt: str = ""):
+        if not usage["model_calls"]:
+            return
+        cost = estimate_cost(model, usage)
+        day = _today()
+        llm_tokens.labels(agent, "prompt").inc(usage["prompt_tokens"])
+        llm_tokens.labels(agent, "completion").inc(usage["completion_tokens"])
+        llm_tokens.labels(agent, "cached").inc(usage["cached_tokens"])
+        llm_cost.labels(agent).inc(cost)
+        llm_prompt_tokens.labels(agent).observe(usage["prompt_tokens"])
+
+        for dimension, key in zip(self.DIMENSIONS, (agent, user_id, route)):
+            self.totals[(dimension, key)].add(usage, cost)
+            self.daily[(day, dimension, key)].add(usage, cost)
+            self.pending[(day, dimension, key)].add(usage, cost)
+        self.daily[(day, "all", "all")].add(usage, cost)
+
+        record = {
+            "timestamp": datetime.now(timezone.utc),
+            "agent": agent,
+            "model": model,
+            "user_id": user_id,
+            "route": route,
+            **usage,
+            "cost_usd": round(cost, 6),
+            "prompt_chars": len(prompt),
+            "prompt_preview": prompt[:PROMPT_PREVIEW_CHARS],
+        }
+        self._sequence += 1
+        entry = (usage["total_tokens"], self._sequence, record)
+        if len(self.top_prompts) < TOP_PROMPTS:
+            heapq.heappush(self.top_prompts, entry)
+        elif entry[0] > self.top_prompts[0][0]:
+            heapq.heapreplace(self.top_prompts, entry)
+        if usage["total_tokens"] >= self.prompt_log_tokens:
+            self.pending_prompts.append(record)
+
+        self._check_budgets(day, agent, user_id)
+
+    def _alarm(self, scope: str, key: str, day: str, used: float, budget: float, unit: str):
+        if not budget:
+            return
+        ratio = used / budget
+        level = "exceeded" if ratio >= 1 else "warning" if ratio >= BUDGET_WARNING_RATIO else None
+        if level is None or (scope, key, day, level) in self.alarms_raised:
+            return
+        self.alarms_raised.add((scope, key, day, level))
+        token_budget_alarms.labels(scope, level).inc()
+        logger.warning("Token budget %s for %s %s: %s of %s %s today (%.0f%%)",
+                       level, scope, key, round(used, 4), budget, unit, ratio * 100)
+
+    def _check_budgets(self, day: str, agent: str, user_id: str):
+        self._alarm("user", user_id, day, self.daily[(day, "user", user_id)].total_tokens,
+                    TOKEN_BUDGET_USER_DAILY, "tokens")
+        self._alarm("agent", agent, day, self.daily[(day, "agent", agent)].total_tokens,
+                    TOKEN_BUDGET_AGENT_DAILY, "tokens")
+        self._alarm("cost", "all", day, self.daily[(day, "all", "all")].cost_usd, COST_BUDGET_DAILY_USD, "USD")
+
+    def _prune_days(self):
+        today = _today()
+        for key in [key for key in self.daily if key[0] != today]:
+            del self.daily[key]
+        self.alarms_raised = {alarm for alarm in self.alarms_raised if alarm[2] == today}
+
+    async def flush(self) -> int:
+        """Write pending totals and large prompts to Firestore; returns the number of writes"""
+        pending, self.pending = self.pending, defaultdict(UsageTotals)
+        prompts, self.pending_prompts = self.pending_prompts, []
+        self._prune_days()
+        if not pending and not prompts:
+            return 0
+
+        def write() -> int:
+            writes = []
+            for (day, dimension, key), totals in pending.items():
+                ref = self.db.collection(USAGE_COLLECTION).document(f"{day}|{dimension}|{key}".replace("/", "%2F"))
+                values = {name: admin_firestore.Increment(value) for name, value in totals.to_dict().items()}
+                writes.append((ref, {"day": day, "dimension": dimension, "key": key, **values,
+                                     "updated_at": admin_firestore.SERVER_TIMESTAMP}))
+            for record in prompts:
+                writes.append((self.db.collection(PROMPT_COLLECTION).document(), record))
+            for start in range(0, len(writes), MAX_BATCH_WRITES):
+                batch = self.db.batch()
+                for ref, data in writes[start:start + MAX_BATCH_WRITES]:
+                    batch.set(ref, data, merge=True)
+                batch.commit()
+            return len(writes)
+
+        try:
+            return await asyncio.to_thread(write)
+        except Exception as e:
+            # Keep the numbers for the next flush rather than losing them
+            logger.warning("Token usage flush failed: %s", e)
+            for key, totals in pending.items():
+                merged = self.pending[key]
+                for name in UsageTotals.__slots__:
+                    setattr(merged, name, getattr(merged, name) + getattr(totals, name))
+            self.pending_prompts[:0] = prompts
+            return 0
+
+    async def run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def snapshot(self, limit: int = 20) -> dict:
+        """In-memory totals for this worker since it started"""
+        by_dimension = {dimension: [] for dimension in self.DIMENSIONS}
+        for (dimension, key), totals in self.totals.items():
+            by_dimension[dimension].append({"key": key, **totals.to_dict()})
+        for rows in by_dimension.values():
+            rows.sort(key=lambda row: -row["total_tokens"])
+            del rows[limit:]
+        today = self.daily.get((_today(), "all", "all"))
+        return {
+            **by_dimension,
+            "today": today.to_dict() if today else UsageTotals().to_dict(),
+            "budgets": {
+                "user_daily_tokens": TOKEN_BUDGET_USER_DAILY or None,
+                "agent_daily_tokens": TOKEN_BUDGET_AGENT_DAILY or None,
+                "daily_cost_usd": COST_BUDGET_DAILY_USD or None,
+            },
+            "top_prompts": [record for _, _, record in sorted(self.top_prompts, reverse=True)],
+            "pending_writes": len(self.pending) + len(self.pending_prompts),
+        }
+
+    async def report(self, days: int = 7, limit: int = 20) -> dict:
+        """Totals across all workers from Firestore for the last ``days`` days, with the largest prompts"""
+        since_day = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+
+        def query():
+            usage = list(self.db.collection(USAGE_COLLECTION).where("day", ">=", since_day).stream())
+            prompts = list(self.db.collection(PROMPT_COLLECTION)
+                           .where("timestamp", ">=", since)
+                           .order_by("timestamp", direction=admin_firestore.Query.DESCENDING)
+                           .limit(500)
+                           .stream())
+            return usage, prompts
+
+        started = time.perf_counter()
+        usage_docs, prompt_docs = await asyncio.to_thread(query)
+        by_dimension: Dict[str, Dict[str, dict]] = {dimension: {} for dimension in self.DIMENSIONS}
+        for doc in usage_docs:
+            data = doc.to_dict()
+            rows = by_dimension.get(data.get("dimension"))
+            if rows is None:
+                continue
+            row = rows.setdefault(data["key"], {"key": data["key"], **UsageTotals().to_dict()})
+            for name in UsageTotals.__slots__:
+                row[name] += data.get(name, 0)
+        prompts = sorted((doc.to_dict() for doc in prompt_docs), key=lambda p: -p.get("total_tokens", 0))
+        return {
+            "days": days,
+            **{dimension: sorted(rows.values(), key=lambda row: -row["total_tokens"])[:limit]
+               for dimension, rows in by_dimension.items()},
+            "top_prompts": prompts[:limit],
+            "query_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
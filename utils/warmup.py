@@ -0,0 +1,140 @@
+"""
+Agent session warm-up on page load.
+
+Each chat page (dashboard, opportunity creation, assessment on an
+opportunity's detail page) used to create its ADK session as part of
+the first message. ``SessionWarmer.schedule()`` lets the page handler do
+that work in the background while the page renders. It can also preload
+context: the assessment page keeps the opportunity, its applications and
+the company name ready for the first question.
+
+The chat handlers call ``ensure()`` instead of creating the session
+themselves. If the session was warmed within WARMUP_TTL seconds, it
+returns at once. If warm-up is still running, it waits for it. Otherwise
+the session is created inline, as before.
+
+Each session's first reply is timed and recorded in
+``agent_first_response_seconds`` under session="warm", "warming" or
+"cold". ``snapshot()`` reports the averages, so the time saved can be
+compared directly. State is per worker process. A miss in another worker
+only costs the old inline path.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_TTL = int(os.getenv("WARMUP_TTL", 600))
+WARMUP_MAX_ENTRIES = int(os.getenv("WARMUP_MAX_ENTRIES", 5000))
+
+agent_first_response = registry.histogram(
+    "agent_first_response_seconds", "Time to a session's first agent reply, by whether its session was pre-warmed",
+    ("agent", "session"))
+session_warmups = registry.counter(
+    "agent_session_warmups_total", "Background session warm-ups by outcome (ready/failed/fresh)", ("agent", "result"))
+
+# Creates the session and returns context to keep for the first turn (or None)
+WarmFn = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+
+@dataclass
+class WarmSession:
+    agent: str
+    created: float = field(default_factory=time.monotonic)
+    task: Optional[asyncio.Task] = None
+    ready: bool = False
+    context: Optional[Dict[str, Any]] = None
+    replied: bool = False
+
+
+class SessionWarmer:
+    def __init__(self, ttl: int = WARMUP_TTL, max_entries: int = WARMUP_MAX_ENTRIES, enabled: bool = WARMUP_ENABLED):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.sessions: "OrderedDict[Hashable, WarmSession]" = OrderedDict()
+        self.first_replies: Dict[tuple, list] = {}
+
+    def _fresh(self, key: Hashable) -> Optional[WarmSession]:
+        session = self.sessions.get(key)
+        if session is not None and time.monotonic() - session.created > self.ttl:
+            del self.sessions[key]
+            return None
+        return session
+
+    def _add(self, key: Hashable, session: WarmSession) -> WarmSession:
+        self.sessions[key] = session
+        self.sessions.move_to_end(key)
+        while len(self.sessions) > self.max_entries:
+            self.sessions.popitem(last=False)
+        return session
+
+    async def _run(self, session: WarmSession, warm: WarmFn):
+        try:
+            session.context = await warm()
+            session.ready = True
+            session_warmups.labels(session.agent, "ready").inc()
+        except Exception as e:
+            session_warmups.labels(session.agent, "failed").inc()
+            logger.warning("Warming %s session failed: %s", session.agent, e)
+
+    def schedule(self, agent: str, key: Hashable, warm: WarmFn):
+        """Start warming ``key`` in the background unless it is already warm or warming"""
+        if not self.enabled:
+            return
+        if self._fresh(key) is not None:
+            session_warmups.labels(agent, "fresh").inc()
+            return
+        session = self._add(key, WarmSession(agent))
+        session.task = asyncio.create_task(self._run(session, warm))
+
+    async def ensure(self, agent: str, key: Hashable, create: WarmFn) -> str:
+        """Make sure the session exists; returns how it got there (warm, warming or cold)"""
+        session = self._fresh(key)
+        if session is not None and session.ready:
+            return "warm"
+        if session is not None and session.task is not None and not session.task.done():
+            # Shielded: a client that disconnects mustn't cancel the warm-up for the next request
+            await asyncio.shield(session.task)
+            if session.ready:
+                return "warming"
+        session = self._add(key, WarmSession(agent))
+        session.context = await create()
+        session.ready = True
+        return "cold"
+
+    def context(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        session = self._fresh(key)
+        return session.context if session is not None and session.ready else None
+
+    def first_reply(self, key: Hashable, warmth: str, seconds: float):
+        """Record the reply time if this was the session's first reply since it was warmed or created"""
+        session = self._fresh(key)
+        if session is None or session.replied:
+            return
+        session.replied = True
+        agent_first_response.labels(session.agent, warmth).observe(seconds)
+        stats = self.first_replies.setdefault((session.agent, warmth), [0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "ttl": self.ttl,
+            "sessions": len(self.sessions),
+            "warming": sum(1 for s in self.sessions.values() if s.task is not None and not s.task.done()),
+            "first_reply_seconds": {
+                f"{agent}:{warmth}": {"count": count, "mean": round(total / count, 3)}
+                for (agent, warmth), (count, total) in sorted(self.first_replies.items())
+            },
+        }
@@ -0,0 +1,138 @@
+"""
+Opt-in watchdog that detects event-loop blocking and reports the call site.
+
+A heartbeat callback runs on the event loop every ``interval`` seconds. A
+daemon thread checks it. When the heartbeat is older than ``threshold``,
+the loop is stuck in synchronous code. The thread then snapshots the loop
+thread's current stack with ``sys._current_frames()``, which points
+directly at the blocking call (for example a synchronous Firestore or
+firebase_admin.auth call inside an async handler). Offenders are grouped
+by the innermost application frame.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG", "false").lower() == "true"
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 100))
+
+event_loop_blocks = registry.counter(
+    "event_loop_blocks_total", "Times the event loop was blocked longer than the watchdog threshold", ("site",))
+
+_LIBRARY_MARKERS = ("site-packages", "dist-packages", os.sep + "asyncio" + os.sep, os.sep + "threading.py")
+
+
+class BlockingSite:
+    __slots__ = ("site", "count", "total_ms", "max_ms", "last_seen", "stack")
+
+    def __init__(self, site: str, stack: list):
+        self.site = site
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_seen = 0.0
+        self.stack = stack
+
+    def to_dict(self) -> dict:
+        return {
+            "site": self.site,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 1),
+            "max_ms": round(self.max_ms, 1),
+            "last_seen": self.last_seen,
+            "stack": self.stack,
+        }
+
+
+class EventLoopWatchdog:
+    def __init__(self, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS, root_dir: Optional[str] = None):
+        self.threshold = threshold_ms / 1000
+        self.interval = self.threshold / 4
+        self.root_dir = root_dir or os.getcwd()
+        self.sites: Dict[str, BlockingSite] = {}
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        self._current_stall: Optional[BlockingSite] = None
+        self._current_stall_ms = 0.0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, loop):
+        """Start watching ``loop``; must be called from the loop's own thread"""
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        loop.call_soon(self._beat)
+        self._thread = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Event loop watchdog started (threshold {self.threshold * 1000:.0f}ms)")
+
+    def stop(self):
+        self._stopped.set()
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+        if not self._stopped.is_set():
+            self._loop.call_later(self.interval, self._beat)
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            stalled = time.monotonic() - self._last_beat
+            if stalled <= self.threshold + self.interval:
+                if self._current_stall is not None:
+                    self._finish_stall()
+                continue
+            if self._current_stall is None:
+                self._start_stall(stalled)
+            self._current_stall_ms = stalled * 1000
+
+    def _start_stall(self, stalled: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        site = self._call_site(stack)
+        record = self.sites.get(site)
+        if record is None:
+            record = self.sites[site] = BlockingSite(site, traceback.format_list(stack[-15:]))
+            logger.warning(
+                "Event loop blocked for >%.0fms at %s (first occurrence)\n%s",
+                stalled * 1000, site, "".join(record.stack),
+            )
+        self._current_stall = record
+        self._current_stall_ms = stalled * 1000
+
+    def _finish_stall(self):
+        record, blocked_ms = self._current_stall, self._current_stall_ms
+        self._current_stall = None
+        record.count += 1
+        record.total_ms += blocked_ms
+        record.max_ms = max(record.max_ms, blocked_ms)
+        record.last_seen = time.time()
+        event_loop_blocks.labels(record.site).inc()
+        logger.warning("Event loop blocked for ~%.0fms at %s (%d times so far)", blocked_ms, record.site, record.count)
+
+    def _call_site(self, stack) -> str:
+        """Innermost frame in application code, falling back to the innermost frame"""
+        for frame in reversed(stack):
+            filename = frame.filename
+            if filename.startswith(self.root_dir) and not any(marker in filename for marker in _LIBRARY_MARKERS):
+                return f"{os.path.relpath(filename, self.root_dir)}:{frame.lineno} in {frame.name}"
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+    def report(self) -> list:
+        return [site.to_dict() for site in sorted(self.sites.values(), key=lambda s: s.total_ms, reverse=True)]
+
+
+loop_watchdog = EventLoopWatchdog()